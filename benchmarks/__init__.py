@@ -0,0 +1,241 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Benchmarks for python-promises
+
+Each suite in this package can be run as a module, and writes its
+results as JSON so that runs from two commits can be compared.
+
+>>> python -m benchmarks.proxy -o before.json
+>>> python -m benchmarks.proxy -o after.json
+>>> python -m benchmarks.compare before.json after.json
+
+:author: Christopher O'Brien  <obriencj@gmail.com>
+:license: LGPL v.3
+"""
+
+
+import json
+import platform
+import sys
+
+from optparse import OptionParser
+from subprocess import PIPE, Popen
+from timeit import Timer
+
+
+__all__ = ('measure', 'run_cases', 'environment',
+           'load_results', 'save_results', 'compare_results',
+           'suite_main', )
+
+
+def measure(stmt, setup="pass", repeat=7, min_time=0.05):
+    """
+    Times a statement in the manner of `timeit`, first finding a loop
+    count which runs for at least `min_time` seconds, then taking
+    `repeat` samples of that many loops.
+
+    Parameters
+    ----------
+    stmt : `str`
+      the statement to time
+    setup : `str`
+      run once before each sample, and not timed
+    repeat : `int`
+      how many samples to take
+    min_time : `float`
+      the least number of seconds a single sample should take
+
+    Returns
+    -------
+    result : `dict`
+      with `best` and `median` nanoseconds per loop, along with the
+      `loops` and `repeat` used to get them
+    """
+
+    timer = Timer(stmt, setup)
+
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= min_time:
+            break
+        loops *= 10 if elapsed < (min_time / 10) else 2
+
+    samples = sorted(timer.repeat(repeat, loops))
+    per_loop = [(sample / loops) * 1e9 for sample in samples]
+
+    return {
+        "best": per_loop[0],
+        "median": per_loop[len(per_loop) // 2],
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def run_cases(cases, repeat=7, min_time=0.05, match=None, out=None):
+    """
+    Measures each of a sequence of `(name, stmt, setup)` cases
+
+    Parameters
+    ----------
+    cases : sequence of `(str, str, str)`
+      the cases to measure
+    match : `str` or `None`
+      only measure cases whose name contains this
+    out : file-like or `None`
+      where to write progress, one line per case
+
+    Returns
+    -------
+    results : `dict`
+      mapping each case name to the result of `measure`
+    """
+
+    results = {}
+    for name, stmt, setup in cases:
+        if match and match not in name:
+            continue
+
+        result = measure(stmt, setup, repeat, min_time)
+        results[name] = result
+
+        if out is not None:
+            out.write("%-40s %10.1f ns\n" % (name, result["best"]))
+            out.flush()
+
+    return results
+
+
+def _git_commit():
+    try:
+        proc = Popen(["git", "rev-parse", "--short", "HEAD"],
+                     stdout=PIPE, stderr=PIPE)
+        found, _err = proc.communicate()
+    except OSError:
+        return None
+
+    if proc.returncode:
+        return None
+    else:
+        return found.strip().decode("ascii")
+
+
+def environment():
+    """
+    Describes where the benchmarks were run, so that results from
+    different interpreters or machines aren't mistaken for one another
+    """
+
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "commit": _git_commit(),
+    }
+
+
+def save_results(suite, results, stream):
+    """
+    Writes a suite's results as JSON, along with the `environment`
+    """
+
+    data = {
+        "suite": suite,
+        "environment": environment(),
+        "results": results,
+    }
+    json.dump(data, stream, indent=2, sort_keys=True)
+    stream.write("\n")
+
+
+def load_results(filename):
+    """
+    Reads results written by `save_results`
+    """
+
+    with open(filename) as stream:
+        return json.load(stream)
+
+
+def compare_results(old, new, threshold=0.10, key="best"):
+    """
+    Compares the results of two runs of the same suite
+
+    Parameters
+    ----------
+    old : `dict`
+      as loaded by `load_results`
+    new : `dict`
+      as loaded by `load_results`
+    threshold : `float`
+      how much slower a case may become before it is counted as a
+      regression, as a fraction of its old time
+    key : `str`
+      which measurement to compare, `best` or `median`
+
+    Returns
+    -------
+    rows : `list` of `(str, float, float, float, bool)`
+      the name, old time, new time, and ratio of new to old for each
+      case found in both runs, and whether it regressed
+    """
+
+    old_results = old["results"]
+    new_results = new["results"]
+
+    rows = []
+    for name in sorted(set(old_results).intersection(new_results)):
+        before = old_results[name][key]
+        after = new_results[name][key]
+        ratio = (after / before) if before else 1.0
+        rows.append((name, before, after, ratio, ratio > (1 + threshold)))
+
+    return rows
+
+
+def suite_main(suite, cases, argv=None):
+    """
+    The command-line entry point shared by the suites in this package
+    """
+
+    parser = OptionParser(usage="python -m benchmarks.%s [options]" % suite)
+    parser.add_option("-o", "--output", default=None,
+                      help="write JSON results to this file")
+    parser.add_option("-r", "--repeat", type="int", default=7,
+                      help="samples to take of each case")
+    parser.add_option("-t", "--min-time", type="float", default=0.05,
+                      help="least seconds per sample")
+    parser.add_option("-k", "--match", default=None,
+                      help="only run cases whose name contains this")
+
+    options, _args = parser.parse_args(argv)
+
+    results = run_cases(cases, options.repeat, options.min_time,
+                        options.match, sys.stderr)
+
+    if options.output:
+        with open(options.output, "w") as stream:
+            save_results(suite, results, stream)
+    else:
+        save_results(suite, results, sys.stdout)
+
+    return 0
+
+
+#
+# The end.
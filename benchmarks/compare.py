@@ -0,0 +1,83 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Compares two benchmark results files, and exits non-zero if any case
+became slower by more than the threshold.
+
+>>> python -m benchmarks.compare before.json after.json
+
+:author: Christopher O'Brien  <obriencj@gmail.com>
+:license: LGPL v.3
+"""
+
+
+import sys
+
+from optparse import OptionParser
+
+from . import compare_results, load_results
+
+
+__all__ = ('main', )
+
+
+def main(argv=None):
+    parser = OptionParser(usage="python -m benchmarks.compare"
+                          " [options] OLD.json NEW.json")
+    parser.add_option("-t", "--threshold", type="float", default=0.10,
+                      help="fraction slower which counts as a regression")
+    parser.add_option("-k", "--key", default="best",
+                      help="compare the best or the median times")
+
+    options, args = parser.parse_args(argv)
+    if len(args) != 2:
+        parser.error("expected two results files")
+
+    old = load_results(args[0])
+    new = load_results(args[1])
+
+    if old.get("suite") != new.get("suite"):
+        parser.error("results are from different suites")
+
+    old_env = old.get("environment", {})
+    new_env = new.get("environment", {})
+    if old_env.get("python") != new_env.get("python"):
+        sys.stderr.write("warning: comparing Python %s against %s\n" %
+                         (old_env.get("python"), new_env.get("python")))
+
+    rows = compare_results(old, new, options.threshold, options.key)
+
+    out = sys.stdout
+    out.write("%-40s %12s %12s %8s\n" %
+              ("case", old_env.get("commit") or "old",
+               new_env.get("commit") or "new", "ratio"))
+
+    regressions = 0
+    for name, before, after, ratio, regressed in rows:
+        regressions += regressed
+        out.write("%-40s %12.1f %12.1f %7.2fx%s\n" %
+                  (name, before, after, ratio,
+                   "  REGRESSED" if regressed else ""))
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+#
+# The end.
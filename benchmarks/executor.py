@@ -0,0 +1,487 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Throughput and latency of the executors under load
+
+Each scenario is a number of tasks, a payload size in bytes which is
+sent to and returned from each task, and a duration in seconds which
+each task sleeps for. Every executor is run against every scenario in
+a fresh interpreter, so that its peak RSS is its own.
+
+For each run this reports futures delivered per second, the latency
+from submitting each future to its value being set, and the peak RSS
+of the interpreter and of its largest child process. `best` and
+`median` are wall-clock nanoseconds per future, so the results can be
+compared with `benchmarks.compare` like any other suite.
+
+The `futures.*` executors are `concurrent.futures` pools, as a
+baseline for the `ProcessExecutor` family. `xmlrpc.ServerProxy` makes
+the same calls one at a time, as a baseline for the multicalls. The
+multicalls run against a `SimpleXMLRPCServer` in a thread of the
+benchmarking interpreter.
+
+>>> python -m benchmarks.executor -n 1000,10000 -p 0,65536 -o results.json
+
+:author: Christopher O'Brien  <obriencj@gmail.com>
+:license: LGPL v.3
+"""
+
+
+import json
+import sys
+
+from functools import partial
+from optparse import OptionParser
+from subprocess import PIPE, Popen
+from threading import Thread
+from time import sleep
+from timeit import default_timer
+
+from . import save_results
+
+from promises import deliver
+from promises.multiprocess import ProcessExecutor, ProxyProcessExecutor
+from promises.multithread import ThreadExecutor, ProxyThreadExecutor
+from promises.xmlrpc import LazyMultiCall, ProxyMultiCall
+
+try:
+    from concurrent import futures
+except ImportError:
+    futures = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+try:
+    from xmlrpclib import ServerProxy
+    from SimpleXMLRPCServer import SimpleXMLRPCServer
+except ImportError:
+    from xmlrpc.client import ServerProxy
+    from xmlrpc.server import SimpleXMLRPCServer
+
+
+__all__ = ('EXECUTORS', 'run_executor', 'run_scenario', 'main', )
+
+
+def echo(payload, duration):
+    """
+    the work performed for every task
+    """
+
+    if duration:
+        sleep(duration)
+    return payload
+
+
+def echo_args(args):
+    """
+    the work performed for every task, when given to `map`
+    """
+
+    return echo(*args)
+
+
+def _percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(fraction):
+        index = int(round(fraction * (len(values) - 1)))
+        return values[index] * 1e3
+
+    return {
+        "p50": at(0.50),
+        "p90": at(0.90),
+        "p99": at(0.99),
+        "max": at(1.00),
+    }
+
+
+def _timed(executor_type):
+    """
+    A subclass of a promises executor which records when each of its
+    futures was submitted, and when its value was set
+    """
+
+    class Timed(executor_type):
+
+        def __init__(self, *args, **kwds):
+            super(Timed, self).__init__(*args, **kwds)
+            self.submitted = []
+            self.delivered = []
+
+
+        def _promise(self):
+            promised, setter, seterr = super(Timed, self)._promise()
+
+            index = len(self.submitted)
+            self.submitted.append(default_timer())
+            self.delivered.append(None)
+            delivered = self.delivered
+
+            def timed_setter(value):
+                delivered[index] = default_timer()
+                setter(value)
+
+            def timed_seterr(*exc_info):
+                delivered[index] = default_timer()
+                seterr(*exc_info)
+
+            return promised, timed_setter, timed_seterr
+
+
+    Timed.__name__ = executor_type.__name__
+    return Timed
+
+
+def _run_promises(executor_type, tasks, payload, duration, workers,
+                  **options):
+    data = b"x" * payload
+
+    executor = _timed(executor_type)(workers, **options)
+
+    # make sure the pool has started before we start the clock
+    deliver(executor.future(echo, b"", 0))
+    del executor.submitted[:]
+    del executor.delivered[:]
+
+    start = default_timer()
+    found = [executor.future(echo, data, duration) for _ in range(tasks)]
+    for promised in found:
+        deliver(promised)
+    wall = default_timer() - start
+
+    executor.deliver()
+
+    latencies = [d - s for s, d in
+                 zip(executor.submitted, executor.delivered)]
+    return wall, latencies
+
+
+def _run_promises_map(executor_type, tasks, payload, duration, workers):
+    data = b"x" * payload
+
+    executor = _timed(executor_type)(workers)
+
+    deliver(executor.future(echo, b"", 0))
+    del executor.submitted[:]
+    del executor.delivered[:]
+
+    start = default_timer()
+    found = executor.map(echo_args, [(data, duration)] * tasks)
+    for promised in found:
+        deliver(promised)
+    wall = default_timer() - start
+
+    executor.deliver()
+
+    latencies = [d - s for s, d in
+                 zip(executor.submitted, executor.delivered)]
+    return wall, latencies
+
+
+def _run_futures(pool_type, tasks, payload, duration, workers):
+    data = b"x" * payload
+
+    def done(index, _future):
+        delivered[index] = default_timer()
+
+    pool = pool_type(max_workers=workers)
+    try:
+        pool.submit(echo, b"", 0).result()
+
+        submitted = []
+        delivered = [None] * tasks
+
+        start = default_timer()
+        found = []
+        for index in range(tasks):
+            submitted.append(default_timer())
+            future = pool.submit(echo, data, duration)
+            future.add_done_callback(partial(done, index))
+            found.append(future)
+
+        for future in found:
+            future.result()
+        wall = default_timer() - start
+
+    finally:
+        pool.shutdown()
+
+    latencies = [d - s for s, d in zip(submitted, delivered)]
+    return wall, latencies
+
+
+def _serve_xmlrpc():
+    server = SimpleXMLRPCServer(("localhost", 0), logRequests=False)
+    server.register_function(echo, "echo")
+    server.register_multicall_functions()
+
+    thread = Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    url = "http://localhost:%i" % server.server_address[1]
+    return server, url
+
+
+def _run_multicall(multicall_type, tasks, payload, duration, workers,
+                   group_calls=100):
+
+    data = "x" * payload
+    server, url = _serve_xmlrpc()
+
+    try:
+        multicall = multicall_type(ServerProxy(url), group_calls=group_calls)
+
+        submitted = []
+        delivered = []
+
+        start = default_timer()
+        found = []
+        for _index in range(tasks):
+            submitted.append(default_timer())
+            found.append(multicall.echo(data, duration))
+
+        # the multicalls are lazy, so a call's value arrives when we
+        # ask for it, along with the rest of its group
+        for promised in found:
+            deliver(promised)
+            delivered.append(default_timer())
+        wall = default_timer() - start
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    latencies = [d - s for s, d in zip(submitted, delivered)]
+    return wall, latencies
+
+
+def _run_serverproxy(_unused, tasks, payload, duration, workers):
+    data = "x" * payload
+    server, url = _serve_xmlrpc()
+
+    try:
+        proxy = ServerProxy(url)
+        latencies = []
+
+        start = default_timer()
+        for _index in range(tasks):
+            began = default_timer()
+            proxy.echo(data, duration)
+            latencies.append(default_timer() - began)
+        wall = default_timer() - start
+
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    return wall, latencies
+
+
+EXECUTORS = {
+    "ProcessExecutor": partial(_run_promises, ProcessExecutor),
+    "ProxyProcessExecutor": partial(_run_promises, ProxyProcessExecutor),
+    "ProcessExecutor.map": partial(_run_promises_map, ProcessExecutor),
+    "ProcessExecutor.batched": partial(_run_promises, ProcessExecutor,
+                                       batch_size=64),
+    "ThreadExecutor": partial(_run_promises, ThreadExecutor),
+    "ThreadExecutor.map": partial(_run_promises_map, ThreadExecutor),
+    "ThreadExecutor.batched": partial(_run_promises, ThreadExecutor,
+                                      batch_size=64),
+    "ProxyThreadExecutor": partial(_run_promises, ProxyThreadExecutor),
+    "LazyMultiCall": partial(_run_multicall, LazyMultiCall),
+    "ProxyMultiCall": partial(_run_multicall, ProxyMultiCall),
+    "xmlrpc.ServerProxy": partial(_run_serverproxy, None),
+}
+
+if futures is not None:
+    EXECUTORS["futures.ProcessPoolExecutor"] = \
+        partial(_run_futures, futures.ProcessPoolExecutor)
+    EXECUTORS["futures.ThreadPoolExecutor"] = \
+        partial(_run_futures, futures.ThreadPoolExecutor)
+
+
+def _peak_rss():
+    if resource is None:
+        return None, None
+
+    # ru_maxrss is in kilobytes on Linux, but bytes on OS X
+    scale = 1024 if sys.platform == "darwin" else 1
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own // scale, children // scale
+
+
+def run_executor(name, tasks, payload=0, duration=0, workers=None,
+                 repeat=3):
+    """
+    Runs a scenario against one of the `EXECUTORS` in this interpreter
+
+    Parameters
+    ----------
+    name : `str`
+      key into `EXECUTORS`
+    tasks : `int`
+      how many futures to create
+    payload : `int`
+      bytes sent to, and returned from, each task
+    duration : `float`
+      seconds each task sleeps for
+    workers : `int` or `None`
+      pool size, defaulting to the pool's own default
+    repeat : `int`
+      how many times to run the scenario
+
+    Returns
+    -------
+    result : `dict`
+      the measurements, in the form described by this module
+    """
+
+    run = EXECUTORS[name]
+
+    walls = []
+    latencies = []
+    for _index in range(repeat):
+        wall, found = run(tasks, payload, duration, workers)
+        walls.append(wall)
+        latencies.extend(found)
+
+    walls.sort()
+    best = walls[0]
+    median = walls[len(walls) // 2]
+    own_rss, child_rss = _peak_rss()
+
+    return {
+        "best": (best / tasks) * 1e9,
+        "median": (median / tasks) * 1e9,
+        "futures_per_sec": tasks / best,
+        "latency_ms": _percentiles(latencies),
+        "peak_rss_kb": own_rss,
+        "peak_child_rss_kb": child_rss,
+        "tasks": tasks,
+        "payload": payload,
+        "duration": duration,
+        "workers": workers,
+        "repeat": repeat,
+    }
+
+
+def run_scenario(name, tasks, payload=0, duration=0, workers=None,
+                 repeat=3):
+    """
+    As `run_executor`, but in a fresh interpreter
+    """
+
+    config = json.dumps([name, tasks, payload, duration, workers, repeat])
+    proc = Popen([sys.executable, "-m", "benchmarks.executor",
+                  "--child", config], stdout=PIPE)
+
+    found, _err = proc.communicate()
+    if proc.returncode:
+        raise RuntimeError("%s exited with %i" % (name, proc.returncode))
+
+    return json.loads(found.decode("utf8"))
+
+
+def _ints(value):
+    return [int(v) for v in value.split(",")]
+
+
+def _floats(value):
+    return [float(v) for v in value.split(",")]
+
+
+def main(argv=None):
+    parser = OptionParser(usage="python -m benchmarks.executor [options]")
+    parser.add_option("-o", "--output", default=None,
+                      help="write JSON results to this file")
+    parser.add_option("-e", "--executors", default=None,
+                      help="comma-separated executors to run, of: %s" %
+                      ", ".join(sorted(EXECUTORS)))
+    parser.add_option("-n", "--tasks", default="1000",
+                      help="comma-separated task counts")
+    parser.add_option("-p", "--payload", default="0,65536",
+                      help="comma-separated payload sizes in bytes")
+    parser.add_option("-d", "--duration", default="0",
+                      help="comma-separated seconds each task sleeps")
+    parser.add_option("-w", "--workers", type="int", default=None,
+                      help="pool size")
+    parser.add_option("-r", "--repeat", type="int", default=3,
+                      help="runs of each scenario")
+    parser.add_option("--child", default=None, help="internal use")
+
+    options, _args = parser.parse_args(argv)
+
+    if options.child:
+        # by way of the module, so that the work pickles by its name
+        # rather than as part of __main__
+        from benchmarks import executor
+        result = executor.run_executor(*json.loads(options.child))
+        sys.stdout.write(json.dumps(result))
+        return 0
+
+    if options.executors:
+        names = options.executors.split(",")
+        unknown = set(names).difference(EXECUTORS)
+        if unknown:
+            parser.error("unknown executors: %s" % ", ".join(unknown))
+    else:
+        names = sorted(EXECUTORS)
+
+    out = sys.stderr
+    out.write("%-48s %12s %9s %9s %9s %10s\n" %
+              ("scenario", "futures/s", "p50 ms", "p99 ms",
+               "rss kb", "child kb"))
+
+    results = {}
+    for tasks in _ints(options.tasks):
+        for payload in _ints(options.payload):
+            for duration in _floats(options.duration):
+                for name in names:
+                    key = "%s.n%i.p%i.d%g" % (name, tasks, payload, duration)
+                    result = run_scenario(name, tasks, payload, duration,
+                                          options.workers, options.repeat)
+                    results[key] = result
+
+                    latency = result["latency_ms"]
+                    out.write("%-48s %12.1f %9.3f %9.3f %9s %10s\n" %
+                              (key, result["futures_per_sec"],
+                               latency["p50"], latency["p99"],
+                               result["peak_rss_kb"],
+                               result["peak_child_rss_kb"]))
+                    out.flush()
+
+    if options.output:
+        with open(options.output, "w") as stream:
+            save_results("executor", results, stream)
+    else:
+        save_results("executor", results, sys.stdout)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+#
+# The end.
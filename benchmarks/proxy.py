@@ -0,0 +1,160 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Microbenchmarks for the proxy and container hot paths
+
+Every slot family of `promises.Proxy` is timed twice, once against a
+delivered proxy and once against the raw answer, named `.proxy` and
+`.raw` respectively. The difference is what the proxy costs.
+
+>>> python -m benchmarks.proxy -o results.json
+
+:author: Christopher O'Brien  <obriencj@gmail.com>
+:license: LGPL v.3
+"""
+
+
+import sys
+
+from . import suite_main
+
+
+__all__ = ('cases', 'main', )
+
+
+_SETUP = """
+from promises import Container, Proxy, deliver, lazy, lazy_proxy, promise
+from promises import is_delivered, is_promise, is_proxy
+
+class Duck(object):
+    def is_delivered(self):
+        return True
+    def deliver(self):
+        return 5
+
+class SubContainer(Container):
+    pass
+
+class Thing(object):
+    def __init__(self):
+        self.attr = 5
+    def method(self):
+        return 5
+
+def work():
+    return 5
+"""
+
+
+# (name, statement, answer) for each slot family. The statement is
+# run with `x` bound to either a delivered proxy, or the answer.
+SLOTS = (
+    ("number.add", "x + 1", "5"),
+    ("number.radd", "1 + x", "5"),
+    ("number.mul", "x * x", "5"),
+    ("number.inplace", "y = x; y += 1", "5"),
+    ("number.float", "float(x)", "5"),
+    ("number.index", "[1][x]", "0"),
+    ("number.bool", "not x", "5"),
+    ("sequence.len", "len(x)", "[1, 2, 3]"),
+    ("sequence.contains", "3 in x", "[1, 2, 3]"),
+    ("sequence.concat", "x + x", "[1, 2, 3]"),
+    ("mapping.getitem", "x['a']", "{'a': 1}"),
+    ("mapping.setitem", "x['a'] = 1", "{'a': 1}"),
+    ("getattr.attribute", "x.attr", "Thing()"),
+    ("getattr.method", "x.method()", "Thing()"),
+    ("call.noargs", "x()", "work"),
+    ("call.args", "x(-5)", "abs"),
+    ("call.kwds", "x('5', base=16)", "int"),
+    ("richcompare.eq", "x == 5", "5"),
+    ("richcompare.lt", "x < 6", "5"),
+    ("richcompare.reflected", "5 == x", "5"),
+    ("hash", "hash(x)", "'hello'"),
+    ("iter", "for _ in x: pass", "(1, 2, 3)"),
+    ("str", "str(x)", "'hello'"),
+)
+
+
+def _slot_cases():
+    for name, stmt, answer in SLOTS:
+        raw = "%s\nx = %s" % (_SETUP, answer)
+        proxy = ("%s\nx = lazy_proxy(lambda: %s)\ndeliver(x)"
+                 % (_SETUP, answer))
+
+        yield ("slot.%s.proxy" % name, stmt, proxy)
+        yield ("slot.%s.raw" % name, stmt, raw)
+
+
+# (name, statement, extra setup) for construction, delivery, and the
+# module-level dispatch functions
+PROMISES = (
+    ("construct.Proxy", "Proxy(work)", ""),
+    ("construct.Container", "Container(work)", ""),
+    ("construct.lazy", "lazy(work)", ""),
+    ("construct.lazy_args", "lazy(abs, -5)", ""),
+    ("construct.lazy_proxy", "lazy_proxy(work)", ""),
+    ("construct.lazy_proxy_args", "lazy_proxy(abs, -5)", ""),
+    ("construct.promise", "promise()", ""),
+
+    # first delivery is construction plus delivery, so subtract the
+    # matching construct case to see the cost of delivering
+    ("deliver.first.Proxy", "deliver(Proxy(work))", ""),
+    ("deliver.first.Container", "deliver(Container(work))", ""),
+    ("deliver.repeat.Proxy", "deliver(x)", "x = Proxy(work); deliver(x)"),
+    ("deliver.repeat.Container", "deliver(x)",
+     "x = Container(work); deliver(x)"),
+    ("deliver.repeat.method", "x.deliver()",
+     "x = Container(work); deliver(x)"),
+
+    ("dispatch.is_delivered.Proxy", "is_delivered(x)",
+     "x = Proxy(work); deliver(x)"),
+    ("dispatch.is_delivered.Container", "is_delivered(x)",
+     "x = Container(work); deliver(x)"),
+    ("dispatch.is_delivered.subclass", "is_delivered(x)",
+     "x = SubContainer(work); deliver(x)"),
+    ("dispatch.is_delivered.duck", "is_delivered(x)", "x = Duck()"),
+    ("dispatch.is_promise.Proxy", "is_promise(x)", "x = Proxy(work)"),
+    ("dispatch.is_promise.Container", "is_promise(x)",
+     "x = Container(work)"),
+    ("dispatch.is_promise.duck", "is_promise(x)", "x = Duck()"),
+    ("dispatch.is_promise.other", "is_promise(x)", "x = 5"),
+    ("dispatch.is_proxy", "is_proxy(x)", "x = Proxy(work)"),
+)
+
+
+def _promise_cases():
+    for name, stmt, setup in PROMISES:
+        yield (name, stmt, "%s\n%s" % (_SETUP, setup))
+
+
+def cases():
+    """
+    All of the `(name, stmt, setup)` cases in this suite
+    """
+
+    return list(_promise_cases()) + list(_slot_cases())
+
+
+def main(argv=None):
+    return suite_main("proxy", cases(), argv)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+
+#
+# The end.
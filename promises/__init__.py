@@ -25,11 +25,20 @@ wish someone smarter had worked on this.
 """
 
 
-from ._proxy import Proxy
-from ._proxy import is_proxy, is_proxy_delivered, deliver_proxy
+from ._proxy import Container, Proxy
+from ._proxy import is_proxy, is_promise, is_delivered, deliver, unwrap
+from ._proxy import is_proxy_delivered, deliver_proxy  # NOQA : compat
+from ._proxy import proxy_freelist, set_proxy_freelist  # NOQA : API
+from ._proxy import promise_work
+from collections import deque
 from functools import partial
-from sys import exc_info
-from threading import Event
+from sys import exc_info, version_info
+from threading import Condition, Lock
+
+try:
+    from time import monotonic as _now
+except ImportError:
+    from time import time as _now
 
 
 __all__ = ('Container', 'Proxy', 'BrokenPromise',
@@ -37,127 +46,30 @@ __all__ = ('Container', 'Proxy', 'BrokenPromise',
            'promise', 'promise_proxy',
            'breakable', 'breakable_proxy',
            'breakable_deliver',
-           'PromiseNotReady', 'PromiseAlreadyDelivered',
-           'is_promise', 'is_delivered', 'deliver',
-           'promise_repr', )
+           'PromiseNotReady', 'PromiseAlreadyDelivered', 'PromiseTimeout',
+           'PromiseCancelled',
+           'is_promise', 'is_delivered', 'deliver', 'unwrap',
+           'as_completed', 'wait', 'FIRST_COMPLETED', 'ALL_COMPLETED',
+           'promise_repr', 'set_wait_backend', )
 
 
-class Container(object):
-    """
-    Simple promise mechanism. Acts as a container to the promised work
-    until delivered, and there-after acts as a container to the return
-    value from executing the work. Will invoke the promised work
-    function exactly once, but can deliver the answer multiple times.
-    """
+# marks a settable promise which has not yet been given a value
+_unset = object()
 
-    __slots__ = ('_work', '_answer')
 
+def _await_promise(promised):
+    # only pulls in asyncio once someone actually awaits a promise
+    from .asyncio import awaitable
+    return awaitable(promised).__await__()
 
-    def __init__(self, work):
-        """
-        promises to provide the answer from calling work. work must be
-        either a nullary (zero-argument) callable, or a non-callable
-        value. If work is non-callable, then this promise is
-        considered immediately delivered, and the work value becomes
-        the answer.
-        """
-
-        if callable(work):
-            # TODO: check work arity. Must be nullary.
-            self._work = work
-            self._answer = None
-        else:
-            self._work = None
-            self._answer = work
-
-
-    def __del__(self):
-        self._work = None
-        self._answer = None
-
-
-    def is_delivered(self):
-        """
-        True if the promised work has been called and an answer has been
-        recorded.
-        """
-
-        return self._work is None
-
-
-    def deliver(self):
-        """
-        Deliver on promised work. Will only execute the work if an answer
-        has not already been found. If an exception is raised during
-        the execution of work, it will be cascade up from here as
-        well. Returns the answer to the work once known.
-        """
-
-        # in theory this could be overridden to change how delivery
-        # occurs, but it's probably better to use special workers
-        # instead.
-
-        work = self._work
-
-        if work is not None:
-            # note that if the work raised an exception, we won't
-            # consider ourselves as delivered, meaning we can attempt
-            # delivery again later. This is a feature!
-            self._answer = work()
-            self._work = None
-
-        return self._answer
-
-
-    def __repr__(self):
-        work = self._work
-        answer = self._answer
-        if work is not None:
-            return "<promises.Container undelivered>"
-        elif isinstance(answer, BrokenPromise):
-            return "<promises.Container broken>"
-        else:
-            return "<promises.Container delivered:%r>" % answer
 
-
-def is_promise(obj):
-    """
-    True if `obj` is a promise (either a proxy or a container)
-    """
-
-    return (is_proxy(obj) or
-            (hasattr(obj, "is_delivered") and
-             hasattr(obj, "deliver")))
-
-
-def is_delivered(a_promise):
-    """
-    True if `a_promise` is a promise and has been delivered
-    """
-
-    return is_proxy_delivered(a_promise) if is_proxy(a_promise) \
-        else a_promise.is_delivered()
-
-
-def deliver(on_promise):
-    """
-    Attempts to deliver on a promise, and returns the resulting
-    value. If the delivery of work causes an exception, it will be
-    raised here.
-
-    Parameters
-    ----------
-    on_promise : `Proxy` or `Container` promise
-      the promise to deliver on
-
-    Returns
-    -------
-    value
-      the promised work if it could be successfully computed
-    """
-
-    return deliver_proxy(on_promise) if is_proxy(on_promise) \
-        else on_promise.deliver()
+try:
+    from ._proxy import set_await_hook
+except ImportError:
+    # before Python 3.5 there's no await to hook
+    pass
+else:
+    set_await_hook(_await_promise)
 
 
 def lazy(work, *args, **kwds):
@@ -208,6 +120,18 @@ def lazy_proxy(work, *args, **kwds):
     return Proxy(work)
 
 
+if version_info[0] < 3:
+    exec("""def _reraise(exc_type, exc_val, exc_tb):
+    raise exc_type, exc_val, exc_tb
+""")
+
+else:
+    def _reraise(exc_type, exc_val, exc_tb):
+        if exc_val is None:
+            exc_val = exc_type()
+        raise exc_val.with_traceback(exc_tb)
+
+
 class PromiseNotReady(Exception):
     """
     Raised when attempting to deliver on a promise whose underlying
@@ -226,54 +150,271 @@ class PromiseAlreadyDelivered(Exception):
     pass
 
 
-def _promise(promise_type, blocking=False):
+class PromiseTimeout(Exception):
+    """
+    Raised when promises have not completed in the time allowed
+    by `as_completed`
+    """
+
+    pass
+
+
+class PromiseCancelled(Exception):
+    """
+    Raised when delivering a promise whose work was cancelled, or
+    abandoned by a terminated executor, and so will never be performed.
+    """
+
+    pass
+
+
+def _gevent_waiter():
+    from gevent.lock import Semaphore
+    return Semaphore
+
+
+def _eventlet_waiter():
+    from eventlet.semaphore import Semaphore
+    return Semaphore
+
+
+def _no_waiter():
+    # under asyncio nothing may block, so these are awaited instead
+    return None
+
+
+_WAIT_BACKENDS = {
+    "threading": lambda: Lock,
+    "gevent": _gevent_waiter,
+    "eventlet": _eventlet_waiter,
+    "asyncio": lambda: _no_waiter,
+}
+
+
+def _wait_factory(backend):
+    """
+    The function creating a waiter for backend, which is either one of
+    the names in `_WAIT_BACKENDS` or such a function already
+    """
+
+    if callable(backend):
+        return backend
+
+    loader = _WAIT_BACKENDS.get(backend)
+    if loader is None:
+        raise ValueError("wait backend must be callable, or one of %r"
+                         % (tuple(sorted(_WAIT_BACKENDS)), ))
+    return loader()
+
+
+# what blocking promises wait with, unless told otherwise
+_wait_backend = "threading"
+_new_waiter = Lock
+
+
+def set_wait_backend(backend):
+    """
+    Sets what blocking promises wait with for the whole process, other
+    than those from an executor given a `wait_backend` of its own.
+    Only promises created after this call are affected.
+
+    Parameters
+    ----------
+    backend : `str` or `callable`
+      `"threading"` (the default) to wait on a `threading.Lock`,
+      `"gevent"` or `"eventlet"` to wait cooperatively on that
+      library's `Semaphore`, or `"asyncio"` for promises which never
+      block, and are to be awaited instead. Otherwise a function
+      returning a new lock-like object, with the `acquire(blocking)`,
+      `release()` and `locked()` methods, or `None` to not block
+
+    Returns
+    -------
+    previous : `str` or `callable`
+      the backend which was in place before this call
+    """
+
+    global _wait_backend, _new_waiter
+
+    new_waiter = _wait_factory(backend)
+
+    previous = _wait_backend
+    _wait_backend = backend
+    _new_waiter = new_waiter
+    return previous
+
+
+# guards the first listener of any promise
+_listen_lock = Lock()
+
+
+class _PromiseState(object):
     """
     This is the 'traditional' type of promise. It's a single-slot,
-    write-once value.
-    """
-
-    # our shared state! trololol closures
-    ptr = list()
-    exc = list()
-    event = Event() if blocking else None
-
-    # for getting a value to deliver to the promise, or for raising an
-    # exception if one was set. This is what will be called by deliver
-    def promise_getter():
-        if event:
-            event.wait()
-        if ptr:
-            return ptr[0]
-        elif exc:
-            if event:
-                event.clear()
-            raise exc[0], exc[1], exc[2]
+    write-once value. Instances act as the work for a `Container` or
+    `Proxy`, and provide the setter and seterr functions which feed
+    that promise.
+    """
+
+    __slots__ = ('_promise', '_value', '_exc', '_waiter', '_on_wait',
+                 '_listeners')
+
+
+    def __init__(self, promise_type, blocking=False, on_wait=None,
+                 new_waiter=None):
+        """
+        Parameters
+        ----------
+        promise_type : `type`
+          either `Container` or `Proxy`, the promise to create
+        blocking : `bool`
+          whether delivery should wait for a value or exception
+        on_wait : unary `callable` or `None`
+          called with the promise when a blocking delivery finds
+          nothing set yet, just before it waits. Lets whoever is going
+          to set the value know that someone needs it now, and gives
+          them the chance to set it right then. Called with `None`
+          when waiting on several promises at once
+        new_waiter : nullary `callable` or `None`
+          creates the lock to wait with when blocking, as chosen by
+          `set_wait_backend` if not given
+        """
+
+        # when blocking, the waiter is a lock which is held until
+        # there is something for a delivery to find. This is far
+        # lighter than an Event, and delivery of the promise is
+        # already serialized so there is usually only one thread
+        # waiting on it.
+        waiter = None
+        if blocking:
+            waiter = (new_waiter or _new_waiter)()
+            if waiter is not None:
+                waiter.acquire()
+
+        self._value = _unset
+        self._exc = None
+        self._waiter = waiter
+        self._on_wait = on_wait
+        self._listeners = None
+
+        # this is a reference cycle until we're given a value, at
+        # which point the promise becomes delivered and we let go
+        self._promise = promise_type(self)
+
+
+    def __call__(self):
+        """
+        for getting a value to deliver to the promise, or for raising
+        an exception if one was set. This is what will be called by
+        deliver
+        """
+
+        waiter = self._waiter
+        if waiter is not None and self._exc is None:
+            # once an exception has been set there is nothing more to
+            # wait for, and every delivery raises it until the setter
+            # is called
+            taken = waiter.acquire(False)
+            if not taken:
+                on_wait = self._on_wait
+                if on_wait is not None:
+                    on_wait(self._promise)
+
+                # on_wait may have set the value itself, delivering
+                # the promise and taking the lock along the way
+                if self._value is _unset:
+                    taken = waiter.acquire()
+
+            if taken:
+                # whoever else is waiting, or comes along later, must
+                # find the lock free too. That includes green threads,
+                # which all share one thread ident, so aren't
+                # serialized by the promise and may all be in here.
+                waiter.release()
+
+        value = self._value
+        if value is not _unset:
+            return value
+
+        exc = self._exc
+        if exc is not None:
+            _reraise(*exc)
         else:
             raise PromiseNotReady()
 
-    promise = promise_type(promise_getter)
 
-    # for setting the promise's value.
-    def promise_setter(value):
-        if ptr:
+    def set(self, value):
+        """
+        for setting the promise's value.
+        """
+
+        if self._value is not _unset:
             raise PromiseAlreadyDelivered()
-        else:
-            del exc[:]
-            ptr[:] = (value,)
-            if event:
-                event.set()
-            deliver(promise)
-
-    # for setting the promise's exception
-    def promise_seterr(exc_type, exc_val, exc_tb):
-        if ptr:
+
+        self._exc = None
+        self._value = value
+
+        waiter = self._waiter
+        if waiter is not None and waiter.locked():
+            waiter.release()
+
+        promised = self._promise
+        self._promise = None
+        deliver(promised)
+
+        self._settled(promised)
+
+
+    def seterr(self, exc_type, exc_val, exc_tb):
+        """
+        for setting the promise's exception
+        """
+
+        if self._value is not _unset:
             raise PromiseAlreadyDelivered()
-        else:
-            exc[:] = exc_type, exc_val, exc_tb
-            if event:
-                event.set()
 
-    return (promise, promise_setter, promise_seterr)
+        self._exc = (exc_type, exc_val, exc_tb)
+
+        waiter = self._waiter
+        if waiter is not None and waiter.locked():
+            waiter.release()
+
+        self._settled(self._promise)
+
+
+    def _settled(self, promised):
+        listeners = self._listeners
+        self._listeners = None
+        if listeners:
+            for listener in listeners:
+                listener(promised)
+
+
+    def _listen(self, listener):
+        """
+        Arranges for listener to be called with the promise once it
+        has been set. Returns `False` if it already has been, in which
+        case listener may or may not be called.
+        """
+
+        listeners = self._listeners
+        if listeners is None:
+            with _listen_lock:
+                # two threads listening at once mustn't each make a
+                # list, as one of them would be lost
+                listeners = self._listeners
+                if listeners is None:
+                    listeners = self._listeners = []
+        listeners.append(listener)
+
+        # set and seterr store before they swap out the listeners, so
+        # if we missed the swap then we'll see what they stored
+        return (self._value is _unset) and (self._exc is None)
+
+
+def _promise(promise_type, blocking=False, on_wait=None, new_waiter=None):
+    state = _PromiseState(promise_type, blocking, on_wait, new_waiter)
+    return (state._promise, state.set, state.seterr)
 
 
 def promise(blocking=False):
@@ -336,6 +477,183 @@ def promise_proxy(blocking=False):
     return _promise(Proxy, blocking=blocking)
 
 
+FIRST_COMPLETED = "FIRST_COMPLETED"
+ALL_COMPLETED = "ALL_COMPLETED"
+
+
+def _settable_state(promised):
+    """
+    The `_PromiseState` feeding promised, or `None` if there isn't one
+    still waiting to be set
+    """
+
+    if not is_delivered(promised):
+        state = promise_work(promised)
+        if type(state) is _PromiseState and state._promise is promised:
+            return state
+
+    return None
+
+
+class _Completion(object):
+    """
+    Gathers promises as they're set, in the order they're set.
+    Promises which aren't waiting on a setter, such as delivered or
+    lazy ones, count as completed from the start.
+    """
+
+    def __init__(self, promises):
+        self._cond = Condition()
+        self._completed = deque()
+        self._pending = {}
+        self._on_wait = []
+
+        for promised in promises:
+            state = _settable_state(promised)
+            if state is None:
+                self._completed.append(promised)
+                continue
+
+            self._pending[id(promised)] = promised
+            if not state._listen(self._notify):
+                self._notify(promised)
+
+            on_wait = state._on_wait
+            if on_wait is not None and on_wait not in self._on_wait:
+                self._on_wait.append(on_wait)
+
+
+    def __len__(self):
+        with self._cond:
+            return len(self._completed) + len(self._pending)
+
+
+    def _notify(self, promised):
+        with self._cond:
+            # the same promise may be reported twice if it was set
+            # while we were listening to it
+            if self._pending.pop(id(promised), None) is not None:
+                self._completed.append(promised)
+                self._cond.notify_all()
+
+
+    def ready(self):
+        """
+        Every promise which has completed so far
+        """
+
+        with self._cond:
+            found = list(self._completed)
+            self._completed.clear()
+            return found
+
+
+    def next(self, deadline=None):
+        """
+        The next promise to complete, waiting until deadline for one
+        if needed
+        """
+
+        with self._cond:
+            if self._completed:
+                return self._completed.popleft()
+
+        # whoever is setting these may be holding on to them until
+        # someone is waiting, as happens for deliver
+        on_wait, self._on_wait = self._on_wait, []
+        for hook in on_wait:
+            hook(None)
+
+        with self._cond:
+            while not self._completed:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - _now()
+                    if remaining <= 0:
+                        raise PromiseTimeout("%i promises not completed"
+                                             % len(self._pending))
+                    self._cond.wait(remaining)
+
+            return self._completed.popleft()
+
+
+def as_completed(promises, timeout=None):
+    """
+    Yields each of promises as it is completed, meaning that it can be
+    delivered without waiting. Settable promises, as created by
+    `promise` or `promise_proxy` and the executors, are completed once
+    their setter or seterr is called. Any other promise is yielded
+    right away.
+
+    Parameters
+    ----------
+    promises : `iterable` of promises
+      the promises to wait on
+    timeout : `float` or `None`
+      seconds from the first call to wait for all of them to complete
+
+    Raises
+    ------
+    PromiseTimeout
+      if timeout passes with promises still not completed
+    """
+
+    deadline = None if timeout is None else (_now() + timeout)
+
+    waiting = _Completion(promises)
+    while len(waiting):
+        yield waiting.next(deadline)
+
+
+def wait(promises, timeout=None, return_when=ALL_COMPLETED):
+    """
+    Waits for promises to complete, as described in `as_completed`.
+
+    Parameters
+    ----------
+    promises : `iterable` of promises
+      the promises to wait on
+    timeout : `float` or `None`
+      most seconds to wait
+    return_when : `str`
+      either `FIRST_COMPLETED` to return as soon as any promise is
+      completed, or `ALL_COMPLETED` to wait for them all
+
+    Returns
+    -------
+    value : `tuple` of `(list, list)`
+      the completed promises in the order they completed, and the
+      promises not yet completed in their original order
+    """
+
+    if return_when not in (FIRST_COMPLETED, ALL_COMPLETED):
+        raise ValueError("return_when must be FIRST_COMPLETED or"
+                         " ALL_COMPLETED")
+
+    promises = list(promises)
+    deadline = None if timeout is None else (_now() + timeout)
+
+    waiting = _Completion(promises)
+    done = []
+
+    try:
+        if return_when == FIRST_COMPLETED:
+            if promises:
+                done.append(waiting.next(deadline))
+            done.extend(waiting.ready())
+        else:
+            while len(waiting):
+                done.append(waiting.next(deadline))
+    except PromiseTimeout:
+        pass
+
+    found = set(id(promised) for promised in done)
+    not_done = [p for p in promises if id(p) not in found]
+
+    return done, not_done
+
+
 class BrokenPromise(object):
     """
     Result indicating a promise was broken. See the `breakable_lazy`,
@@ -0,0 +1,447 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Asyncio Promises for Python
+
+Under Python 3.5 and later, any `Container` or `Proxy` promise may be
+awaited from a coroutine, including those created by the executors in
+`promises.multiprocess` and `promises.multithread`. Waiting that way
+costs the coroutine, rather than a thread blocked until the promise is
+set.
+
+Awaiting a `Proxy` waits on the promise rather than on its answer,
+but the proxy is otherwise as transparent as ever. Functions such as
+`asyncio.gather` which inspect what they are given will deliver on it,
+blocking the loop, so it should be wrapped with `awaitable` first.
+
+:author: Christopher O'Brien  <obriencj@gmail.com>
+:license: LGPL v.3
+
+Examples
+--------
+>>> from promises.multithread import ThreadExecutor
+>>> async def fetch_all(urls):
+...     ex = ThreadExecutor()
+...     pages = [ex.future(fetch, url) for url in urls]
+...     return [await page for page in pages]
+"""
+
+
+from . import Container, Proxy, PromiseCancelled, _promise as _new_promise
+from . import _settable_state, _unset, _wait_factory, deliver
+from asyncio import gather, get_event_loop, iscoroutinefunction
+from functools import partial
+from sys import exc_info
+from threading import Condition
+
+try:
+    from asyncio import get_running_loop
+except ImportError:
+    # Python 3.5 and 3.6, where from within a coroutine this finds
+    # the running loop anyway
+    from asyncio import get_event_loop as get_running_loop
+
+
+__all__ = ('AsyncioExecutor', 'ProxyAsyncioExecutor', 'awaitable', )
+
+
+def _current_loop():
+    try:
+        return get_running_loop()
+    except RuntimeError:
+        return get_event_loop()
+
+
+def _settle(future, promised, state):
+    """
+    Hands whatever promised was set to over to future. Always called
+    from within the future's loop.
+    """
+
+    if future.done():
+        # either it was cancelled, or we were told twice
+        return
+
+    if state is None:
+        # nothing is going to set it, so delivering it is all there is
+        # to be done
+        try:
+            value = deliver(promised)
+        except Exception as exc:
+            future.set_exception(exc)
+        else:
+            future.set_result(value)
+        return
+
+    # reading the state rather than delivering on promised, so a
+    # set exception is handed over rather than raised
+    value = state._value
+    if value is not _unset:
+        future.set_result(value)
+    else:
+        exc_type, exc_val, _exc_tb = state._exc
+        future.set_exception(exc_type() if exc_val is None else exc_val)
+
+
+def awaitable(promised, loop=None):
+    """
+    An `asyncio.Future` which is done once promised is. Awaiting a
+    promise directly does the same thing.
+
+    Settable promises, as created by `promise` or `promise_proxy` and
+    the executors, are done once their setter or seterr is called,
+    whichever thread calls it. Any other promise is delivered right
+    away, as `as_completed` would.
+
+    Parameters
+    ----------
+    promised : `Container` or `Proxy`
+      the promise to wait on
+    loop : event loop or `None`
+      the loop to wait in, defaulting to the current one
+
+    Returns
+    -------
+    value : `asyncio.Future`
+      resulting in the promise's value, or raising its exception
+    """
+
+    if loop is None:
+        loop = _current_loop()
+
+    future = loop.create_future()
+
+    state = _settable_state(promised)
+    if state is None:
+        _settle(future, promised, state)
+        return future
+
+    def settled(_promised):
+        # setters are called from whichever thread has the answer
+        loop.call_soon_threadsafe(_settle, future, promised, state)
+
+    if not state._listen(settled):
+        settled(promised)
+
+    else:
+        # whoever is setting it may be holding on to it until someone
+        # is waiting, as happens for deliver. A specific promise is
+        # never named, as the work for it mustn't be done in here.
+        on_wait = state._on_wait
+        if on_wait is not None:
+            on_wait(None)
+
+    return future
+
+
+class AsyncioExecutor(object):
+    """
+    Create promises which will deliver from an asyncio event loop.
+
+    Coroutine functions given to `future` are run as tasks on the
+    loop. Anything else is run in the loop's executor, as by
+    `run_in_executor`. Either way, the promise may be awaited from
+    within the loop, or delivered as usual from any thread other than
+    the loop's own.
+
+    The loop is never stopped or closed by this executor, so `deliver`
+    is the same as `flush`.
+    """
+
+    _promise_type = Container
+
+
+    def __init__(self, loop=None, executor=None, wait_backend=None):
+        """
+        Parameters
+        ----------
+        loop : event loop or `None`
+          the loop to perform work in, defaulting to the current one
+        executor : `concurrent.futures.Executor` or `None`
+          for `run_in_executor` to run anything other than coroutine
+          functions in, defaulting to the loop's own
+        wait_backend : `str` or `callable` or `None`
+          what delivering one of our promises waits with, as for
+          `promises.set_wait_backend`. `"asyncio"` makes promises
+          which can only be awaited
+        """
+
+        if loop is None:
+            loop = _current_loop()
+
+        self._loop = loop
+        self._executor = executor
+        self._idle = Condition()
+
+        if wait_backend is not None:
+            wait_backend = _wait_factory(wait_backend)
+        self._new_waiter = wait_backend
+
+        # the receiver of each promise yet to be set, and the task
+        # performing its work once started, by id of the promise
+        self._unfinished = {}
+        self._tasks = {}
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, _exc_val, _exc_tb):
+        """
+        Using the managed interface forces blocking delivery at the end of
+        the managed segment, so it can't be used from within the loop.
+        """
+
+        self.deliver()
+        return (exc_type is None)
+
+
+    def __aenter__(self):
+        future = self._loop.create_future()
+        future.set_result(self)
+        return future
+
+
+    def __aexit__(self, _exc_type, _exc_val, _exc_tb):
+        """
+        Using the asynchronous managed interface awaits `completed` at
+        the end of the managed segment.
+        """
+
+        return self.completed()
+
+
+    def _promise(self):
+        """
+        override to use a different promise mechanism
+        """
+
+        return _new_promise(self._promise_type, True, None,
+                            self._new_waiter)
+
+
+    def future(self, work, *args, **kwds):
+        """
+        Promise to deliver on the results of work in the future. May be
+        called from any thread.
+
+        Parameters
+        ----------
+        work : `callable`
+          This is the work which will be performed to deliver on the
+          future. Either a coroutine function, or a function to be run
+          in the loop's executor.
+        args : `tuple`
+          positional arguments to be passed to `work`
+        kwds : `dict`
+          keyword arguments to be passed to `work`
+
+        Returns
+        -------
+        value : `Container` or `Proxy`
+          an awaitable promise to deliver on the result of work
+        """
+
+        promised, setter, seterr = self._promise()
+        receiver = (promised, setter, seterr)
+
+        with self._idle:
+            self._unfinished[id(promised)] = receiver
+
+        self._loop.call_soon_threadsafe(self._start, work, args, kwds,
+                                        receiver)
+        return promised
+
+
+    def map(self, work, iterable):
+        """
+        Promises to deliver on the results of work for each item in
+        iterable, as with `future`.
+
+        Returns
+        -------
+        values : `list`
+          a promise for each item, in the same order
+        """
+
+        return [self.future(work, item) for item in iterable]
+
+
+    def _start(self, work, args, kwds, receiver):
+        # always called from within the loop
+        promised, _setter, seterr = receiver
+
+        try:
+            if iscoroutinefunction(work):
+                task = self._loop.create_task(work(*args, **kwds))
+            else:
+                task = self._loop.run_in_executor(self._executor,
+                                                  partial(work, *args,
+                                                          **kwds))
+        except Exception:
+            if self._forget(promised):
+                seterr(*exc_info())
+                self._notify()
+            return
+
+        with self._idle:
+            if id(promised) not in self._unfinished:
+                # terminated before it could be started
+                task.cancel()
+                return
+            self._tasks[id(promised)] = task
+
+        task.add_done_callback(partial(self._finished, receiver))
+
+
+    def _finished(self, receiver, task):
+        promised, setter, seterr = receiver
+
+        if not self._forget(promised):
+            # terminate has already broken this promise
+            return
+
+        try:
+            if task.cancelled():
+                seterr(PromiseCancelled, PromiseCancelled("cancelled"), None)
+            else:
+                exc = task.exception()
+                if exc is None:
+                    setter(task.result())
+                else:
+                    seterr(type(exc), exc, exc.__traceback__)
+        finally:
+            self._notify()
+
+
+    def _forget(self, promised):
+        """
+        Takes promised out of the unfinished work, returning `False` if
+        it had already been taken out by someone else
+        """
+
+        with self._idle:
+            self._tasks.pop(id(promised), None)
+            return self._unfinished.pop(id(promised), None) is not None
+
+
+    def _notify(self):
+        with self._idle:
+            if not self._unfinished:
+                self._idle.notify_all()
+
+
+    def _in_loop(self):
+        try:
+            return get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+
+    def completed(self):
+        """
+        An awaitable which is done once every promise this executor has
+        created so far has been delivered. For use from within the
+        loop, where `flush` cannot be.
+
+        Returns
+        -------
+        value : `asyncio.Future`
+          resulting in `None`, however the promises turned out
+        """
+
+        loop = self._loop
+        done = loop.create_future()
+
+        with self._idle:
+            waiting = [awaitable(receiver[0], loop)
+                       for receiver in self._unfinished.values()]
+
+        if not waiting:
+            done.set_result(None)
+            return done
+
+        def gathered(_future):
+            if not done.done():
+                done.set_result(None)
+
+        gather(*waiting, return_exceptions=True).add_done_callback(gathered)
+        return done
+
+
+    def flush(self):
+        """
+        Blocks until every promise this executor has created so far
+        has been delivered. Waiting in the loop's own thread would
+        leave nothing to deliver them, so from there this raises
+        `RuntimeError` instead, and `completed` should be awaited.
+        """
+
+        if self._in_loop():
+            raise RuntimeError("flush would block the event loop,"
+                               " await completed() instead")
+
+        with self._idle:
+            while self._unfinished:
+                self._idle.wait()
+
+
+    def terminate(self):
+        """
+        Breaks all the remaining undelivered promises, and cancels the
+        tasks working on them. Attempting to deliver on them will
+        raise `PromiseCancelled`.
+
+        Work already running in the loop's executor can't be stopped,
+        but its results will be ignored.
+        """
+
+        with self._idle:
+            broken = list(self._unfinished.values())
+            tasks = list(self._tasks.values())
+            self._unfinished.clear()
+            self._tasks.clear()
+            self._idle.notify_all()
+
+        for task in tasks:
+            self._loop.call_soon_threadsafe(task.cancel)
+
+        exc = PromiseCancelled("executor terminated")
+        for _promised, _setter, seterr in broken:
+            seterr(PromiseCancelled, exc, None)
+
+
+    def deliver(self):
+        """
+        Deliver on all underlying promises. Blocks until complete, and
+        so cannot be called from within the loop.
+        """
+
+        self.flush()
+
+
+class ProxyAsyncioExecutor(AsyncioExecutor):
+    """
+    Create transparent proxy promises which will deliver from an
+    asyncio event loop
+    """
+
+    _promise_type = Proxy
+
+
+#
+# The end.
@@ -21,11 +21,49 @@ Multi-process Promises for Python
 """
 
 
-from . import promise, promise_proxy
+from . import Container, Proxy, _promise as _new_promise, _wait_factory
+from . import _now
+from . import PromiseAlreadyDelivered, PromiseCancelled
+from collections import deque
+from glob import glob
+from functools import partial
+from itertools import islice
+from mmap import ACCESS_READ, mmap
+from multiprocessing import cpu_count
 from multiprocessing.pool import Pool
+from os import close, fdopen, unlink
+from os.path import exists, isdir, join
+from sys import exc_info, version_info
+from tempfile import gettempdir, mkstemp
+from threading import Condition, Lock, Thread
+from types import BuiltinFunctionType, FunctionType
+from uuid import uuid4
 
+try:
+    from weakref import finalize as _finalize
+except ImportError:
+    # Python 2, where the best that can be done is at exit
+    from atexit import register as _at_exit
 
-__all__ = ('ProcessExecutor', 'ProxyProcessExecutor')
+    def _finalize(_obj, func, *args):
+        _at_exit(func, *args)
+        return func
+
+try:
+    from cPickle import HIGHEST_PROTOCOL, dump as pickle_dump
+    from cPickle import load as pickle_load
+except ImportError:
+    from pickle import HIGHEST_PROTOCOL, dump as pickle_dump
+    from pickle import load as pickle_load
+
+try:
+    from queue import Empty, Queue
+except ImportError:
+    from Queue import Empty, Queue
+
+
+__all__ = ('ProcessExecutor', 'ProxyProcessExecutor', 'ExecutorFull',
+           'flight_key', )
 
 
 def _perform_work(*args, **kwds):
@@ -43,6 +81,12 @@ def _perform_work(*args, **kwds):
     work, args = args
 
     try:
+        if _has_shared(args, kwds):
+            args, kwds = _resolve_shared(args, kwds)
+        if type(work) is partial and _has_shared(work.args, work.keywords):
+            part_args, part_kwds = _resolve_shared(work.args,
+                                                   work.keywords or {})
+            work = partial(work.func, *part_args, **part_kwds)
         return (True, work(*args, **kwds))
     except Exception as exc:
         # we are discarding the stack trace as it won't survive
@@ -51,14 +95,616 @@ def _perform_work(*args, **kwds):
         return (False, (type(exc), exc, None))
 
 
+def _perform_chunk(work, chunk, kwds, mmap_threshold=None,
+                   map_prefix="promises-"):
+    """
+    As `_perform_work`, for each of a chunk of argument tuples. This
+    lets many small pieces of work share a single trip to and from a
+    worker.
+
+    Returns
+    -------
+    values : `list`
+      the result of `_perform_work` for each argument tuple, with
+      any result of at least mmap_threshold bytes moved into a file
+      named with map_prefix by `_map_result`
+    """
+
+    if type(work) is _Shared:
+        try:
+            work = work.resolve()
+        except Exception as exc:
+            failed = (False, (type(exc), exc, None))
+            return [failed for _args in chunk]
+
+    values = [_perform_work(work, args, **kwds) for args in chunk]
+    if mmap_threshold:
+        values = [_map_result(value, mmap_threshold, map_prefix)
+                  for value in values]
+    return values
+
+
+_PY3 = (version_info[0] >= 3)
+
+
+# marks a _Shared handle which has left the process that made it
+_unshared = object()
+
+
+# the path and object loaded by this worker from each `_Shared`
+# handle, by key
+_shared_cache = {}
+
+# the keys of _shared_cache, oldest first
+_shared_order = deque()
+
+
+# most objects a worker keeps loaded from `_Shared` handles at a time
+_MAX_SHARED_CACHE = 64
+
+
+class _Shared(object):
+    """
+    A handle on an object given to `ProcessExecutor.share`. Only the
+    key and the path of the file holding the pickled object travel
+    with the handle to a worker, which loads it the first time it is
+    needed and keeps it from then on.
+    """
+
+    __slots__ = ('key', 'path', '_obj')
+
+
+    def __init__(self, key, path, obj=_unshared):
+        self.key = key
+        self.path = path
+        self._obj = obj
+
+
+    def __getstate__(self):
+        return (self.key, self.path)
+
+
+    def __setstate__(self, state):
+        self.key, self.path = state
+        self._obj = _unshared
+
+
+    def __repr__(self):
+        return "<promises.multiprocess shared %s>" % self.key
+
+
+    def resolve(self):
+        obj = self._obj
+        if obj is not _unshared:
+            # we're still in the process which shared it
+            return obj
+
+        cached = _shared_cache.get(self.key)
+        if cached is not None:
+            return cached[1]
+
+        with open(self.path, "rb") as found:
+            obj = pickle_load(found)
+
+        _evict_shared()
+        _shared_cache[self.key] = (self.path, obj)
+        _shared_order.append(self.key)
+        return obj
+
+
+def _evict_shared():
+    """
+    Makes room in this worker's cache for one more loaded object. Any
+    whose file has since been removed by `unshare` or by its executor
+    shutting down can never be asked for again, and are dropped first.
+    After those, the oldest go, to be loaded again if they're needed.
+    """
+
+    for key, (path, _obj) in list(_shared_cache.items()):
+        if not exists(path):
+            del _shared_cache[key]
+            _shared_order.remove(key)
+
+    while len(_shared_cache) >= _MAX_SHARED_CACHE:
+        del _shared_cache[_shared_order.popleft()]
+
+
+def _has_shared(args, kwds):
+    for arg in args:
+        if type(arg) is _Shared:
+            return True
+    if kwds:
+        for arg in kwds.values():
+            if type(arg) is _Shared:
+                return True
+    return False
+
+
+def _resolve_shared(args, kwds):
+    """
+    Swaps any `_Shared` handles passed as arguments for the objects
+    they refer to
+    """
+
+    args = tuple((arg.resolve() if type(arg) is _Shared else arg)
+                 for arg in args)
+    kwds = dict((key, (arg.resolve() if type(arg) is _Shared else arg))
+                for key, arg in kwds.items())
+    return args, kwds
+
+
+# work of these types pickles as nothing more than its name, so there
+# is nothing to be saved by registering it
+_BY_NAME = (FunctionType, BuiltinFunctionType, type)
+
+
+# most distinct pieces of work an executor will register at a time
+_MAX_WORKS = 256
+
+
+# a memory-backed filesystem, where one is to be found
+_MAP_DIR = "/dev/shm" if isdir("/dev/shm") else None
+
+
+# the single native struct codes which a memoryview can be cast back
+# to. Anything with a byte order, or a compound format, is pickled
+_MAP_FORMATS = frozenset("cbB?hHiIlLqQnNfdP")
+
+
+class _MappedResult(object):
+    """
+    Stands in for a large result on its way back from a worker, which
+    has been written to a file rather than pickled
+    """
+
+    __slots__ = ('path', 'nbytes', 'format', 'shape')
+
+
+    def __init__(self, path, nbytes, format, shape):
+        self.path = path
+        self.nbytes = nbytes
+        self.format = format
+        self.shape = shape
+
+
+    def __getstate__(self):
+        return (self.path, self.nbytes, self.format, self.shape)
+
+
+    def __setstate__(self, state):
+        self.path, self.nbytes, self.format, self.shape = state
+
+
+def _unlink_quietly(path):
+    try:
+        unlink(path)
+    except OSError:
+        pass
+
+
+def _remove_files(shares, pattern, _glob=glob, _unlink=unlink):
+    """
+    Removes the files an executor has shared, and, given a pattern
+    matching the files its workers write results to, any results which
+    never made it back to be unlinked on arrival.
+
+    Also the finalizer for an executor which is never delivered or
+    terminated, and so mustn't refer to the executor itself. Under
+    Python 2 that runs at exit, possibly after this module's globals
+    have been cleared, so it keeps hold of what it needs.
+    """
+
+    paths = list(shares.values())
+    shares.clear()
+
+    if pattern is not None:
+        paths.extend(_glob(pattern))
+
+    for path in paths:
+        try:
+            _unlink(path)
+        except OSError:
+            pass
+
+
+def _map_result(value, threshold, prefix="promises-"):
+    """
+    In the worker, writes a successful result supporting the buffer
+    protocol out to a temporary file named with prefix, if it is at
+    least threshold bytes, and replaces it with a `_MappedResult`
+    naming that file.
+    """
+
+    success, result = value
+    if not success:
+        return value
+
+    try:
+        view = memoryview(result)
+    except TypeError:
+        return value
+
+    nbytes = view.itemsize
+    for dim in (view.shape or ()):
+        nbytes *= dim
+
+    if not nbytes or nbytes < threshold:
+        return value
+
+    format = view.format
+    if format[:1] == "@":
+        format = format[1:]
+    if format not in _MAP_FORMATS:
+        return value
+
+    if _PY3:
+        if not view.c_contiguous:
+            return value
+        data = view.cast("B") if format != "B" else view
+    else:
+        data = view.tobytes()
+
+    try:
+        fd, path = mkstemp(prefix=prefix, dir=_MAP_DIR)
+    except Exception:
+        # no room at the inn, so it'll have to be pickled after all
+        return value
+
+    try:
+        with fdopen(fd, "wb") as out:
+            fd = None
+            out.write(data)
+    except Exception:
+        if fd is not None:
+            close(fd)
+        _unlink_quietly(path)
+        return value
+    except BaseException:
+        if fd is not None:
+            close(fd)
+        _unlink_quietly(path)
+        raise
+
+    return (True, _MappedResult(path, nbytes, format, view.shape))
+
+
+def _unmap_result(value):
+    """
+    In the parent, replaces a `_MappedResult` with a read-only view
+    onto its file, which is then unlinked. The memory is released once
+    nothing refers to the view any longer.
+    """
+
+    success, result = value
+    if not (success and type(result) is _MappedResult):
+        return value
+
+    try:
+        try:
+            with open(result.path, "rb") as found:
+                mapped = mmap(found.fileno(), result.nbytes,
+                              access=ACCESS_READ)
+        finally:
+            _unlink_quietly(result.path)
+
+        if not _PY3:
+            # Python 2 can't take a memoryview of an mmap, but it can
+            # be sliced and read from much the same
+            return (True, mapped)
+
+        view = memoryview(mapped)
+        if result.format != "B" or len(result.shape) != 1:
+            view = view.cast(result.format, result.shape)
+        return (True, view)
+
+    except Exception as exc:
+        # this is called from the pool's result handler, which mustn't
+        # be allowed to die, so the failure goes to this one promise
+        return (False, (type(exc), exc, None))
+
+
+# only Python 3 pools will tell us when they failed to hand work back
+# to us, rather than dropping it on the floor
+_ERROR_CALLBACK = (version_info[0] >= 3)
+
+
+def _receive(receivers, values):
+    """
+    Hands each of the values collected by `_perform_chunk` to its
+    matching `(promise, setter, seterr)` receiver
+    """
+
+    for (_promised, setter, seterr), (success, result) in \
+            zip(receivers, values):
+        if success:
+            setter(result)
+        else:
+            seterr(*result)
+
+
+def _remove(chunk, receivers, promised):
+    """
+    Takes promised and its arguments out of a chunk which hasn't been
+    sent anywhere yet, returning its receiver, or `None` if it wasn't
+    there to be taken
+    """
+
+    for index, receiver in enumerate(receivers):
+        if receiver[0] is promised:
+            del chunk[index]
+            del receivers[index]
+            return receiver
+
+    return None
+
+
+class ExecutorFull(Exception):
+    """
+    Raised when submitting work to an executor which already has
+    `max_pending` undelivered promises, and was asked to raise rather
+    than wait or work inline.
+    """
+
+    pass
+
+
+def flight_key(work, args, kwds):
+    """
+    The default key by which `ProcessExecutor` recognizes identical
+    calls to `future` when given `dedup=True`. Arguments are told apart
+    by type as well as by value, as with `functools.lru_cache` given
+    `typed=True`, so that `1`, `1.0`, and `True` aren't one call. A call
+    with any unhashable argument isn't deduplicated at all.
+    """
+
+    types = tuple(type(arg) for arg in args)
+    if kwds:
+        items = tuple(sorted(kwds.items()))
+        return (work, args, types, items,
+                tuple(type(value) for _key, value in items))
+    else:
+        return (work, args, types)
+
+
+# what an executor does with new work once it is at max_pending
+_ON_FULL = ("block", "inline", "raise")
+
+
+class _Batch(object):
+    """
+    Consecutive calls to `ProcessExecutor.future` with the same work
+    and keywords, waiting to be submitted together as one chunk
+    """
+
+    __slots__ = ('work', 'kwds', 'chunk', 'receivers', 'deadline')
+
+
+    def __init__(self, work, kwds):
+        self.work = work
+        self.kwds = kwds
+        self.chunk = []
+        self.receivers = []
+        self.deadline = None
+
+
+def _same_batch(batch, work, kwds):
+    """
+    Whether a call to work with kwds may join batch. The keyword
+    arguments must be the very same objects, as comparing them with
+    `==` would deliver any promises among them, and isn't even
+    possible for some values.
+    """
+
+    if batch.work != work:
+        return False
+
+    other = batch.kwds
+    if kwds is other:
+        return True
+    if len(kwds) != len(other):
+        return False
+    for key, value in kwds.items():
+        if other.get(key, _unshared) is not value:
+            return False
+    return True
+
+
+# seconds the batch flusher thread waits for a new batch before it
+# gives up, to be started again by the next one
+_FLUSHER_IDLE = 1.0
+
+
+class _Task(object):
+    """
+    A chunk of work held by an executor until there's room for it in
+    the pool, unless a delivery claims it first
+    """
+
+    __slots__ = ('work', 'chunk', 'kwds', 'receivers', 'claimed')
+
+
+    def __init__(self, work, chunk, kwds, receivers):
+        self.work = work
+        self.chunk = chunk
+        self.kwds = kwds
+        self.receivers = receivers
+        self.claimed = False
+
+
 class ProcessExecutor(object):
     """
     Create promises which will deliver in a separate process.
+
+    By default each executor creates its own pool when it is first
+    given work, and shuts that pool down again in `deliver` or
+    `terminate`. An executor may instead be given a long-lived pool
+    to share with others, in which case shutting that pool down is
+    left to whoever created it.
+
+    Given a `batch_size`, consecutive calls to `future` with the same
+    work are gathered up and sent to the pool together, as `map` does.
+    A batch is sent once it is full, once it has waited `linger`
+    seconds, or as soon as anyone blocks waiting on one of its
+    promises.
+
+    Given a `max_pending`, the executor keeps no more than that many
+    undelivered promises of its own at a time. What happens to work
+    submitted past that is decided by `on_full`: `"block"` waits for
+    room, `"inline"` performs the work immediately in the calling
+    thread, and `"raise"` raises `ExecutorFull`.
+
+    With `deliver_inline`, the executor only hands the pool a little
+    more work than it has workers, holding on to the rest itself.
+    Delivering a promise whose work is still being held performs that
+    work right away in the delivering thread, rather than waiting for
+    it to reach the front of the queue.
+
+    Given an `mmap_threshold`, results of at least that many bytes
+    which support the buffer protocol are written by the worker into a
+    temporary memory-mapped file, rather than pickled back through the
+    pool. The promise then delivers a read-only `memoryview` of that
+    file, of the same format and shape as the worker's result, so the
+    parent never copies it. Under Python 2 it delivers the `mmap`
+    itself. This only happens in separate processes.
+
+    With `dedup`, a call to `future` which is identical to one still
+    in flight doesn't become more work. Its promise is instead given
+    the same result as that earlier call, once it arrives.
+
+    Large read-only objects needed by many calls can be given to
+    `share`, and the handle it returns passed in their place. Each
+    worker then loads the object once, rather than having it pickled
+    along with every call. Such a handle may also be given as the
+    work itself.
+
+    With `register_work`, work which carries state of its own, such
+    as a `functools.partial`, a bound method, or a callable instance,
+    is shared automatically the first time it is sent to a worker, and
+    from then on only the registration travels with each call. Work
+    registered this way must not change afterwards, as the workers
+    will go on using their copy of it. The registry is emptied by
+    `deliver` and `terminate`.
+
+    A `wait_backend` lets delivery of this executor's promises wait
+    cooperatively under gevent or eventlet, or not at all for those
+    to be awaited under asyncio, without changing what every other
+    promise in the process waits with.
     """
 
-    def __init__(self, processes=None):
+    _promise_type = Container
+
+    # whether work is performed in another process, and so results are
+    # worth mapping rather than pickling, and shared objects are worth
+    # writing out for workers to load
+    _out_of_process = True
+
+
+    def __init__(self, processes=None, pool=None,
+                 batch_size=0, linger=0.001,
+                 max_pending=0, on_full="block", deliver_inline=False,
+                 dedup=False, mmap_threshold=None, wait_backend=None,
+                 register_work=False):
+        """
+        Parameters
+        ----------
+        processes : `int` or `None`
+          size of the pool to create. Defaults to the number of CPUs
+        pool : `multiprocessing.pool.Pool` or `None`
+          an existing pool to submit work to, which this executor
+          will never close or terminate
+        batch_size : `int`
+          most calls to `future` to send to a worker at a time. The
+          default of zero sends each call on its own
+        linger : `float` or `None`
+          seconds a batch may wait to fill before it is sent anyway.
+          `None` to only send batches when full or needed
+        max_pending : `int`
+          most undelivered promises to have at once. The default of
+          zero is unlimited
+        on_full : `str`
+          one of `"block"`, `"inline"`, or `"raise"`
+        deliver_inline : `bool`
+          perform work which hasn't reached a worker in whichever
+          thread delivers its promise
+        dedup : `bool` or `callable`
+          share one result among identical calls to `future` which
+          are in flight at the same time. Either `True` to compare
+          calls by `flight_key`, or a function of `(work, args, kwds)`
+          returning a hashable key to compare them by instead, or
+          `None` for a call not to be deduplicated
+        mmap_threshold : `int` or `None`
+          least number of bytes in a result for it to be delivered
+          through a memory-mapped file, or `None` to always pickle
+        wait_backend : `str` or `callable` or `None`
+          what delivering one of our promises waits with, as for
+          `promises.set_wait_backend`. Defaults to whatever that was
+          last given when each promise is created
+        register_work : `bool`
+          share each distinct piece of work carrying state of its own
+          with the workers once, rather than pickling it with every
+          call
+        """
+
+        if on_full not in _ON_FULL:
+            raise ValueError("on_full must be one of %r" % (_ON_FULL, ))
+
         self._processes = processes
-        self._pool = None
+        self._pool = pool
+        self._shared = (pool is not None)
+        self._idle = Condition()
+
+        # the receivers of each chunk of work yet to come back, by id
+        self._unfinished = {}
+
+        self._batch_size = batch_size
+        self._linger = linger
+        self._batch = None
+        self._batch_lock = Condition(Lock())
+        self._flusher = None
+
+        self._max_pending = max_pending
+        self._on_full = on_full
+        self._pending = 0
+
+        self._deliver_inline = deliver_inline
+        self._queued = deque()
+        self._claimable = {}
+        self._dispatched = 0
+        self._queue_lock = Lock()
+
+        if dedup is True:
+            dedup = flight_key
+        self._dedup = dedup
+        self._flights = {}
+        self._leaders = {}
+        self._flights_lock = Lock()
+
+        if not self._out_of_process:
+            mmap_threshold = None
+        self._mmap_threshold = mmap_threshold
+
+        # the files written by share, by key, and what the files our
+        # workers write results to are named with. Should we be
+        # dropped without a deliver or terminate, the finalizer
+        # removes them.
+        self._shares = {}
+        self._map_prefix = None
+        self._map_pattern = None
+        self._finalizer = None
+        if mmap_threshold:
+            self._map_prefix = "promises-%s-" % uuid4().hex[:12]
+            self._map_pattern = join(_MAP_DIR or gettempdir(),
+                                     self._map_prefix + "*")
+            self._track_files()
+
+        if wait_backend is not None:
+            wait_backend = _wait_factory(wait_backend)
+        self._new_waiter = wait_backend
+
+        # the handle each piece of work was registered under, by work
+        self._register_work = register_work
+        self._works = {}
+        self._works_lock = Lock()
 
 
     def __enter__(self):
@@ -80,7 +726,12 @@ class ProcessExecutor(object):
         override to use a different promise mechanism
         """
 
-        return promise(blocking=True)
+        if self._batch_size > 1 or self._deliver_inline:
+            on_wait = self._waiting
+        else:
+            on_wait = None
+        return _new_promise(self._promise_type, True, on_wait,
+                            self._new_waiter)
 
 
     def _get_pool(self):
@@ -114,24 +765,715 @@ class ProcessExecutor(object):
           evaluating `work(*args, **kwds)`. Note that calling `deliver`
           on this promise will potentially block until the underlying
           result is available.
+
+        Raises
+        ------
+        ExecutorFull
+          if the executor is at `max_pending` and `on_full` is
+          `"raise"`
         """
 
         promised, setter, seterr = self._promise()
 
-        def callback(value):
-            # value is collected as the result of the _perform_work
-            # function at the top of this module
-            success, result = value
-            if success:
-                setter(result)
+        key = self._flight(work, args, kwds)
+        if key is not None:
+            with self._flights_lock:
+                followers = self._flights.get(key)
+                if followers is not None:
+                    followers.append((promised, setter, seterr))
+                    return promised
+                self._flights[key] = []
+                self._leaders[id(promised)] = key
+
+            setter, seterr = self._leader(key, promised, setter, seterr)
+
+        try:
+            self._enqueue(work, args, kwds, (promised, setter, seterr))
+        except BaseException:
+            if key is not None:
+                # let go of the key, and of anything which followed
+                seterr(*exc_info())
+            raise
+
+        return promised
+
+
+    def _flight(self, work, args, kwds):
+        """
+        The key identical calls to work share, or `None` if calls
+        aren't deduplicated or this one can't be
+        """
+
+        if not self._dedup:
+            return None
+
+        try:
+            key = self._dedup(work, args, kwds)
+            hash(key)
+        except TypeError:
+            # deduplicating is only ever a saving, so a call which
+            # can't be keyed is simply performed
+            return None
+        return key
+
+
+    def _leader(self, key, promised, setter, seterr):
+        """
+        Wraps the setter and seterr of the first of some identical
+        calls, so that whatever it is given is also given to the
+        calls which followed it
+        """
+
+        def landed():
+            # from here on an identical call is new work again
+            with self._flights_lock:
+                self._leaders.pop(id(promised), None)
+                return self._flights.pop(key, ())
+
+        def leader_setter(value):
+            followers = landed()
+            setter(value)
+            for _promised, follower_setter, _seterr in followers:
+                follower_setter(value)
+
+        def leader_seterr(*exc_info):
+            followers = landed()
+            seterr(*exc_info)
+            for _promised, _setter, follower_seterr in followers:
+                follower_seterr(*exc_info)
+
+        return leader_setter, leader_seterr
+
+
+    def _enqueue(self, work, args, kwds, receiver):
+        if self._max_pending and not self._reserve(1):
+            _receive([receiver], [_perform_work(work, args, **kwds)])
+
+        elif self._batch_size > 1:
+            self._batch_future(work, args, kwds, receiver)
+        else:
+            self._submit(work, [args], kwds, [receiver])
+
+
+    def _batch_future(self, work, args, kwds, receiver):
+        with self._batch_lock:
+            batch = self._batch
+            if batch is not None and \
+                    not _same_batch(batch, work, kwds):
+                self._submit_batch()
+                batch = None
+
+            if batch is None:
+                batch = self._batch = _Batch(work, kwds)
+                if self._linger is not None:
+                    batch.deadline = _now() + self._linger
+                    if self._flusher is None:
+                        self._flusher = Thread(target=self._flush_batches)
+                        self._flusher.daemon = True
+                        self._flusher.start()
+                    else:
+                        self._batch_lock.notify()
+
+            batch.chunk.append(args)
+            batch.receivers.append(receiver)
+
+            if len(batch.chunk) >= self._batch_size:
+                self._submit_batch()
+
+
+    def _submit_batch(self):
+        # the batch lock must be held by the caller
+        batch = self._batch
+        self._batch = None
+
+        # every call in the batch may have been cancelled
+        if batch.receivers:
+            self._submit(batch.work, batch.chunk, batch.kwds,
+                         batch.receivers)
+
+
+    def _waiting(self, promised):
+        """
+        The on_wait hook of our promises, called when something is
+        about to block waiting on promised, or on several promises if
+        promised is `None`
+        """
+
+        if self._batch_size > 1:
+            self._cut_batch()
+
+        if promised is not None and self._deliver_inline:
+            self._claim(promised)
+
+
+    def _cut_batch(self):
+        """
+        Sends the open batch to the pool now, rather than waiting for
+        it to fill
+        """
+
+        with self._batch_lock:
+            if self._batch is not None:
+                self._submit_batch()
+
+
+    def _flush_batches(self):
+        """
+        The flusher thread, which sends each open batch along once it
+        has lingered long enough. It leaves once no batch has been
+        opened for a while, and the next batch starts another.
+        """
+
+        # kept locally, as Python 2 clears module globals out from
+        # under daemon threads while exiting
+        clock, idle = _now, _FLUSHER_IDLE
+
+        with self._batch_lock:
+            idle_until = None
+            while True:
+                now = clock()
+                batch = self._batch
+
+                if batch is not None:
+                    idle_until = None
+                    if now >= batch.deadline:
+                        self._submit_batch()
+                    else:
+                        self._batch_lock.wait(batch.deadline - now)
+
+                elif idle_until is None:
+                    idle_until = now + idle
+
+                elif now < idle_until:
+                    self._batch_lock.wait(idle_until - now)
+
+                else:
+                    self._flusher = None
+                    return
+
+
+    def map(self, work, iterable, chunksize=None):
+        """
+        Promise to deliver on the results of work for each item of
+        iterable in the future. The items are sent to the pool in
+        chunks, so that small pieces of work don't each pay for a
+        trip to and from a worker.
+
+        Parameters
+        ----------
+        work : `callable`
+          the work which will be performed on each item
+        iterable : `iterable`
+          the items to perform work on
+        chunksize : `int` or `None`
+          how many items to send to a worker at a time. By default
+          the items are split into roughly four chunks per worker
+
+        Returns
+        -------
+        values : `list` of `promise`
+          a promise for each item, in the same order. Each promise may
+          be delivered as soon as the chunk holding its item has been
+          completed.
+        """
+
+        items = [(item,) for item in iterable]
+        self._cut_batch()
+
+        if chunksize is None:
+            chunksize, extra = divmod(len(items), self._pool_size() * 4)
+            if extra:
+                chunksize += 1
+        if self._max_pending:
+            chunksize = min(chunksize, self._max_pending)
+        chunksize = max(1, int(chunksize))
+
+        promises = []
+        for index in range(0, len(items), chunksize):
+            chunk = items[index:index + chunksize]
+
+            receivers = []
+            for _args in chunk:
+                promised, setter, seterr = self._promise()
+                promises.append(promised)
+                receivers.append((promised, setter, seterr))
+
+            if self._max_pending and not self._reserve(len(chunk)):
+                _receive(receivers, _perform_chunk(work, chunk, {}))
+            else:
+                self._submit(work, chunk, {}, receivers)
+
+        return promises
+
+
+    def imap(self, work, iterable, window=None):
+        """
+        Lazily promise to deliver on the results of work for each item
+        of iterable, which may be unending. No more than window items
+        are in flight at a time, so an iterator is only consumed as
+        quickly as its results are.
+
+        Parameters
+        ----------
+        work : `callable`
+          the work which will be performed on each item
+        iterable : `iterable`
+          the items to perform work on
+        window : `int` or `None`
+          most items to have in flight at once. Defaults to twice the
+          size of the pool
+
+        Returns
+        -------
+        values : generator of `promise`
+          a promise for each item, in the same order. Each is yielded
+          once it has been delivered, so a failed item will raise only
+          when delivered by the caller.
+        """
+
+        return self._imap(work, iterable, window, True)
+
+
+    def imap_unordered(self, work, iterable, window=None):
+        """
+        As `imap`, but yields each promise as soon as it is delivered,
+        rather than in the order of iterable.
+        """
+
+        return self._imap(work, iterable, window, False)
+
+
+    def _imap(self, work, iterable, window, ordered):
+        window = max(1, window or self._pool_size() * 2)
+        items = iter(iterable)
+
+        # rather than delivering each promise to wait on it, each
+        # setter reports here once it's done
+        completed = Queue()
+
+        def submit(item):
+            promised, setter, seterr = self._promise()
+
+            def completed_setter(value):
+                setter(value)
+                completed.put(promised)
+
+            def completed_seterr(*exc_info):
+                seterr(*exc_info)
+                completed.put(promised)
+
+            self._enqueue(work, (item, ), {},
+                          (promised, completed_setter, completed_seterr))
+            return promised
+
+        def next_completed():
+            try:
+                return completed.get_nowait()
+            except Empty:
+                # nothing is done yet, so make sure nothing we're
+                # waiting on is still sitting in a batch
+                self._cut_batch()
+                return completed.get()
+
+        # promises are kept by id, as comparing proxies would deliver
+        # them, and compare their answers instead
+        inflight = deque(submit(item) for item in islice(items, window))
+        finished = set()
+
+        while inflight:
+            if ordered:
+                promised = inflight.popleft()
+                while id(promised) not in finished:
+                    finished.add(id(next_completed()))
+                finished.discard(id(promised))
             else:
-                seterr(*result)
+                # in completion order, only how many are in flight
+                # matters
+                promised = next_completed()
+                inflight.pop()
+
+            # top up the window before handing this one over, so the
+            # pool has work while the caller is busy with it
+            for item in islice(items, 1):
+                inflight.append(submit(item))
+
+            yield promised
+
+
+    def _pool_size(self):
+        if self._shared:
+            # not the most public of attributes, but present on both
+            # Pool and ThreadPool since they've existed
+            size = getattr(self._pool, "_processes", None)
+        else:
+            size = self._processes
+        return size or cpu_count()
+
+
+    def _reserve(self, count):
+        """
+        Counts another count promises as pending, first making room
+        for them if needed as `on_full` says.
+
+        Returns
+        -------
+        value : `bool`
+          `False` if the work should be performed inline instead
+        """
+
+        limit = self._max_pending
+
+        with self._idle:
+            if not self._pending or self._pending + count <= limit:
+                self._pending += count
+                return True
+
+            elif self._on_full == "inline":
+                return False
+
+            elif self._on_full == "raise":
+                raise ExecutorFull("%i promises pending" % self._pending)
+
+        # some of what we're waiting on may be sitting in a batch,
+        # which needs to go to the pool to ever be delivered
+        self._cut_batch()
+
+        with self._idle:
+            while self._pending and self._pending + count > limit:
+                self._idle.wait()
+            self._pending += count
+            return True
+
+
+    def _submit(self, work, chunk, kwds, receivers):
+        """
+        Queues work, once for each argument tuple in chunk, and hands
+        each result to the matching `(promise, setter, seterr)`
+        receiver.
+        """
+
+        with self._idle:
+            self._unfinished[id(receivers)] = receivers
+
+        if not self._deliver_inline:
+            self._apply(work, chunk, kwds, receivers, False)
+            return
+
+        task = _Task(work, chunk, kwds, receivers)
+        with self._queue_lock:
+            self._queued.append(task)
+            for receiver in receivers:
+                self._claimable[id(receiver[0])] = task
+
+        self._dispatch()
+
+
+    def _apply(self, work, chunk, kwds, receivers, dispatched):
+        """
+        Queues work in the pool. If dispatched, then when it is done
+        there will be room for `_dispatch` to send along more.
+        """
+
+        def finished():
+            self._done(receivers)
+            if dispatched:
+                self._dispatch(1)
+
+        threshold = self._mmap_threshold
+
+        def callback(values):
+            # values is collected as the result of the _perform_chunk
+            # function at the top of this module
+            try:
+                if threshold:
+                    # even if we're to ignore them, as this also
+                    # removes their files
+                    values = [_unmap_result(value) for value in values]
+
+                # unless terminate has already broken these promises
+                if id(receivers) in self._unfinished:
+                    _receive(receivers, values)
+            finally:
+                finished()
+
+        def error_callback(exc):
+            # the pool couldn't run the work or return its results,
+            # most likely because something wouldn't pickle
+            try:
+                if id(receivers) in self._unfinished:
+                    for _promised, _setter, seterr in receivers:
+                        seterr(type(exc), exc, None)
+            finally:
+                finished()
 
         # queue up the work in our pool
         pool = self._get_pool()
-        pool.apply_async(_perform_work, [work, args], kwds, callback)
+        try:
+            args = [self._registered(work), chunk, kwds, threshold,
+                    self._map_prefix]
+            if _ERROR_CALLBACK:
+                pool.apply_async(_perform_chunk, args, {},
+                                 callback, error_callback)
+            else:
+                pool.apply_async(_perform_chunk, args, {}, callback)
+        except BaseException:
+            self._done(receivers)
+            if dispatched:
+                with self._queue_lock:
+                    self._dispatched -= 1
+            raise
 
-        return promised
+
+    def _registered(self, work):
+        """
+        The handle work was registered under, for a worker to load and
+        keep, or work itself if it isn't worth registering or can't
+        be registered. Any trouble pickling it is left for the pool to
+        report as it always has.
+        """
+
+        if not (self._register_work and self._out_of_process) or \
+                type(work) in _BY_NAME or type(work) is _Shared:
+            return work
+
+        with self._works_lock:
+            try:
+                handle = self._works.get(work)
+            except TypeError:
+                # unhashable, so there's no telling it apart from
+                # other work
+                return work
+
+            if handle is None:
+                if len(self._works) >= _MAX_WORKS:
+                    return work
+                try:
+                    handle = self.share(work)
+                except Exception:
+                    return work
+                self._works[work] = handle
+
+        return handle
+
+
+    def _take(self, task):
+        # the queue lock must be held by the caller
+        task.claimed = True
+        for receiver in task.receivers:
+            self._claimable.pop(id(receiver[0]), None)
+
+
+    def _dispatch(self, finished=0):
+        """
+        Sends held work along to the pool, while it has fewer than two
+        chunks per worker to be getting on with
+        """
+
+        ready = []
+        with self._queue_lock:
+            self._dispatched -= finished
+            limit = self._pool_size() * 2
+
+            queued = self._queued
+            while queued and self._dispatched < limit:
+                task = queued.popleft()
+                if not task.claimed:
+                    self._take(task)
+                    self._dispatched += 1
+                    ready.append(task)
+
+        for task in ready:
+            self._apply(task.work, task.chunk, task.kwds,
+                        task.receivers, True)
+
+
+    def _claim(self, promised):
+        """
+        Performs the work for promised in this thread, if it is still
+        being held. Either a delivery or `_dispatch` may take a task
+        from the queue, but never both.
+        """
+
+        with self._queue_lock:
+            task = self._claimable.get(id(promised))
+            if task is None or task.claimed:
+                return
+            self._take(task)
+
+        try:
+            values = _perform_chunk(task.work, task.chunk, task.kwds)
+            _receive(task.receivers, values)
+        finally:
+            self._done(task.receivers)
+
+
+    def share(self, obj):
+        """
+        Sends a large, read-only object to the workers once, rather
+        than with every call that needs it. The object is pickled into
+        a temporary file, which each worker loads the first time it
+        performs a call needing it, and keeps from then on.
+
+        Parameters
+        ----------
+        obj : `object`
+          anything which can be pickled. Workers are given a copy of
+          it as it is now, so it should not change after being shared
+
+        Returns
+        -------
+        handle : `object`
+          to be passed in place of obj to `future`, `map`, or `imap`,
+          either directly as an argument, or as an argument to a
+          `functools.partial` given as the work. The work is called
+          with obj in its place. The handle is good until it is given
+          to `unshare`, or until this executor's `deliver` or
+          `terminate`.
+        """
+
+        key = uuid4().hex
+
+        if not self._out_of_process:
+            return _Shared(key, None, obj)
+
+        self._track_files()
+
+        fd, path = mkstemp(prefix="promises-shared-", dir=_MAP_DIR)
+        try:
+            with fdopen(fd, "wb") as out:
+                pickle_dump(obj, out, HIGHEST_PROTOCOL)
+        except BaseException:
+            unlink(path)
+            raise
+
+        self._shares[key] = path
+        return _Shared(key, path, obj)
+
+
+    def unshare(self, handle):
+        """
+        Removes the file backing a handle from `share`. Calls which
+        haven't yet been performed by a worker which has already
+        loaded it will fail to find it.
+        """
+
+        path = self._shares.pop(handle.key, None)
+        if path is not None:
+            _unlink_quietly(path)
+
+
+    def _track_files(self):
+        if self._finalizer is None:
+            self._finalizer = _finalize(self, _remove_files, self._shares,
+                                        self._map_pattern)
+
+
+    def _unshare_all(self, map_pattern=None):
+        with self._works_lock:
+            # the files behind these are about to go
+            self._works.clear()
+
+        _remove_files(self._shares, map_pattern)
+
+
+    def cancel(self, promised):
+        """
+        Cancels the work for promised, if it hasn't yet been handed to
+        the pool. That is, if it is waiting in an open batch, or held
+        back because of `deliver_inline`. Delivering the promise will
+        then raise `PromiseCancelled`, and no worker will spend any
+        time on it.
+
+        With `dedup`, the work for a call which identical calls are
+        following isn't theirs to lose, and so isn't cancelled.
+
+        Returns
+        -------
+        value : `bool`
+          `True` if the work was cancelled, `False` if it was already
+          on its way to a worker, already done, or followed
+        """
+
+        if not self._dedup:
+            receiver = self._withdraw(promised)
+
+        else:
+            with self._flights_lock:
+                key = self._leaders.get(id(promised))
+                if key is not None and self._flights.get(key):
+                    return False
+
+                receiver = self._withdraw(promised)
+                if receiver is not None and key is not None:
+                    # nobody may follow work which won't be done
+                    del self._leaders[id(promised)]
+                    del self._flights[key]
+
+        if receiver is None:
+            return False
+
+        if self._max_pending:
+            with self._idle:
+                self._pending -= 1
+                self._idle.notify_all()
+
+        _promised, _setter, seterr = receiver
+        seterr(PromiseCancelled, PromiseCancelled("cancelled"), None)
+        return True
+
+
+    def _withdraw(self, promised):
+        """
+        Takes the receiver for promised out of an open batch or the
+        held work, returning it, or `None` if it was in neither
+        """
+
+        receiver = None
+
+        with self._batch_lock:
+            batch = self._batch
+            if batch is not None:
+                receiver = _remove(batch.chunk, batch.receivers, promised)
+
+        if receiver is None:
+            with self._queue_lock:
+                task = self._claimable.pop(id(promised), None)
+                if task is not None and not task.claimed:
+                    receiver = _remove(task.chunk, task.receivers, promised)
+                    if not task.receivers:
+                        task.claimed = True
+                        self._done(task.receivers)
+
+        return receiver
+
+
+    def _done(self, receivers):
+        with self._idle:
+            if self._unfinished.pop(id(receivers), None) is None:
+                # terminate has already accounted for these
+                return
+
+            if self._max_pending:
+                # anyone waiting in _reserve wants to hear about every
+                # bit of room, not just when we're idle
+                self._pending -= len(receivers)
+                self._idle.notify_all()
+            elif not self._unfinished:
+                self._idle.notify_all()
+
+
+    def flush(self):
+        """
+        Blocks until every promise this executor has created so far
+        has been delivered. Unlike `deliver`, the pool is kept alive
+        and ready for more work.
+        """
+
+        self._cut_batch()
+
+        with self._idle:
+            while self._unfinished:
+                self._idle.wait()
 
 
     def terminate(self):
@@ -141,29 +1483,86 @@ class ProcessExecutor(object):
 
         Any promise which had not managed to be delivered will never
         be delivered after calling `terminate`. Attempting to call
-        `deliver` on them will result in a deadlock.
+        `deliver` on them will raise `PromiseCancelled`, including in
+        any thread already waiting on them.
+
+        A shared pool isn't ours to stop, so any of our work it has
+        already started will run to completion, but its results will
+        be ignored.
         """
 
-        # TODO: is there a way for us to cause all undelivered
-        # promises to raise an exception of some sort when this
-        # happens? That would be better than deadlocking while waiting
-        # for delivery.
+        with self._batch_lock:
+            # an open batch never made it to the pool, so it is simply
+            # dropped along with the pool's queue
+            batch, self._batch = self._batch, None
+
+        with self._queue_lock:
+            # as is any work we were holding on to
+            for task in self._queued:
+                task.claimed = True
+            self._queued.clear()
+            self._claimable.clear()
+            self._dispatched = 0
 
-        if self._pool is not None:
+        if not self._shared and self._pool is not None:
             self._pool.terminate()
             self._pool = None
 
+            # along with any results its workers had written which
+            # will now never arrive
+            self._unshare_all(self._map_pattern)
+
+        else:
+            # a shared pool goes on to hand back what it has started,
+            # and each result's file is removed as it arrives
+            self._unshare_all()
+
+        # anything still coming back from the pool is to be ignored,
+        # so there's nothing more for a flush to wait on
+        with self._idle:
+            broken = list(self._unfinished.values())
+            self._unfinished.clear()
+            self._pending = 0
+            self._idle.notify_all()
+
+        if batch is not None:
+            broken.append(batch.receivers)
+
+        exc = PromiseCancelled("executor terminated")
+        for receivers in broken:
+            for _promised, _setter, seterr in receivers:
+                try:
+                    seterr(PromiseCancelled, exc, None)
+                except PromiseAlreadyDelivered:
+                    # beaten to it by a result which was already on
+                    # its way back
+                    pass
+
 
     def deliver(self):
         """
         Deliver on all underlying promises. Blocks until complete.
+
+        The pool is then shut down, unless it was shared with this
+        executor, in which case this is the same as `flush`.
         """
 
-        if self._pool is not None:
+        self._cut_batch()
+
+        if self._shared or self._deliver_inline:
+            # held work only moves to the pool as earlier work comes
+            # back, so it needs to be left open until we're done
+            self.flush()
+
+        if not self._shared and self._pool is not None:
             self._pool.close()
             self._pool.join()
             self._pool = None
 
+        # only once our work is done, or the workers gone, are they
+        # sure to need nothing more from what we shared
+        self._unshare_all()
+
 
 class ProxyProcessExecutor(ProcessExecutor):
     """
@@ -171,8 +1570,7 @@ class ProxyProcessExecutor(ProcessExecutor):
     process.
     """
 
-    def _promise(self):
-        return promise_proxy(blocking=True)
+    _promise_type = Proxy
 
 
 #
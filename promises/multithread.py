@@ -21,7 +21,7 @@ Multi-thread Promises for Python
 """
 
 
-from . import promise_proxy
+from . import Proxy
 from .multiprocess import ProcessExecutor
 from multiprocessing.pool import ThreadPool
 
@@ -32,9 +32,14 @@ __all__ = ('ThreadExecutor', 'ProxyThreadExecutor', )
 class ThreadExecutor(ProcessExecutor):
     """
     A way to provide multiple promises which will be delivered in a
-    separate threads
+    separate threads. As with `ProcessExecutor`, a long-lived
+    `ThreadPool` may be shared among several of these.
     """
 
+    # everything is already right here, so mmap_threshold is ignored,
+    # and share needn't write anything out
+    _out_of_process = False
+
     def _get_pool(self):
         if not self._pool:
             self._pool = ThreadPool(processes=self._processes)
@@ -47,8 +52,7 @@ class ProxyThreadExecutor(ThreadExecutor):
     separate thread
     """
 
-    def _promise(self):
-        return promise_proxy(blocking=True)
+    _promise_type = Proxy
 
 
 #
@@ -25,36 +25,139 @@
 
 
 #include <Python.h>
+#include <pythread.h>
+#include <stddef.h>
 
 
-typedef struct _PyProxy {
+#if PY_MAJOR_VERSION >= 3
+
+#define PyString_CheckExact PyUnicode_CheckExact
+#define PyString_FromString PyUnicode_FromString
+#define PyString_InternFromString PyUnicode_InternFromString
+#define PyNumber_Int PyNumber_Long
+
+/* these all became standard behavior in Python 3 */
+#define Py_TPFLAGS_CHECKTYPES 0
+#define Py_TPFLAGS_HAVE_NEWBUFFER 0
+#define Py_TPFLAGS_HAVE_RICHCOMPARE 0
+#define Py_TPFLAGS_HAVE_ITER 0
+#define Py_TPFLAGS_HAVE_SEQUENCE_IN 0
+
+#else
+
+typedef long Py_hash_t;
+
+#endif
+
+
+/* only given a public macro in Python 3.10 */
+#ifndef PySet_CheckExact
+#define PySet_CheckExact(o) (Py_TYPE(o) == &PySet_Type)
+#endif
+
+
+#if PY_VERSION_HEX >= 0x03080000
+#define PROXY_VECTORCALL 1
+
+#if PY_VERSION_HEX < 0x03090000
+#define PyObject_Vectorcall _PyObject_Vectorcall
+#define Py_TPFLAGS_HAVE_VECTORCALL _Py_TPFLAGS_HAVE_VECTORCALL
+#endif
+
+#endif
+
+
+/* invokes nullary work without building an empty argument tuple,
+   where the interpreter allows us to */
+#if PY_VERSION_HEX >= 0x03090000
+#define CALL_NOARGS(func) PyObject_CallNoArgs(func)
+#elif defined(PROXY_VECTORCALL)
+#define CALL_NOARGS(func) PyObject_Vectorcall((func), NULL, 0, NULL)
+#else
+#define CALL_NOARGS(func) PyObject_CallObject((func), NULL)
+#endif
+
+
+/* type features which were optional in Python 2, and are simply
+   present in Python 3 */
+#define HAS_FEATURE(o, flag) \
+  (! (flag) || PyType_HasFeature(Py_TYPE(o), (flag)))
+
+
+/* The state shared by both the Proxy and the Container promise
+   types. They differ only in how they present their answer. */
+typedef struct _PyPromise {
   PyObject_HEAD
 
   PyObject *work;
   PyObject *answer;
 
+  /* serializes delivery, so that the work is only ever executed by
+     one thread at a time. Allocated the first time delivery is
+     attempted, and never taken once the answer is known. */
+  PyThread_type_lock lock;
+  unsigned long owner;
+
+  PyObject *weakrefs;
+
+} PyPromise;
+
+
+typedef struct _PyProxy {
+  PyPromise promise;
+
+#ifdef PROXY_VECTORCALL
+  vectorcallfunc vectorcall;
+#endif
+
 } PyProxy;
 
 
+typedef PyPromise PyContainer;
+
+
 PyTypeObject PyProxyType;
+PyTypeObject PyBufferProxyType;
+PyTypeObject PyContainerType;
 
 
 #define PyProxy_Check(obj) \
-  (Py_TYPE(obj) == &PyProxyType)
+  (Py_TYPE(obj) == &PyProxyType || Py_TYPE(obj) == &PyBufferProxyType)
+
+
+#ifndef Py_SET_TYPE
+/* only given a public macro in Python 3.9 */
+#define Py_SET_TYPE(obj, type) (Py_TYPE(obj) = (type))
+#endif
+
+
+#define PyContainer_Check(obj) \
+  PyObject_TypeCheck((obj), &PyContainerType)
+
+
+#define PyContainer_CheckExact(obj) \
+  (Py_TYPE(obj) == &PyContainerType)
 
 
 PyObject *PyProxy_IsDelivered(PyProxy *proxy);
 PyObject *PyProxy_Deliver(PyProxy *proxy);
 
-static PyObject *proxy_promise_deliver(PyProxy *proxy);
+static PyObject *promise_deliver(PyPromise *promise);
+static void proxy_adopt_buffer(PyPromise *promise);
 
 
+/* a promise only has an answer once it has been delivered, so that's
+   all we need to check for to skip past the delivery machinery. */
 #define DELIVERX(proxy, fail)						\
   {									\
     if (proxy && PyProxy_Check(proxy)) {				\
-      proxy = proxy_promise_deliver((PyProxy *) proxy);		\
-      if (! proxy) {							\
-	return (fail);							\
+      if (((PyPromise *) proxy)->answer) {				\
+	proxy = ((PyPromise *) proxy)->answer;				\
+      } else {								\
+	proxy = promise_deliver((PyPromise *) proxy);			\
+	if (! proxy) {							\
+	  return (fail);						\
+	}								\
       }									\
     }									\
   }
@@ -64,7 +167,7 @@ static PyObject *proxy_promise_deliver(PyProxy *proxy);
 
 
 #define VALUE(o)						\
-  (PyProxy_Check(o)? ((PyProxy *)(o))->answer: (o))
+  (PyProxy_Check(o)? ((PyPromise *)(o))->answer: (o))
 
 
 #define WRAP_UNARY(name, actual)	   \
@@ -82,6 +185,46 @@ static PyObject *proxy_promise_deliver(PyProxy *proxy);
   }
 
 
+/* Once delivered, we can usually call straight into the answer's own
+   slots rather than going back through the generic dispatch to find
+   them again. That's only safe where the generic dispatch would have
+   found and called exactly the same slot, so we limit this to
+   builtin types, and for binary operations to operands of the very
+   same type. Python classes are left alone, as their slots may have
+   side-effects we'd otherwise end up repeating. */
+#define DIRECT(o)						\
+  (! PyType_HasFeature(Py_TYPE(o), Py_TPFLAGS_HEAPTYPE))
+
+
+#define DIRECT_BINARY(a, b)					\
+  (Py_TYPE(a) == Py_TYPE(b) && DIRECT(a) &&			\
+   HAS_FEATURE(a, Py_TPFLAGS_CHECKTYPES))
+
+
+#define SLOT(o, methods, slot)					\
+  (Py_TYPE(o)->methods? Py_TYPE(o)->methods->slot: NULL)
+
+
+/* a binary number operation which calls directly into the answer's
+   slot when it can, falling back to the generic dispatch should that
+   slot not know how to handle its operands */
+#define WRAP_BINARY_NUMBER(name, slot, actual)			\
+  static PyObject *name(PyObject *proxy, PyObject *a) {		\
+    binaryfunc fn;						\
+    PyObject *result;						\
+    DELIVER(proxy);						\
+    DELIVER(a);							\
+    if (DIRECT_BINARY(proxy, a) &&				\
+	(fn = SLOT(proxy, tp_as_number, slot))) {		\
+      result = fn(proxy, a);					\
+      if (result != Py_NotImplemented)				\
+	return result;						\
+      Py_DECREF(result);					\
+    }								\
+    return actual(proxy, a);					\
+  }
+
+
 #define WRAP_TERNARY(name, actual)				     \
   static PyObject *name(PyObject *proxy, PyObject *a, PyObject *b) { \
     DELIVER(proxy);						     \
@@ -91,41 +234,145 @@ static PyObject *proxy_promise_deliver(PyProxy *proxy);
   }
 
 
+#if PY_MAJOR_VERSION >= 3
+
+
+static PyObject *proxy_bytes(PyObject *proxy) {
+  DELIVER(proxy);
+
+  /* exactly as though we had called bytes() on the answer */
+  return PyObject_CallFunctionObjArgs((PyObject *) &PyBytes_Type,
+				      proxy, NULL);
+}
+
+
+#else
+
+
 static PyObject *proxy_unicode(PyObject *proxy) {
   DELIVER(proxy);
   return PyObject_CallMethod(VALUE(proxy), "__unicode__", "");
 }
 
 
+#endif
+
+
+/* special methods which are only looked for on the type */
+#define WRAP_METHOD(name, method)					\
+  static PyObject *name(PyObject *proxy,				\
+			PyObject *args, PyObject *kwds) {		\
+    PyObject *func;							\
+    PyObject *result;							\
+    DELIVER(proxy);							\
+    func = PyObject_GetAttrString(proxy, method);			\
+    if (! func)								\
+      return NULL;							\
+    result = PyObject_Call(func, args, kwds);				\
+    Py_DECREF(func);							\
+    return result;							\
+  }
+
+
+WRAP_METHOD(proxy_round, "__round__")
+WRAP_METHOD(proxy_trunc, "__trunc__")
+
+
+static PyObject *proxy_array(PyObject *proxy,
+			     PyObject *args, PyObject *kwds) {
+  PyObject *func;
+  PyObject *numpy;
+  PyObject *head;
+  PyObject *result;
+
+  DELIVER(proxy);
+
+  /* instance lookups of __array__ are already forwarded by our
+     getattr, this covers lookups against the Proxy type itself. If
+     the answer has no opinion about being an array, then let numpy
+     decide how to convert it. */
+  func = PyObject_GetAttrString(proxy, "__array__");
+
+  if (func) {
+    Py_INCREF(args);
+
+  } else {
+    if (! PyErr_ExceptionMatches(PyExc_AttributeError))
+      return NULL;
+    PyErr_Clear();
+
+    numpy = PyImport_ImportModule("numpy");
+    if (! numpy)
+      return NULL;
+
+    func = PyObject_GetAttrString(numpy, "asarray");
+    Py_DECREF(numpy);
+    if (! func)
+      return NULL;
+
+    head = PyTuple_Pack(1, proxy);
+    if (! head) {
+      Py_DECREF(func);
+      return NULL;
+    }
+
+    args = PySequence_Concat(head, args);
+    Py_DECREF(head);
+    if (! args) {
+      Py_DECREF(func);
+      return NULL;
+    }
+  }
+
+  result = PyObject_Call(func, args, kwds);
+  Py_DECREF(func);
+  Py_DECREF(args);
+  return result;
+}
+
+
 static PyMethodDef proxy_methods[] = {
+#if PY_MAJOR_VERSION >= 3
+  {"__bytes__", (PyCFunction)proxy_bytes, METH_NOARGS},
+#else
   {"__unicode__", (PyCFunction)proxy_unicode, METH_NOARGS},
+#endif
+  {"__round__", (PyCFunction)proxy_round, METH_VARARGS|METH_KEYWORDS},
+  {"__trunc__", (PyCFunction)proxy_trunc, METH_VARARGS|METH_KEYWORDS},
+  {"__array__", (PyCFunction)proxy_array, METH_VARARGS|METH_KEYWORDS},
   {NULL, NULL}
 };
 
 
-WRAP_BINARY(proxy_add, PyNumber_Add)
-WRAP_BINARY(proxy_sub, PyNumber_Subtract)
-WRAP_BINARY(proxy_mul, PyNumber_Multiply)
-WRAP_BINARY(proxy_div, PyNumber_Divide)
-WRAP_BINARY(proxy_mod, PyNumber_Remainder)
-WRAP_BINARY(proxy_divmod, PyNumber_Divmod)
+WRAP_BINARY_NUMBER(proxy_add, nb_add, PyNumber_Add)
+WRAP_BINARY_NUMBER(proxy_sub, nb_subtract, PyNumber_Subtract)
+WRAP_BINARY_NUMBER(proxy_mul, nb_multiply, PyNumber_Multiply)
+#if PY_MAJOR_VERSION < 3
+WRAP_BINARY_NUMBER(proxy_div, nb_divide, PyNumber_Divide)
+#endif
+WRAP_BINARY_NUMBER(proxy_mod, nb_remainder, PyNumber_Remainder)
+WRAP_BINARY_NUMBER(proxy_divmod, nb_divmod, PyNumber_Divmod)
 WRAP_TERNARY(proxy_pow, PyNumber_Power)
 WRAP_UNARY(proxy_neg, PyNumber_Negative)
 WRAP_UNARY(proxy_pos, PyNumber_Positive)
 WRAP_UNARY(proxy_abs, PyNumber_Absolute)
 WRAP_UNARY(proxy_invert, PyNumber_Invert)
-WRAP_BINARY(proxy_lshift, PyNumber_Lshift)
-WRAP_BINARY(proxy_rshift, PyNumber_Rshift)
-WRAP_BINARY(proxy_and, PyNumber_And)
-WRAP_BINARY(proxy_xor, PyNumber_Xor)
-WRAP_BINARY(proxy_or, PyNumber_Or)
+WRAP_BINARY_NUMBER(proxy_lshift, nb_lshift, PyNumber_Lshift)
+WRAP_BINARY_NUMBER(proxy_rshift, nb_rshift, PyNumber_Rshift)
+WRAP_BINARY_NUMBER(proxy_and, nb_and, PyNumber_And)
+WRAP_BINARY_NUMBER(proxy_xor, nb_xor, PyNumber_Xor)
+WRAP_BINARY_NUMBER(proxy_or, nb_or, PyNumber_Or)
 WRAP_UNARY(proxy_int, PyNumber_Int)
+#if PY_MAJOR_VERSION < 3
 WRAP_UNARY(proxy_long, PyNumber_Long)
+#endif
 WRAP_UNARY(proxy_float, PyNumber_Float)
 WRAP_BINARY(proxy_iadd, PyNumber_InPlaceAdd)
 WRAP_BINARY(proxy_isub, PyNumber_InPlaceSubtract)
 WRAP_BINARY(proxy_imul, PyNumber_InPlaceMultiply)
+#if PY_MAJOR_VERSION < 3
 WRAP_BINARY(proxy_idiv, PyNumber_InPlaceDivide)
+#endif
 WRAP_BINARY(proxy_imod, PyNumber_InPlaceRemainder)
 WRAP_TERNARY(proxy_ipow, PyNumber_InPlacePower)
 WRAP_BINARY(proxy_ilshift, PyNumber_InPlaceLshift)
@@ -133,12 +380,17 @@ WRAP_BINARY(proxy_irshift, PyNumber_InPlaceRshift)
 WRAP_BINARY(proxy_iand, PyNumber_InPlaceAnd)
 WRAP_BINARY(proxy_ixor, PyNumber_InPlaceXor)
 WRAP_BINARY(proxy_ior, PyNumber_InPlaceOr)
-WRAP_BINARY(proxy_floor_div, PyNumber_FloorDivide)
-WRAP_BINARY(proxy_true_div, PyNumber_TrueDivide)
+WRAP_BINARY_NUMBER(proxy_floor_div, nb_floor_divide, PyNumber_FloorDivide)
+WRAP_BINARY_NUMBER(proxy_true_div, nb_true_divide, PyNumber_TrueDivide)
 WRAP_BINARY(proxy_ifloor_div, PyNumber_InPlaceFloorDivide)
 WRAP_BINARY(proxy_itrue_div, PyNumber_InPlaceTrueDivide)
 WRAP_UNARY(proxy_index, PyNumber_Index)
 
+#if PY_VERSION_HEX >= 0x03050000
+WRAP_BINARY_NUMBER(proxy_matmul, nb_matrix_multiply, PyNumber_MatrixMultiply)
+WRAP_BINARY(proxy_imatmul, PyNumber_InPlaceMatrixMultiply)
+#endif
+
 
 static int proxy_nonzero(PyObject *proxy) {
   DELIVERX(proxy, -1);
@@ -150,30 +402,40 @@ static PyNumberMethods proxy_as_number = {
   .nb_add = proxy_add,
   .nb_subtract = proxy_sub,
   .nb_multiply = proxy_mul,
+#if PY_MAJOR_VERSION < 3
   .nb_divide = proxy_div,
+#endif
   .nb_remainder = proxy_mod,
   .nb_divmod = proxy_divmod,
   .nb_power = proxy_pow,
   .nb_negative = proxy_neg,
   .nb_positive = proxy_pos,
   .nb_absolute = proxy_abs,
+#if PY_MAJOR_VERSION >= 3
+  .nb_bool = proxy_nonzero,
+#else
   .nb_nonzero = proxy_nonzero,
+#endif
   .nb_invert = proxy_invert,
   .nb_lshift = proxy_lshift,
   .nb_rshift = proxy_rshift,
   .nb_and = proxy_and,
   .nb_xor = proxy_xor,
   .nb_or = proxy_or,
-  .nb_coerce = NULL,
   .nb_int = proxy_int,
-  .nb_long = proxy_long,
   .nb_float = proxy_float,
+#if PY_MAJOR_VERSION < 3
+  .nb_coerce = NULL,
+  .nb_long = proxy_long,
   .nb_oct = NULL,
   .nb_hex = NULL,
+#endif
   .nb_inplace_add = proxy_iadd,
   .nb_inplace_subtract = proxy_isub,
   .nb_inplace_multiply = proxy_imul,
+#if PY_MAJOR_VERSION < 3
   .nb_inplace_divide = proxy_idiv,
+#endif
   .nb_inplace_remainder = proxy_imod,
   .nb_inplace_power = proxy_ipow,
   .nb_inplace_lshift = proxy_ilshift,
@@ -186,15 +448,29 @@ static PyNumberMethods proxy_as_number = {
   .nb_inplace_floor_divide = proxy_ifloor_div,
   .nb_inplace_true_divide = proxy_itrue_div,
   .nb_index = proxy_index,
+#if PY_VERSION_HEX >= 0x03050000
+  .nb_matrix_multiply = proxy_matmul,
+  .nb_inplace_matrix_multiply = proxy_imatmul,
+#endif
 };
 
 
 static Py_ssize_t proxy_length(PyObject *proxy) {
+  lenfunc fn;
+
   DELIVERX(proxy, -1);
+
+  if ((fn = SLOT(proxy, tp_as_sequence, sq_length)) ||
+      (fn = SLOT(proxy, tp_as_mapping, mp_length)))
+    return fn(proxy);
+
   return PyObject_Length(proxy);
 }
 
 
+#if PY_MAJOR_VERSION < 3
+
+
 static PyObject *proxy_get_slice(PyObject *proxy,
 				 Py_ssize_t i, Py_ssize_t j) {
   DELIVER(proxy);
@@ -210,8 +486,18 @@ static int proxy_set_slice(PyObject *proxy,
 }
 
 
+#endif
+
+
 static int proxy_contains(PyObject *proxy, PyObject *val) {
+  objobjproc fn;
+
   DELIVERX(proxy, -1);
+
+  if (HAS_FEATURE(proxy, Py_TPFLAGS_HAVE_SEQUENCE_IN) &&
+      (fn = SLOT(proxy, tp_as_sequence, sq_contains)))
+    return fn(proxy, val);
+
   return PySequence_Contains(proxy, val);
 }
 
@@ -221,14 +507,26 @@ static PySequenceMethods proxy_as_sequence = {
   .sq_concat = NULL,
   .sq_repeat = NULL,
   .sq_item = NULL,
-  .sq_slice = (ssizessizeargfunc)proxy_get_slice,
   .sq_ass_item = NULL,
+#if PY_MAJOR_VERSION < 3
+  .sq_slice = (ssizessizeargfunc)proxy_get_slice,
   .sq_ass_slice = (ssizessizeobjargproc)proxy_set_slice,
+#endif
   .sq_contains = (objobjproc)proxy_contains,
 };
 
 
-WRAP_BINARY(proxy_getitem, PyObject_GetItem)
+static PyObject *proxy_getitem(PyObject *proxy, PyObject *key) {
+  binaryfunc fn;
+
+  DELIVER(proxy);
+  DELIVER(key);
+
+  if ((fn = SLOT(proxy, tp_as_mapping, mp_subscript)))
+    return fn(proxy, key);
+
+  return PyObject_GetItem(proxy, key);
+}
 
 
 static int proxy_setitem(PyObject *proxy, PyObject *key, PyObject *val) {
@@ -250,35 +548,234 @@ static PyMappingMethods proxy_as_mapping = {
 
 
 static PyObject *proxy_richcompare(PyObject *proxy, PyObject *comp, int op) {
+  richcmpfunc fn;
+  PyObject *result;
+#if PY_MAJOR_VERSION < 3
+  cmpfunc cmp;
+  int c;
+#endif
+
   DELIVER(proxy);
   DELIVER(comp);
+
+  if (Py_TYPE(proxy) != Py_TYPE(comp) || ! DIRECT(proxy))
+    return PyObject_RichCompare(proxy, comp, op);
+
+  if (HAS_FEATURE(proxy, Py_TPFLAGS_HAVE_RICHCOMPARE) &&
+      (fn = Py_TYPE(proxy)->tp_richcompare)) {
+
+    result = fn(proxy, comp, op);
+    if (result != Py_NotImplemented)
+      return result;
+    Py_DECREF(result);
+
+#if PY_MAJOR_VERSION < 3
+  } else if ((cmp = Py_TYPE(proxy)->tp_compare)) {
+    /* this is what the generic dispatch would do with two instances
+       of the same type, lacking a rich comparison */
+    c = cmp(proxy, comp);
+    if (c == -1 && PyErr_Occurred())
+      return NULL;
+
+    switch (op) {
+    case Py_LT: c = (c < 0); break;
+    case Py_LE: c = (c <= 0); break;
+    case Py_EQ: c = (c == 0); break;
+    case Py_NE: c = (c != 0); break;
+    case Py_GT: c = (c > 0); break;
+    case Py_GE: c = (c >= 0); break;
+    }
+    return PyBool_FromLong(c);
+#endif
+  }
+
   return PyObject_RichCompare(proxy, comp, op);
 }
 
 
-WRAP_UNARY(proxy_iter, PyObject_GetIter)
-WRAP_UNARY(proxy_iternext, PyIter_Next)
+static PyObject *proxy_iter(PyObject *proxy) {
+  getiterfunc fn;
+
+  DELIVER(proxy);
+
+  /* builtins can be trusted to return an actual iterator */
+  if (DIRECT(proxy) &&
+      HAS_FEATURE(proxy, Py_TPFLAGS_HAVE_ITER) &&
+      (fn = Py_TYPE(proxy)->tp_iter))
+    return fn(proxy);
+
+  return PyObject_GetIter(proxy);
+}
+
+
+static PyObject *proxy_iternext(PyObject *proxy) {
+  iternextfunc fn;
+
+  DELIVER(proxy);
+
+  if (HAS_FEATURE(proxy, Py_TPFLAGS_HAVE_ITER) &&
+      (fn = Py_TYPE(proxy)->tp_iternext))
+    return fn(proxy);
+
+  return PyIter_Next(proxy);
+}
+
+
+#if PY_MAJOR_VERSION < 3
+
+
+static Py_ssize_t proxy_getreadbuffer(PyObject *proxy, Py_ssize_t segment,
+				      void **ptrptr) {
+  PyBufferProcs *pb;
+
+  DELIVERX(proxy, -1);
+
+  pb = Py_TYPE(proxy)->tp_as_buffer;
+  if (! (pb && pb->bf_getreadbuffer)) {
+    PyErr_SetString(PyExc_TypeError,
+		    "promised answer does not support the buffer interface");
+    return -1;
+  }
+
+  return pb->bf_getreadbuffer(proxy, segment, ptrptr);
+}
+
+
+static Py_ssize_t proxy_getwritebuffer(PyObject *proxy, Py_ssize_t segment,
+				       void **ptrptr) {
+  PyBufferProcs *pb;
+
+  DELIVERX(proxy, -1);
+
+  pb = Py_TYPE(proxy)->tp_as_buffer;
+  if (! (pb && pb->bf_getwritebuffer)) {
+    PyErr_SetString(PyExc_TypeError,
+		    "promised answer does not support the writable"
+		    " buffer interface");
+    return -1;
+  }
+
+  return pb->bf_getwritebuffer(proxy, segment, ptrptr);
+}
+
+
+static Py_ssize_t proxy_getsegcount(PyObject *proxy, Py_ssize_t *lenp) {
+  PyBufferProcs *pb;
 
+  /* there's no way to report a failure from here, so an answer that
+     couldn't be delivered simply has no segments */
+  DELIVERX(proxy, 0);
 
-static int promise_clear(PyProxy *proxy) {
-  if (proxy->work) {
-    Py_DECREF(proxy->work);
-    proxy->work = NULL;
+  pb = Py_TYPE(proxy)->tp_as_buffer;
+  if (! (pb && pb->bf_getsegcount))
+    return 0;
+
+  return pb->bf_getsegcount(proxy, lenp);
+}
+
+
+static Py_ssize_t proxy_getcharbuffer(PyObject *proxy, Py_ssize_t segment,
+				      char **ptrptr) {
+  PyBufferProcs *pb;
+
+  DELIVERX(proxy, -1);
+
+  pb = Py_TYPE(proxy)->tp_as_buffer;
+  if (! (pb && pb->bf_getcharbuffer)) {
+    PyErr_SetString(PyExc_TypeError,
+		    "promised answer does not support the character"
+		    " buffer interface");
+    return -1;
+  }
+
+  return pb->bf_getcharbuffer(proxy, segment, ptrptr);
+}
+
+
+#endif
+
+
+static int proxy_getbuffer(PyObject *proxy, Py_buffer *view, int flags) {
+#if PY_MAJOR_VERSION < 3
+  void *ptr = NULL;
+  Py_ssize_t len;
+  int readonly;
+#endif
+
+  DELIVERX(proxy, -1);
+
+  /* the view's obj will be the answer rather than the proxy, so the
+     answer is what the view will be released against. Nothing is
+     copied. */
+  if (PyObject_CheckBuffer(proxy))
+    return PyObject_GetBuffer(proxy, view, flags);
+
+#if PY_MAJOR_VERSION >= 3
+  PyErr_SetString(PyExc_TypeError,
+		  "promised answer does not support the buffer interface");
+  return -1;
+
+#else
+
+  /* our having the new buffer interface hides any old-style buffer
+     the answer may have (eg. array.array) from callers, who would
+     otherwise have fallen back to it. So we fall back on their
+     behalf. */
+  if (proxy_getsegcount(proxy, NULL) != 1) {
+    PyErr_SetString(PyExc_TypeError,
+		    "promised answer does not support the buffer interface");
+    return -1;
   }
-  if (proxy->answer) {
-    Py_DECREF(proxy->answer);
-    proxy->answer = NULL;
+
+  readonly = ! (flags & PyBUF_WRITABLE);
+  if (readonly) {
+    len = proxy_getreadbuffer(proxy, 0, &ptr);
+  } else {
+    len = proxy_getwritebuffer(proxy, 0, &ptr);
   }
+
+  if (len < 0)
+    return -1;
+
+  return PyBuffer_FillInfo(view, proxy, ptr, len, readonly, flags);
+#endif
+}
+
+
+static PyBufferProcs proxy_as_buffer = {
+#if PY_MAJOR_VERSION < 3
+  .bf_getreadbuffer = (readbufferproc)proxy_getreadbuffer,
+  .bf_getwritebuffer = (writebufferproc)proxy_getwritebuffer,
+  .bf_getsegcount = (segcountproc)proxy_getsegcount,
+  .bf_getcharbuffer = (charbufferproc)proxy_getcharbuffer,
+#endif
+  .bf_getbuffer = (getbufferproc)proxy_getbuffer,
+  .bf_releasebuffer = NULL,
+};
+
+
+static int promise_clear(PyPromise *self) {
+  Py_CLEAR(self->work);
+  Py_CLEAR(self->answer);
   return 0;
 }
 
 
-static long proxy_hash(PyObject *proxy) {
+static Py_hash_t proxy_hash(PyObject *proxy) {
+  hashfunc fn;
+
   DELIVERX(proxy, -1);
+
+  if ((fn = Py_TYPE(proxy)->tp_hash))
+    return fn(proxy);
+
   return PyObject_Hash(proxy);
 }
 
 
+#if PY_MAJOR_VERSION < 3
+
+
 static int proxy_compare(PyObject *proxy, PyObject *val) {
   DELIVERX(proxy, -1);
   DELIVERX(val, -1);
@@ -286,9 +783,22 @@ static int proxy_compare(PyObject *proxy, PyObject *val) {
 }
 
 
+#endif
+
+
 WRAP_UNARY(proxy_repr, PyObject_Repr)
 WRAP_UNARY(proxy_str, PyObject_Str)
-WRAP_BINARY(proxy_getattr, PyObject_GetAttr)
+static PyObject *proxy_getattr(PyObject *proxy, PyObject *name) {
+  getattrofunc fn;
+
+  DELIVER(proxy);
+
+  if (PyString_CheckExact(name) &&
+      (fn = Py_TYPE(proxy)->tp_getattro))
+    return fn(proxy, name);
+
+  return PyObject_GetAttr(proxy, name);
+}
 
 
 static PyObject *proxy_call(PyObject *proxy,
@@ -298,6 +808,19 @@ static PyObject *proxy_call(PyObject *proxy,
 }
 
 
+#ifdef PROXY_VECTORCALL
+
+
+static PyObject *proxy_vectorcall(PyObject *proxy, PyObject *const *args,
+				  size_t nargsf, PyObject *kwnames) {
+  DELIVER(proxy);
+  return PyObject_Vectorcall(proxy, args, nargsf, kwnames);
+}
+
+
+#endif
+
+
 static int proxy_setattr(PyObject *proxy,
 			 PyObject *name, PyObject *val) {
   DELIVERX(proxy, -1);
@@ -305,8 +828,24 @@ static int proxy_setattr(PyObject *proxy,
 }
 
 
-static void promise_dealloc(PyProxy *self) {
+static int promise_traverse(PyPromise *self, visitproc visit, void *arg) {
+  Py_VISIT(self->work);
+  Py_VISIT(self->answer);
+  return 0;
+}
+
+
+static void promise_dealloc(PyPromise *self) {
+  PyObject_GC_UnTrack(self);
+
+  if (self->weakrefs)
+    PyObject_ClearWeakRefs((PyObject *) self);
+
   promise_clear(self);
+  if (self->lock) {
+    PyThread_free_lock(self->lock);
+    self->lock = NULL;
+  }
   Py_TYPE(self)->tp_free((PyObject*)self);
 }
 
@@ -314,19 +853,113 @@ static void promise_dealloc(PyProxy *self) {
 static PyObject *promise_new(PyTypeObject *type,
 			     PyObject *args, PyObject *kwds) {
 
-  PyProxy *self;
+  PyPromise *self;
 
-  self = (PyProxy *) type->tp_alloc(type, 0);
+  self = (PyPromise *) type->tp_alloc(type, 0);
   if (self != NULL) {
     self->work = NULL;
     self->answer = NULL;
+    self->lock = NULL;
+    self->owner = 0;
+    self->weakrefs = NULL;
+  }
+
+  return (PyObject *) self;
+}
+
+
+/* A bounded free list of Proxy instances, in the manner of the
+   interpreter's own float and tuple free lists. Dead proxies are
+   chained together through their work field, and keep their lock if
+   they had one. */
+
+#define PROXY_FREELIST_LIMIT 256
+
+
+static PyProxy *proxy_freelist = NULL;
+static int proxy_freelist_count = 0;
+static int proxy_freelist_limit = PROXY_FREELIST_LIMIT;
+
+
+static void proxy_free(PyProxy *self) {
+  PyPromise *promise = (PyPromise *) self;
+
+  if (promise->lock) {
+    PyThread_free_lock(promise->lock);
+    promise->lock = NULL;
+  }
+  PyObject_GC_Del(self);
+}
+
+
+static void proxy_freelist_trim(int limit) {
+  PyProxy *self;
+
+  while (proxy_freelist_count > limit) {
+    self = proxy_freelist;
+    proxy_freelist = (PyProxy *) ((PyPromise *) self)->work;
+    proxy_freelist_count--;
+
+    ((PyPromise *) self)->work = NULL;
+    proxy_free(self);
+  }
+}
+
+
+static PyObject *proxy_new(PyTypeObject *type,
+			   PyObject *args, PyObject *kwds) {
+
+  PyProxy *self;
+  PyPromise *promise;
+
+  if (proxy_freelist != NULL && type == &PyProxyType) {
+    self = proxy_freelist;
+    promise = (PyPromise *) self;
+
+    proxy_freelist = (PyProxy *) promise->work;
+    proxy_freelist_count--;
+
+    promise->work = NULL;
+    PyObject_Init((PyObject *) self, type);
+    PyObject_GC_Track(self);
+
+  } else {
+    self = (PyProxy *) promise_new(type, args, kwds);
+    if (self == NULL)
+      return NULL;
   }
 
+#ifdef PROXY_VECTORCALL
+  self->vectorcall = proxy_vectorcall;
+#endif
+
   return (PyObject *) self;
 }
 
 
-static int promise_init(PyProxy *self,
+static void proxy_dealloc(PyProxy *self) {
+  PyPromise *promise = (PyPromise *) self;
+
+  PyObject_GC_UnTrack(self);
+
+  if (promise->weakrefs)
+    PyObject_ClearWeakRefs((PyObject *) self);
+
+  promise_clear(promise);
+  promise->owner = 0;
+
+  if (proxy_freelist_count < proxy_freelist_limit) {
+    promise->work = (PyObject *) proxy_freelist;
+    proxy_freelist = self;
+    proxy_freelist_count++;
+
+  } else {
+    proxy_free(self);
+  }
+}
+
+
+static int promise_init(PyPromise *self,
 			PyObject *args, PyObject *kwds) {
 
   PyObject *work = NULL;
@@ -343,12 +976,41 @@ static int promise_init(PyProxy *self,
   } else {
     self->answer = work;
     Py_INCREF(work);
+    proxy_adopt_buffer(self);
   }
 
   return 0;
 }
 
 
+#if PY_VERSION_HEX >= 0x03050000
+
+
+/* set from python, as the event loop to be waiting in is its business
+   rather than ours */
+static PyObject *await_hook = NULL;
+
+
+static PyObject *promise_await(PyObject *self) {
+  if (! await_hook) {
+    PyErr_Format(PyExc_TypeError,
+		 "object %s can't be used in 'await' expression",
+		 Py_TYPE(self)->tp_name);
+    return NULL;
+  }
+
+  return PyObject_CallFunctionObjArgs(await_hook, self, NULL);
+}
+
+
+static PyAsyncMethods promise_as_async = {
+  .am_await = promise_await,
+};
+
+
+#endif
+
+
 PyTypeObject PyProxyType = {
   PyVarObject_HEAD_INIT(&PyType_Type, 0)
 
@@ -356,11 +1018,18 @@ PyTypeObject PyProxyType = {
   sizeof(PyProxy),
   0,
 
-  .tp_dealloc = (destructor)promise_dealloc,
-  .tp_print = NULL,
+  .tp_dealloc = (destructor)proxy_dealloc,
+#ifdef PROXY_VECTORCALL
+  .tp_vectorcall_offset = offsetof(PyProxy, vectorcall),
+#endif
   .tp_getattr = NULL,
   .tp_setattr = NULL,
+#if PY_MAJOR_VERSION < 3
   .tp_compare = proxy_compare,
+#endif
+#if PY_VERSION_HEX >= 0x03050000
+  .tp_as_async = &promise_as_async,
+#endif
   .tp_repr = (reprfunc)proxy_repr,
   .tp_as_number = &proxy_as_number,
   .tp_as_sequence = &proxy_as_sequence,
@@ -370,57 +1039,167 @@ PyTypeObject PyProxyType = {
   .tp_str = proxy_str,
   .tp_getattro = proxy_getattr,
   .tp_setattro = (setattrofunc)proxy_setattr,
-  .tp_as_buffer = NULL,
   .tp_flags = (Py_TPFLAGS_DEFAULT |
-	       Py_TPFLAGS_CHECKTYPES),
+	       Py_TPFLAGS_CHECKTYPES |
+	       Py_TPFLAGS_HAVE_NEWBUFFER |
+#ifdef PROXY_VECTORCALL
+	       Py_TPFLAGS_HAVE_VECTORCALL |
+#endif
+	       Py_TPFLAGS_HAVE_GC),
   .tp_doc = NULL,
-  .tp_traverse = NULL,
+  .tp_traverse = (traverseproc)promise_traverse,
   .tp_clear = (inquiry)promise_clear,
   .tp_richcompare = proxy_richcompare,
-  .tp_weaklistoffset = 0,
+  .tp_weaklistoffset = offsetof(PyProxy, promise.weakrefs),
   .tp_iter = (getiterfunc)proxy_iter,
   .tp_iternext = (iternextfunc)proxy_iternext,
   .tp_methods = proxy_methods,
 
-  .tp_new = promise_new,
+  .tp_new = proxy_new,
   .tp_init = (initproc)promise_init,
+  .tp_free = PyObject_GC_Del,
 };
 
 
-#define proxy_promise_is_delivered(proxy) \
-  ((proxy)->work == NULL)
+#define promise_is_delivered(promise) \
+  ((promise)->work == NULL)
 
 
-static PyObject *proxy_promise_deliver(PyProxy *proxy) {
-  PyObject *work;
-  PyObject *answer = NULL;
+/* a proxy only takes on the buffer interface once its answer turns
+   out to have one. Advertising it from the start would have callers
+   which check for a buffer before iterating, such as bytearray, fail
+   on every other answer instead. */
+static void proxy_adopt_buffer(PyPromise *promise) {
+  PyObject *answer = promise->answer;
 
-  if(proxy_promise_is_delivered(proxy)) {
-    answer = proxy->answer;
+  if (Py_TYPE(promise) != &PyProxyType)
+    return;
 
-  } else {
-    work = proxy->work;
+#if PY_MAJOR_VERSION >= 3
+  if (PyObject_CheckBuffer(answer))
+#else
+  if (PyObject_CheckBuffer(answer) || PyObject_CheckReadBuffer(answer))
+#endif
+    Py_SET_TYPE(promise, &PyBufferProxyType);
+}
 
-    if (PyCallable_Check(work)) {
-      answer = PyObject_CallObject(work, NULL);
 
-      if (answer != NULL) {
-	proxy->work = NULL;
-	Py_DECREF(work);
-      }
-    } else{
-      answer = work;
-    }
+static PyObject *promise_call_work(PyPromise *promise) {
+  PyObject *work = promise->work;
+  PyObject *answer;
+
+  /* hold our own reference, the work may clear the promise */
+  Py_INCREF(work);
+  answer = CALL_NOARGS(work);
 
-    proxy->answer = answer;
+  if (answer != NULL && ! promise_is_delivered(promise)) {
+    promise->answer = answer;
+    promise->work = NULL;
+    Py_DECREF(work);
+    proxy_adopt_buffer(promise);
+
+  } else {
+    /* either the work failed, in which case we remain undelivered,
+       or a re-entrant delivery beat us to it, in which case we keep
+       the first answer */
+    Py_XDECREF(answer);
   }
 
-  return answer;
+  Py_DECREF(work);
+  return answer? promise->answer: NULL;
 }
 
 
-PyObject *PyProxy_IsDelivered(PyProxy *proxy) {
-  if (proxy_promise_is_delivered(proxy)) {
+/* waits for the lock serializing delivery of promise. Under Python 3
+   the wait may be interrupted by a signal, so that Ctrl-C still works
+   while another thread performs the work. Returns -1 with an
+   exception set if a signal handler raised. */
+static int promise_acquire_lock(PyPromise *promise) {
+#if PY_MAJOR_VERSION >= 3
+  PyLockStatus status;
+
+  if (PyThread_acquire_lock(promise->lock, NOWAIT_LOCK))
+    return 0;
+
+  do {
+    Py_BEGIN_ALLOW_THREADS
+    status = PyThread_acquire_lock_timed(promise->lock, -1, 1);
+    Py_END_ALLOW_THREADS
+
+    if (status == PY_LOCK_INTR && PyErr_CheckSignals() < 0)
+      return -1;
+  } while (status != PY_LOCK_ACQUIRED);
+
+#else
+  if (! PyThread_acquire_lock(promise->lock, NOWAIT_LOCK)) {
+    Py_BEGIN_ALLOW_THREADS
+    PyThread_acquire_lock(promise->lock, WAIT_LOCK);
+    Py_END_ALLOW_THREADS
+  }
+#endif
+
+  return 0;
+}
+
+
+static PyObject *promise_deliver(PyPromise *promise) {
+  PyObject *answer;
+  unsigned long me;
+
+  /* once delivered, the answer never changes, so there's no need to
+     take the lock */
+  if (promise_is_delivered(promise)) {
+    answer = promise->answer;
+    if (! answer) {
+      /* only possible if the garbage collector has already cleared
+	 us while breaking a reference cycle */
+      PyErr_SetString(PyExc_ReferenceError,
+		      "promise has been cleared");
+    }
+    return answer;
+  }
+
+  me = (unsigned long) PyThread_get_thread_ident();
+
+  /* the work is delivering on its own promise. Behave as we always
+     have, rather than deadlocking against ourselves */
+  if (promise->owner == me)
+    return promise_call_work(promise);
+
+  /* we're still holding the GIL, so nobody can race us to create
+     the lock */
+  if (! promise->lock) {
+    promise->lock = PyThread_allocate_lock();
+    if (! promise->lock) {
+      PyErr_NoMemory();
+      return NULL;
+    }
+  }
+
+  if (promise_acquire_lock(promise) < 0)
+    return NULL;
+
+  /* someone else may have delivered while we were waiting on the
+     lock. If they failed, then it's our turn to try. For lazy work
+     that means performing it again, as a later delivery always has.
+     The work of a settable promise never waits once its seterr has
+     been called, and simply raises the same exception for us. */
+  if (promise_is_delivered(promise)) {
+    answer = promise->answer;
+
+  } else {
+    promise->owner = me;
+    answer = promise_call_work(promise);
+    promise->owner = 0;
+  }
+
+  PyThread_release_lock(promise->lock);
+  return answer;
+}
+
+
+PyObject *PyProxy_IsDelivered(PyProxy *proxy) {
+  if (promise_is_delivered((PyPromise *) proxy)) {
     Py_RETURN_TRUE;
   } else {
     Py_RETURN_FALSE;
@@ -431,7 +1210,7 @@ PyObject *PyProxy_IsDelivered(PyProxy *proxy) {
 PyObject *PyProxy_Deliver(PyProxy *proxy) {
   PyObject *answer;
 
-  answer = proxy_promise_deliver(proxy);
+  answer = promise_deliver((PyPromise *) proxy);
   if (answer) {
     Py_INCREF(answer);
   }
@@ -439,6 +1218,141 @@ PyObject *PyProxy_Deliver(PyProxy *proxy) {
 }
 
 
+/* Container */
+
+
+static PyObject *container_is_delivered(PyObject *self, PyObject *unused) {
+  return PyBool_FromLong(promise_is_delivered((PyContainer *) self));
+}
+
+
+static PyObject *container_deliver(PyObject *self, PyObject *unused) {
+  PyObject *answer;
+
+  answer = promise_deliver((PyContainer *) self);
+  Py_XINCREF(answer);
+  return answer;
+}
+
+
+static int container_is_broken(PyObject *answer) {
+  PyObject *mod;
+  PyObject *broken;
+  int result;
+
+  mod = PyImport_ImportModule("promises");
+  if (! mod)
+    return -1;
+
+  broken = PyObject_GetAttrString(mod, "BrokenPromise");
+  Py_DECREF(mod);
+  if (! broken)
+    return -1;
+
+  result = PyObject_IsInstance(answer, broken);
+  Py_DECREF(broken);
+  return result;
+}
+
+
+static PyObject *container_repr(PyContainer *self) {
+#if PY_MAJOR_VERSION < 3
+  PyObject *answer_repr;
+  PyObject *result;
+#endif
+
+  if (! promise_is_delivered(self)) {
+    return PyString_FromString("<promises.Container undelivered>");
+  }
+
+  switch (container_is_broken(self->answer)) {
+  case -1:
+    return NULL;
+  case 1:
+    return PyString_FromString("<promises.Container broken>");
+  default:
+    break;
+  }
+
+#if PY_MAJOR_VERSION >= 3
+  return PyUnicode_FromFormat("<promises.Container delivered:%R>",
+			      self->answer);
+
+#else
+  answer_repr = PyObject_Repr(self->answer);
+  if (! answer_repr)
+    return NULL;
+
+  result = PyString_FromFormat("<promises.Container delivered:%s>",
+			       PyString_AsString(answer_repr));
+  Py_DECREF(answer_repr);
+  return result;
+#endif
+}
+
+
+static PyMethodDef container_methods[] = {
+  { "is_delivered", container_is_delivered, METH_NOARGS,
+    "True if the promised work has been called and an answer has been\n"
+    "recorded." },
+
+  { "deliver", container_deliver, METH_NOARGS,
+    "Deliver on promised work. Will only execute the work if an answer\n"
+    "has not already been found. If an exception is raised during\n"
+    "the execution of work, it will be cascade up from here as\n"
+    "well. Returns the answer to the work once known." },
+
+  { NULL, NULL, 0, NULL },
+};
+
+
+PyTypeObject PyContainerType = {
+  PyVarObject_HEAD_INIT(&PyType_Type, 0)
+
+  "promises.Container",
+  sizeof(PyContainer),
+  0,
+
+  .tp_dealloc = (destructor)promise_dealloc,
+#if PY_VERSION_HEX >= 0x03050000
+  .tp_as_async = &promise_as_async,
+#endif
+  .tp_repr = (reprfunc)container_repr,
+  .tp_flags = (Py_TPFLAGS_DEFAULT |
+	       Py_TPFLAGS_BASETYPE |
+	       Py_TPFLAGS_HAVE_GC),
+  .tp_doc =
+  "Simple promise mechanism. Acts as a container to the promised work\n"
+  "until delivered, and there-after acts as a container to the return\n"
+  "value from executing the work. Will invoke the promised work\n"
+  "function exactly once, but can deliver the answer multiple times.\n"
+  "\n"
+  "Delivery is safe to attempt from multiple threads at once. Only\n"
+  "one thread will execute the work, and any others will wait for\n"
+  "its answer.\n"
+  "\n"
+  "work must be either a nullary (zero-argument) callable, or a\n"
+  "non-callable value. If work is non-callable, then this promise is\n"
+  "considered immediately delivered, and the work value becomes the\n"
+  "answer.",
+  .tp_traverse = (traverseproc)promise_traverse,
+  .tp_clear = (inquiry)promise_clear,
+  .tp_weaklistoffset = offsetof(PyContainer, weakrefs),
+  .tp_methods = container_methods,
+
+  .tp_new = promise_new,
+  .tp_init = (initproc)promise_init,
+  .tp_free = PyObject_GC_Del,
+};
+
+
+/* module functions */
+
+
+static PyObject *str_deliver = NULL;
+static PyObject *str_is_delivered = NULL;
+
+
 static PyObject *is_proxy(PyObject *module, PyObject *args) {
   PyObject *obj = NULL;
 
@@ -473,6 +1387,654 @@ static PyObject *deliver_proxy(PyObject *module, PyObject *args) {
 }
 
 
+static PyObject *is_promise(PyObject *module, PyObject *obj) {
+  int found;
+
+  if (PyProxy_Check(obj) || PyContainer_Check(obj))
+    Py_RETURN_TRUE;
+
+  /* anything else that looks like a Container counts */
+  found = (PyObject_HasAttr(obj, str_is_delivered) &&
+	   PyObject_HasAttr(obj, str_deliver));
+
+  return PyBool_FromLong(found);
+}
+
+
+static PyObject *is_delivered(PyObject *module, PyObject *obj) {
+  if (PyProxy_Check(obj) || PyContainer_CheckExact(obj)) {
+    return PyBool_FromLong(promise_is_delivered((PyPromise *) obj));
+
+  } else {
+    return PyObject_CallMethodObjArgs(obj, str_is_delivered, NULL);
+  }
+}
+
+
+static PyObject *promise_work(PyObject *module, PyObject *obj) {
+  PyObject *work = NULL;
+
+  if (PyProxy_Check(obj) || PyContainer_Check(obj))
+    work = ((PyPromise *) obj)->work;
+
+  /* the work is let go of once the promise is delivered */
+  if (! work)
+    work = Py_None;
+
+  Py_INCREF(work);
+  return work;
+}
+
+
+static PyObject *deliver(PyObject *module, PyObject *obj) {
+  PyObject *answer;
+
+  if (PyProxy_Check(obj) || PyContainer_CheckExact(obj)) {
+    answer = promise_deliver((PyPromise *) obj);
+    Py_XINCREF(answer);
+    return answer;
+
+  } else {
+    return PyObject_CallMethodObjArgs(obj, str_deliver, NULL);
+  }
+}
+
+
+/* === unwrap === */
+
+
+/* Walking a structure for unwrap. Lists, dicts, sets and instance
+   dicts are altered in place, and are memoized by id so that shared
+   and cyclic references are walked only once. Tuples and frozensets
+   are only rebuilt if one of their items was replaced, and only the
+   rebuilt ones are memoized. A cycle must pass through something
+   mutable, so that's enough to keep the walk finite. */
+
+typedef struct {
+  PyObject *memo;      /* id(container) -> replacement */
+  PyObject *keep;      /* replaced originals, so their ids stay unique */
+  Py_ssize_t rebuilt;  /* how many immutables are in the memo */
+  int deliver;
+  int attributes;
+} UnwrapState;
+
+
+typedef PyObject *(*unwrapfunc)(UnwrapState *st, PyObject *obj);
+
+
+static PyObject *str___dict__;
+
+
+static PyObject *unwrap_walk(UnwrapState *st, PyObject *obj);
+
+
+/* Given a promise, returns a new reference to its answer, or to the
+   promise itself if it is undelivered and we weren't asked to
+   deliver it. */
+static PyObject *unwrap_promise(UnwrapState *st, PyObject *obj) {
+  PyObject *answer;
+  int delivered;
+
+  if (PyProxy_Check(obj) || PyContainer_CheckExact(obj)) {
+    if (! (st->deliver || promise_is_delivered((PyPromise *) obj))) {
+      Py_INCREF(obj);
+      return obj;
+    }
+    answer = promise_deliver((PyPromise *) obj);
+    Py_XINCREF(answer);
+    return answer;
+  }
+
+  /* a Container subclass may have its own idea of delivery */
+  if (! st->deliver) {
+    answer = PyObject_CallMethodObjArgs(obj, str_is_delivered, NULL);
+    if (! answer)
+      return NULL;
+
+    delivered = PyObject_IsTrue(answer);
+    Py_DECREF(answer);
+
+    if (delivered < 0) {
+      return NULL;
+    } else if (! delivered) {
+      Py_INCREF(obj);
+      return obj;
+    }
+  }
+
+  return PyObject_CallMethodObjArgs(obj, str_deliver, NULL);
+}
+
+
+static PyObject *unwrap_memo_get(UnwrapState *st, PyObject *obj) {
+  PyObject *key;
+  PyObject *found;
+
+  if (! st->memo)
+    return NULL;
+
+  key = PyLong_FromVoidPtr(obj);
+  if (! key)
+    return NULL;
+
+  found = PyDict_GetItem(st->memo, key);
+  Py_DECREF(key);
+  return found;
+}
+
+
+static PyObject *unwrap_mutable(UnwrapState *st, PyObject *obj,
+				unwrapfunc walk) {
+  PyObject *id;
+  PyObject *found;
+  PyObject *result;
+
+  if (! st->memo) {
+    st->memo = PyDict_New();
+    if (! st->memo)
+      return NULL;
+  }
+
+  id = PyLong_FromVoidPtr(obj);
+  if (! id)
+    return NULL;
+
+  found = PyDict_GetItem(st->memo, id);
+  if (found) {
+    Py_DECREF(id);
+    Py_INCREF(found);
+    return found;
+  }
+
+  result = NULL;
+  if (PyDict_SetItem(st->memo, id, obj) == 0 &&
+      Py_EnterRecursiveCall(" while unwrapping") == 0) {
+    result = walk(st, obj);
+    Py_LeaveRecursiveCall();
+  }
+
+  Py_DECREF(id);
+  return result;
+}
+
+
+static PyObject *unwrap_immutable(UnwrapState *st, PyObject *obj,
+				  unwrapfunc walk) {
+  PyObject *id;
+  PyObject *found;
+  PyObject *result;
+
+  if (st->rebuilt) {
+    found = unwrap_memo_get(st, obj);
+    if (found) {
+      Py_INCREF(found);
+      return found;
+    } else if (PyErr_Occurred()) {
+      return NULL;
+    }
+  }
+
+  if (Py_EnterRecursiveCall(" while unwrapping"))
+    return NULL;
+  result = walk(st, obj);
+  Py_LeaveRecursiveCall();
+
+  if (! result || result == obj)
+    return result;
+
+  /* obj may have been reached again through a cycle and rebuilt
+     there already, in which case that's the one to keep */
+  found = unwrap_memo_get(st, obj);
+  if (found || PyErr_Occurred()) {
+    Py_XINCREF(found);
+    Py_DECREF(result);
+    return found;
+  }
+
+  if (! st->memo && ! (st->memo = PyDict_New()))
+    goto error;
+
+  id = PyLong_FromVoidPtr(obj);
+  if (! id)
+    goto error;
+
+  if (PyDict_SetItem(st->memo, id, result) < 0) {
+    Py_DECREF(id);
+    goto error;
+  }
+  Py_DECREF(id);
+
+  if (! st->keep && ! (st->keep = PyList_New(0)))
+    goto error;
+  if (PyList_Append(st->keep, obj) < 0)
+    goto error;
+
+  st->rebuilt++;
+  return result;
+
+ error:
+  Py_DECREF(result);
+  return NULL;
+}
+
+
+static PyObject *unwrap_list(UnwrapState *st, PyObject *list) {
+  PyObject *item;
+  PyObject *found;
+  Py_ssize_t i;
+
+  for (i = 0; i < PyList_GET_SIZE(list); i++) {
+    item = PyList_GET_ITEM(list, i);
+    Py_INCREF(item);
+
+    found = unwrap_walk(st, item);
+    if (! found) {
+      Py_DECREF(item);
+      return NULL;
+    }
+
+    if (found != item &&
+	i < PyList_GET_SIZE(list) && PyList_GET_ITEM(list, i) == item) {
+      PyList_SetItem(list, i, found);
+    } else {
+      Py_DECREF(found);
+    }
+
+    Py_DECREF(item);
+  }
+
+  Py_INCREF(list);
+  return list;
+}
+
+
+/* rebuilds a dict whose keys are to be replaced, keeping its order */
+static int unwrap_rekey(UnwrapState *st, PyObject *dict) {
+  PyObject *items;
+  PyObject *key;
+  Py_ssize_t count;
+  Py_ssize_t i;
+  int rc = 0;
+
+  items = PyDict_Items(dict);
+  if (! items)
+    return -1;
+
+  PyDict_Clear(dict);
+
+  count = PyList_GET_SIZE(items);
+  for (i = 0; i < count && rc == 0; i++) {
+    key = unwrap_walk(st, PyTuple_GET_ITEM(PyList_GET_ITEM(items, i), 0));
+    if (! key) {
+      rc = -1;
+    } else {
+      rc = PyDict_SetItem(dict, key,
+			  PyTuple_GET_ITEM(PyList_GET_ITEM(items, i), 1));
+      Py_DECREF(key);
+    }
+  }
+
+  Py_DECREF(items);
+  return rc;
+}
+
+
+static PyObject *unwrap_dict(UnwrapState *st, PyObject *dict) {
+  PyObject *key;
+  PyObject *value;
+  PyObject *found;
+  Py_ssize_t size;
+  Py_ssize_t pos = 0;
+  int rekey = 0;
+  int rc;
+
+  size = PyDict_Size(dict);
+
+  while (PyDict_Next(dict, &pos, &key, &value)) {
+    Py_INCREF(key);
+    Py_INCREF(value);
+
+    found = unwrap_walk(st, key);
+    if (found) {
+      rekey |= (found != key);
+      Py_DECREF(found);
+      found = unwrap_walk(st, value);
+    }
+
+    if (! found) {
+      rc = -1;
+    } else if (found != value) {
+      rc = PyDict_SetItem(dict, key, found);
+    } else {
+      rc = 0;
+    }
+
+    Py_XDECREF(found);
+    Py_DECREF(key);
+    Py_DECREF(value);
+
+    if (rc < 0)
+      return NULL;
+
+    if (PyDict_Size(dict) != size) {
+      PyErr_SetString(PyExc_RuntimeError,
+		      "dictionary changed size during unwrap");
+      return NULL;
+    }
+  }
+
+  if (rekey && unwrap_rekey(st, dict) < 0)
+    return NULL;
+
+  Py_INCREF(dict);
+  return dict;
+}
+
+
+static PyObject *unwrap_set(UnwrapState *st, PyObject *set) {
+  PyObject *iter;
+  PyObject *item;
+  PyObject *found;
+  PyObject *changes = NULL;
+  PyObject *change;
+  Py_ssize_t i;
+
+  iter = PyObject_GetIter(set);
+  if (! iter)
+    return NULL;
+
+  while ((item = PyIter_Next(iter))) {
+    found = unwrap_walk(st, item);
+
+    if (found && found != item) {
+      if (! changes)
+	changes = PyList_New(0);
+
+      change = changes? PyTuple_Pack(2, item, found): NULL;
+      if (! change || PyList_Append(changes, change) < 0) {
+	Py_CLEAR(found);
+      }
+      Py_XDECREF(change);
+    }
+
+    Py_DECREF(item);
+    if (! found)
+      break;
+    Py_DECREF(found);
+  }
+  Py_DECREF(iter);
+
+  if (PyErr_Occurred())
+    goto error;
+
+  /* the set can't be altered while we iterate over it */
+  for (i = 0; changes && i < PyList_GET_SIZE(changes); i++) {
+    change = PyList_GET_ITEM(changes, i);
+    if (PySet_Discard(set, PyTuple_GET_ITEM(change, 0)) < 0 ||
+	PySet_Add(set, PyTuple_GET_ITEM(change, 1)) < 0)
+      goto error;
+  }
+
+  Py_XDECREF(changes);
+  Py_INCREF(set);
+  return set;
+
+ error:
+  Py_XDECREF(changes);
+  return NULL;
+}
+
+
+static PyObject *unwrap_tuple(UnwrapState *st, PyObject *tup) {
+  PyObject *result = NULL;
+  PyObject *item;
+  PyObject *found;
+  Py_ssize_t size;
+  Py_ssize_t i;
+  Py_ssize_t j;
+
+  size = PyTuple_GET_SIZE(tup);
+
+  for (i = 0; i < size; i++) {
+    item = PyTuple_GET_ITEM(tup, i);
+
+    found = unwrap_walk(st, item);
+    if (! found) {
+      Py_XDECREF(result);
+      return NULL;
+    }
+
+    if (result) {
+      PyTuple_SET_ITEM(result, i, found);
+
+    } else if (found != item) {
+      /* the first replacement, so it's time for a new tuple */
+      result = PyTuple_New(size);
+      if (! result) {
+	Py_DECREF(found);
+	return NULL;
+      }
+      for (j = 0; j < i; j++) {
+	item = PyTuple_GET_ITEM(tup, j);
+	Py_INCREF(item);
+	PyTuple_SET_ITEM(result, j, item);
+      }
+      PyTuple_SET_ITEM(result, i, found);
+
+    } else {
+      Py_DECREF(found);
+    }
+  }
+
+  if (! result) {
+    Py_INCREF(tup);
+    result = tup;
+  }
+  return result;
+}
+
+
+static PyObject *unwrap_frozenset(UnwrapState *st, PyObject *fset) {
+  PyObject *iter;
+  PyObject *item;
+  PyObject *found;
+  PyObject *items = NULL;
+  PyObject *result;
+  Py_ssize_t seen = 0;
+
+  iter = PyObject_GetIter(fset);
+  if (! iter)
+    return NULL;
+
+  while ((item = PyIter_Next(iter))) {
+    found = unwrap_walk(st, item);
+    Py_DECREF(item);
+    if (! found)
+      break;
+
+    if (! items && found != item) {
+      /* the first replacement, so gather up the unchanged items
+	 which came before it */
+      items = PySequence_List(fset);
+      if (items && PyList_SetSlice(items, seen, PY_SSIZE_T_MAX, NULL) < 0)
+	Py_CLEAR(items);
+      if (! items) {
+	Py_DECREF(found);
+	break;
+      }
+    }
+
+    if (items && PyList_Append(items, found) < 0) {
+      Py_DECREF(found);
+      break;
+    }
+
+    Py_DECREF(found);
+    seen++;
+  }
+  Py_DECREF(iter);
+
+  if (PyErr_Occurred()) {
+    Py_XDECREF(items);
+    return NULL;
+  }
+
+  if (! items) {
+    Py_INCREF(fset);
+    return fset;
+  }
+
+  result = PyFrozenSet_New(items);
+  Py_DECREF(items);
+  return result;
+}
+
+
+static PyObject *unwrap_instance(UnwrapState *st, PyObject *obj) {
+  PyObject *dict;
+  PyObject *found;
+
+  dict = PyObject_GetAttr(obj, str___dict__);
+  if (! dict) {
+    if (! PyErr_ExceptionMatches(PyExc_AttributeError))
+      return NULL;
+
+    PyErr_Clear();
+    Py_INCREF(obj);
+    return obj;
+  }
+
+  if (PyDict_CheckExact(dict)) {
+    found = unwrap_mutable(st, dict, unwrap_dict);
+    Py_DECREF(dict);
+    if (! found)
+      return NULL;
+    Py_DECREF(found);
+
+  } else {
+    Py_DECREF(dict);
+  }
+
+  Py_INCREF(obj);
+  return obj;
+}
+
+
+static PyObject *unwrap_walk(UnwrapState *st, PyObject *obj) {
+  PyObject *answer;
+  PyObject *result;
+
+  if (PyProxy_Check(obj) || PyContainer_Check(obj)) {
+    answer = unwrap_promise(st, obj);
+    if (! answer || answer == obj)
+      return answer;
+
+    result = unwrap_walk(st, answer);
+    Py_DECREF(answer);
+    return result;
+
+  } else if (PyList_CheckExact(obj)) {
+    return unwrap_mutable(st, obj, unwrap_list);
+
+  } else if (PyDict_CheckExact(obj)) {
+    return unwrap_mutable(st, obj, unwrap_dict);
+
+  } else if (PyTuple_CheckExact(obj)) {
+    if (PyTuple_GET_SIZE(obj) == 0) {
+      Py_INCREF(obj);
+      return obj;
+    }
+    return unwrap_immutable(st, obj, unwrap_tuple);
+
+  } else if (PySet_CheckExact(obj)) {
+    return unwrap_mutable(st, obj, unwrap_set);
+
+  } else if (PyFrozenSet_CheckExact(obj)) {
+    return unwrap_immutable(st, obj, unwrap_frozenset);
+
+  } else if (st->attributes && Py_TYPE(obj)->tp_dictoffset &&
+	     ! PyType_Check(obj) && ! PyModule_Check(obj)) {
+    return unwrap_mutable(st, obj, unwrap_instance);
+
+  } else {
+    Py_INCREF(obj);
+    return obj;
+  }
+}
+
+
+static PyObject *unwrap(PyObject *module, PyObject *args, PyObject *kwds) {
+  static char *keywords[] = { "obj", "deliver", "attributes", NULL };
+
+  UnwrapState st = { NULL, NULL, 0, 0, 0 };
+  PyObject *obj = NULL;
+  PyObject *result;
+
+  if (! PyArg_ParseTupleAndKeywords(args, kwds, "O|ii", keywords, &obj,
+				    &st.deliver, &st.attributes))
+    return NULL;
+
+  result = unwrap_walk(&st, obj);
+
+  Py_XDECREF(st.memo);
+  Py_XDECREF(st.keep);
+
+  return result;
+}
+
+
+static PyObject *proxy_freelist_info(PyObject *module, PyObject *args) {
+  if (! PyArg_ParseTuple(args, ""))
+    return NULL;
+
+  return Py_BuildValue("ii", proxy_freelist_count, proxy_freelist_limit);
+}
+
+
+static PyObject *set_proxy_freelist(PyObject *module, PyObject *args) {
+  int limit = 0;
+  int previous;
+
+  if (! PyArg_ParseTuple(args, "i", &limit))
+    return NULL;
+
+  if (limit < 0) {
+    PyErr_SetString(PyExc_ValueError,
+		    "free list limit must not be negative");
+    return NULL;
+  }
+
+  previous = proxy_freelist_limit;
+  proxy_freelist_limit = limit;
+  proxy_freelist_trim(limit);
+
+  return Py_BuildValue("i", previous);
+}
+
+
+#if PY_VERSION_HEX >= 0x03050000
+
+
+static PyObject *set_await_hook(PyObject *module, PyObject *hook) {
+  if (hook == Py_None) {
+    hook = NULL;
+
+  } else if (! PyCallable_Check(hook)) {
+    PyErr_SetString(PyExc_TypeError, "await hook must be callable");
+    return NULL;
+  }
+
+  Py_XINCREF(hook);
+  Py_XDECREF(await_hook);
+  await_hook = hook;
+
+  Py_RETURN_NONE;
+}
+
+
+#endif
+
+
 static PyMethodDef methods[] = {
 
   { "is_proxy", is_proxy, METH_VARARGS,
@@ -484,24 +2046,163 @@ static PyMethodDef methods[] = {
   { "deliver_proxy", deliver_proxy, METH_VARARGS,
     "Deliver on a proxy promise if it isn't delivered already" },
 
+  { "is_promise", is_promise, METH_O,
+    "True if `obj` is a promise (either a proxy or a container)" },
+
+  { "is_delivered", is_delivered, METH_O,
+    "True if `a_promise` is a promise and has been delivered" },
+
+  { "promise_work", promise_work, METH_O,
+    "The work an undelivered proxy or container promise will call to\n"
+    "deliver, or None" },
+
+  { "deliver", deliver, METH_O,
+    "Attempts to deliver on a promise, and returns the resulting\n"
+    "value. If the delivery of work causes an exception, it will be\n"
+    "raised here.\n"
+    "\n"
+    "Parameters\n"
+    "----------\n"
+    "on_promise : `Proxy` or `Container` promise\n"
+    "  the promise to deliver on\n"
+    "\n"
+    "Returns\n"
+    "-------\n"
+    "value\n"
+    "  the promised work if it could be successfully computed" },
+
+  { "unwrap", (PyCFunction) unwrap, METH_VARARGS|METH_KEYWORDS,
+    "Replaces any delivered promises found within obj with their\n"
+    "answers. Lists, tuples, dicts, sets and frozensets are walked,\n"
+    "as are the answers themselves. Lists, dicts and sets are altered\n"
+    "in place, while a tuple or frozenset is rebuilt only if one of\n"
+    "its items was replaced. Shared and cyclic references remain so.\n"
+    "\n"
+    "Parameters\n"
+    "----------\n"
+    "obj : `object`\n"
+    "  the structure to unwrap\n"
+    "deliver : `bool`\n"
+    "  deliver on undelivered promises, rather than leaving them be\n"
+    "attributes : `bool`\n"
+    "  also walk the `__dict__` of any other object which has one\n"
+    "\n"
+    "Returns\n"
+    "-------\n"
+    "value\n"
+    "  obj itself, unless obj was a promise or a tuple or frozenset\n"
+    "  which needed rebuilding" },
+
+  { "proxy_freelist", proxy_freelist_info, METH_VARARGS,
+    "The number of dead proxies held for reuse, and the limit on how\n"
+    "many may be held, as a `(count, limit)` tuple" },
+
+  { "set_proxy_freelist", set_proxy_freelist, METH_VARARGS,
+    "Sets the limit on how many dead proxies are held for reuse,\n"
+    "releasing any held beyond it.\n"
+    "\n"
+    "Parameters\n"
+    "----------\n"
+    "limit : `int`\n"
+    "  the new limit. Zero disables the free list\n"
+    "\n"
+    "Returns\n"
+    "-------\n"
+    "previous : `int`\n"
+    "  the limit which was in place before this call" },
+
+#if PY_VERSION_HEX >= 0x03050000
+  { "set_await_hook", set_await_hook, METH_O,
+    "Sets the function which awaiting a proxy or container promise\n"
+    "calls with that promise, returning the iterator to await on. None\n"
+    "makes promises unawaitable again" },
+#endif
+
   { NULL, NULL, 0, NULL },
 };
 
 
-PyMODINIT_FUNC init_proxy() {
+#if PY_MAJOR_VERSION >= 3
+
+
+static struct PyModuleDef proxy_module = {
+  PyModuleDef_HEAD_INIT,
+  "promises._proxy",
+  NULL,
+  -1,
+  methods,
+};
+
+
+#endif
+
+
+static PyObject *proxy_module_init(void) {
   PyObject *mod;
   PyObject *proxytype;
+  PyObject *containertype;
 
   proxytype = (PyObject *) &PyProxyType;
+  containertype = (PyObject *) &PyContainerType;
+
+  /* a delivered proxy whose answer has a buffer becomes one of
+     these. It is a Proxy in every other respect, so it is made as a
+     copy of one before either is readied. */
+  PyBufferProxyType = PyProxyType;
+  PyBufferProxyType.tp_name = "promises.BufferProxy";
+  PyBufferProxyType.tp_base = &PyProxyType;
+  PyBufferProxyType.tp_as_buffer = &proxy_as_buffer;
 
   if (PyType_Ready(&PyProxyType) < 0)
-    return;
+    return NULL;
+
+  if (PyType_Ready(&PyBufferProxyType) < 0)
+    return NULL;
 
+  if (PyType_Ready(&PyContainerType) < 0)
+    return NULL;
+
+  str_deliver = PyString_InternFromString("deliver");
+  str_is_delivered = PyString_InternFromString("is_delivered");
+  str___dict__ = PyString_InternFromString("__dict__");
+  if (! (str_deliver && str_is_delivered && str___dict__))
+    return NULL;
+
+#if PY_MAJOR_VERSION >= 3
+  mod = PyModule_Create(&proxy_module);
+#else
   mod = Py_InitModule("promises._proxy", methods);
+#endif
+  if (! mod)
+    return NULL;
 
   Py_INCREF(proxytype);
   PyModule_AddObject(mod, "Proxy", proxytype);
+
+  Py_INCREF(containertype);
+  PyModule_AddObject(mod, "Container", containertype);
+
+  return mod;
+}
+
+
+#if PY_MAJOR_VERSION >= 3
+
+
+PyMODINIT_FUNC PyInit__proxy(void) {
+  return proxy_module_init();
 }
 
 
+#else
+
+
+PyMODINIT_FUNC init_proxy(void) {
+  proxy_module_init();
+}
+
+
+#endif
+
+
 /* The end. */
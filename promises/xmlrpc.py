@@ -29,7 +29,11 @@ Examples
 
 
 from . import lazy, lazy_proxy
-from xmlrpclib import MultiCall
+
+try:
+    from xmlrpclib import MultiCall
+except ImportError:
+    from xmlrpc.client import MultiCall
 
 
 __all__ = ('LazyMultiCall', 'ProxyMultiCall', )
@@ -128,7 +132,7 @@ class LazyMultiCall(object):
 
             return promised
 
-        promisary.func_name = name
+        promisary.__name__ = name
         return promisary
 
 
@@ -1,4 +1,4 @@
-#! /usr/bin/env python2
+#! /usr/bin/env python
 
 # This library is free software; you can redistribute it and/or modify
 # it under the terms of the GNU Lesser General Public License as
@@ -54,11 +54,12 @@ setup(name = "promises",
 
       provides = ["promises", ],
       requires = [],
-      platforms = ["python2 >= 2.6", ],
+      platforms = ["python2 >= 2.6", "python3 >= 3.3", ],
 
       classifiers = [
           "Intended Audience :: Developers",
           "Programming Language :: Python :: 2",
+          "Programming Language :: Python :: 3",
           "Topic :: Software Development", ])
 
 
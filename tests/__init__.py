@@ -21,11 +21,18 @@ license: LGPL v.3
 """
 
 
+import gc
+import math
+import operator
+import struct
 import sys
 import unittest
+import weakref
 
-from itertools import izip
+from array import array
 from promises import *
+from threading import Event, Lock, Thread
+from time import sleep
 
 
 def create_exc_tb(exception=None):
@@ -38,7 +45,7 @@ def create_exc_tb(exception=None):
 
     try:
         raise exception
-    except Exception, e:
+    except Exception:
         return sys.exc_info()
 
 
@@ -70,6 +77,7 @@ class TestContainer(unittest.TestCase):
         """
 
         called = [False]
+
         def do_work_once():
             self.assertFalse(called[0], "do_work_once already called")
             called[0] = True
@@ -85,7 +93,7 @@ class TestContainer(unittest.TestCase):
         self.assertTrue(is_promise(promised))
         self.assertFalse(is_delivered(promised))
 
-        val = { "testval": True, "a": 5, "b": tuple() }
+        val = {"testval": True, "a": 5, "b": tuple()}
         setter(val)
 
         self.assertTrue(is_delivered(promised))
@@ -113,6 +121,73 @@ class TestContainer(unittest.TestCase):
         self.assertEqual(deliver(promised), 8)
 
 
+    def test_promise_blocking(self):
+        # a blocking promise waits for the setter or seterr
+
+        promised, setter, seterr = self.promise(blocking=True)
+
+        class TacoException(Exception):
+            pass
+
+        answers = list()
+
+        def deliver_into_answers():
+            try:
+                answers.append(deliver(promised))
+            except TacoException:
+                answers.append(TacoException)
+
+        thread = Thread(target=deliver_into_answers)
+        thread.start()
+        sleep(0.1)
+        self.assertFalse(is_delivered(promised))
+        self.assertEqual(answers, [])
+
+        seterr(*create_exc_tb(TacoException()))
+        thread.join()
+        self.assertFalse(is_delivered(promised))
+        self.assertEqual(answers, [TacoException])
+
+        # having raised the exception, delivery raises it again
+        # rather than blocking
+        thread = Thread(target=deliver_into_answers)
+        thread.start()
+        thread.join(5)
+        self.assertEqual(answers, [TacoException, TacoException])
+
+        # until a value is set after all
+        setter(100)
+        self.assertTrue(is_delivered(promised))
+        self.assertEqual(deliver(promised), 100)
+
+
+    def test_promise_blocking_threads(self):
+        # a failure reaches every thread delivering on the promise
+
+        promised, setter, seterr = self.promise(blocking=True)
+
+        class TacoException(Exception):
+            pass
+
+        answers = list()
+
+        def deliver_into_answers():
+            try:
+                answers.append(deliver(promised))
+            except TacoException:
+                answers.append(TacoException)
+
+        threads = [Thread(target=deliver_into_answers) for _ in range(0, 2)]
+        for thread in threads:
+            thread.start()
+
+        sleep(0.1)
+        seterr(*create_exc_tb(TacoException()))
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(answers, [TacoException] * 2)
+
+
     def test_promise_double_set(self):
 
         promised, setter, seterr = self.promise()
@@ -120,19 +195,206 @@ class TestContainer(unittest.TestCase):
         self.assertFalse(is_delivered(promised))
 
         # we aren't ready to deliver, make sure that it says so
-        foo = lambda: deliver(promised)
-        self.assertRaises(PromiseNotReady, foo)
+        self.assertRaises(PromiseNotReady, deliver, promised)
 
         setter(100)
         self.assertEqual(deliver(promised), 100)
 
         # now we try to set it again
-        foo = lambda: setter(100)
-        self.assertRaises(PromiseAlreadyDelivered, foo)
+        self.assertRaises(PromiseAlreadyDelivered, setter, 100)
 
         # okay, how about setting an exception instead
-        foo = lambda: seterr(*create_exc_tb(Exception()))
-        self.assertRaises(PromiseAlreadyDelivered, foo)
+        self.assertRaises(PromiseAlreadyDelivered, seterr,
+                          *create_exc_tb(Exception()))
+
+
+    def test_as_completed(self):
+        # promises are yielded in the order their setters are called
+
+        made = [self.promise(blocking=True) for _ in range(0, 5)]
+        promises = [promised for promised, _setter, _seterr in made]
+        ready = self.lazy(lambda: "ready")
+
+        class TacoException(Exception):
+            pass
+
+        def set_in_reverse():
+            for index, (_promised, setter, seterr) in \
+                    reversed(list(enumerate(made))):
+                sleep(0.01)
+                if index == 2:
+                    seterr(*create_exc_tb(TacoException()))
+                else:
+                    setter(index)
+
+        thread = Thread(target=set_in_reverse)
+        thread.start()
+
+        found = list(as_completed(promises + [ready]))
+        thread.join()
+
+        # a lazy promise has nothing to wait on
+        self.assertTrue(found[0] is ready)
+        self.assertEqual([id(p) for p in found[1:]],
+                         [id(p) for p in reversed(promises)])
+
+        self.assertEqual(deliver(found[1]), 4)
+        self.assertRaises(TacoException, lambda: deliver(found[3]))
+
+        # already set promises are yielded without waiting
+        promised, setter, seterr = self.promise(blocking=True)
+        setter(5)
+        self.assertEqual([deliver(p) for p in as_completed([promised])], [5])
+
+        # and unset ones can time out
+        promised, setter, seterr = self.promise(blocking=True)
+        found = as_completed([promised], timeout=0.05)
+        self.assertRaises(PromiseTimeout, lambda: list(found))
+
+
+    def test_concurrent_listen(self):
+        # every listener hears about it, however many start at once
+        from promises import promise_work
+
+        made = [self.promise(blocking=True) for _ in range(0, 200)]
+        heard = []
+        start = Event()
+
+        def listen():
+            start.wait()
+            for promised, _setter, _seterr in made:
+                promise_work(promised)._listen(heard.append)
+
+        threads = [Thread(target=listen) for _ in range(0, 4)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        for _promised, setter, _seterr in made:
+            setter(None)
+        self.assertEqual(len(heard), 800)
+
+
+    def test_wait(self):
+        made = [self.promise(blocking=True) for _ in range(0, 3)]
+        promises = [promised for promised, _setter, _seterr in made]
+
+        done, not_done = wait(promises, timeout=0.01)
+        self.assertEqual(done, [])
+        self.assertEqual(len(not_done), 3)
+
+        thread = Thread(target=lambda: (sleep(0.01), made[1][1]("b")))
+        thread.start()
+        done, not_done = wait(promises, return_when=FIRST_COMPLETED)
+        thread.join()
+
+        self.assertEqual(len(done), 1)
+        self.assertTrue(done[0] is promises[1])
+        self.assertEqual(deliver(done[0]), "b")
+        self.assertEqual([id(p) for p in not_done],
+                         [id(promises[0]), id(promises[2])])
+
+        made[0][1]("a")
+        made[2][1]("c")
+        done, not_done = wait(promises)
+        self.assertEqual(len(done), 3)
+        self.assertEqual(not_done, [])
+        self.assertEqual(sorted(deliver(p) for p in done), ["a", "b", "c"])
+
+        self.assertRaises(ValueError, wait, promises, return_when="NEVER")
+
+
+    def test_wait_backend(self):
+        made = []
+
+        class CountedLock(object):
+            def __init__(self):
+                self._lock = Lock()
+                made.append(self)
+
+            def acquire(self, blocking=True):
+                return self._lock.acquire(blocking)
+
+            def release(self):
+                self._lock.release()
+
+            def locked(self):
+                return self._lock.locked()
+
+        previous = set_wait_backend(CountedLock)
+        try:
+            promised, setter, _seterr = self.promise(blocking=True)
+            self.assertEqual(len(made), 1)
+
+            thread = Thread(target=lambda: (sleep(0.01), setter(5)))
+            thread.start()
+            self.assertEqual(deliver(promised), 5)
+            thread.join()
+
+            # nothing to wait on, as these are only to be awaited
+            set_wait_backend("asyncio")
+            promised, setter, _seterr = self.promise(blocking=True)
+            self.assertRaises(PromiseNotReady, deliver, promised)
+            setter(6)
+            self.assertEqual(deliver(promised), 6)
+            self.assertEqual(len(made), 1)
+
+        finally:
+            set_wait_backend(previous)
+
+        self.assertRaises(ValueError, set_wait_backend, "carrier pigeon")
+
+
+    def test_wait_shared(self):
+        # green threads all have the same thread ident, so several
+        # may wait on the state at once rather than on the promise
+        from promises import promise_work
+
+        promised, setter, _seterr = self.promise(blocking=True)
+        state = promise_work(promised)
+
+        found = []
+        waiting = [Thread(target=lambda: found.append(state()))
+                   for _ in range(0, 3)]
+        for thread in waiting:
+            thread.start()
+
+        sleep(0.01)
+        setter(7)
+
+        for thread in waiting:
+            thread.join(5)
+        self.assertEqual(found, [7, 7, 7])
+
+        # and an exception wakes every one of them, as well as anyone
+        # who comes along afterwards
+        promised, _setter, seterr = self.promise(blocking=True)
+        state = promise_work(promised)
+
+        class TacoException(Exception):
+            pass
+
+        def raised():
+            try:
+                state()
+            except TacoException:
+                found.append(TacoException)
+
+        del found[:]
+        waiting = [Thread(target=raised) for _ in range(0, 3)]
+        for thread in waiting:
+            thread.start()
+
+        sleep(0.01)
+        seterr(*create_exc_tb(TacoException()))
+        waiting.append(Thread(target=raised))
+        waiting[-1].start()
+
+        for thread in waiting:
+            thread.join(5)
+        self.assertEqual(found, [TacoException] * 4)
 
 
     def test_memoized(self):
@@ -145,6 +407,78 @@ class TestContainer(unittest.TestCase):
         self.assertEqual(deliver(promised), "Hello World")
 
 
+    def test_concurrent_delivery(self):
+        # racing threads only execute the promised work once, and all
+        # of them receive its answer
+
+        started = Event()
+        release = Event()
+
+        def slow_work():
+            started.set()
+            release.wait()
+            return "Hello World"
+
+        promised = self.lazy(self.assert_called_once(slow_work))
+
+        answers = list()
+
+        def deliver_into_answers():
+            answers.append(deliver(promised))
+
+        threads = [Thread(target=deliver_into_answers) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+
+        # give every thread an opportunity to pile up behind the one
+        # that is performing the work
+        started.wait()
+        sleep(0.1)
+        self.assertFalse(is_delivered(promised))
+
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertTrue(is_delivered(promised))
+        self.assertEqual(answers, ["Hello World"] * 8)
+
+
+    def test_collectable(self):
+        # reference cycles through a promise can be collected, and
+        # promises may be weakly referenced
+
+        class Holder(object):
+            pass
+
+        for delivered in (False, True):
+            holder = Holder()
+            holder.promised = self.lazy(lambda h=holder: h)
+            if delivered:
+                self.assertTrue(deliver(holder.promised) is holder)
+
+            ref_holder = weakref.ref(holder)
+            ref_promised = weakref.ref(holder.promised)
+
+            del holder
+            gc.collect()
+
+            self.assertTrue(ref_holder() is None)
+            self.assertTrue(ref_promised() is None)
+            self.assertEqual(gc.garbage, [])
+
+        # an undelivered settable promise refers back to itself by way
+        # of its setter
+        promised, setter, seterr = self.promise(blocking=True)
+        ref_promised = weakref.ref(promised)
+
+        del promised, setter, seterr
+        gc.collect()
+
+        self.assertTrue(ref_promised() is None)
+        self.assertEqual(gc.garbage, [])
+
+
     def test_callable_int(self):
         # callable work returning an int
 
@@ -237,6 +571,156 @@ class TestContainer(unittest.TestCase):
         self.assertFalse(is_delivered(promised))
 
 
+    def test_unwrap(self):
+        # delivered promises are replaced by their answers, within
+        # whatever structure they're found
+
+        def delivered(value):
+            promised = self.lazy(lambda: value)
+            deliver(promised)
+            return promised
+
+        A = delivered(1)
+        B = delivered((2, delivered(3)))
+        C = self.lazy(lambda: 4)
+
+        data = [A, {"b": B, delivered("k"): [C]}, set([A]),
+                frozenset([B]), (A, "x")]
+        inner = data[1]
+
+        result = unwrap(data)
+        self.assertTrue(result is data)
+        self.assertTrue(data[1] is inner)
+        self.assertTrue(type(data[0]) is int)
+        self.assertEqual(data, [1, {"b": (2, 3), "k": [C]}, set([1]),
+                                frozenset([(2, 3)]), (1, "x")])
+        self.assertTrue(type(data[1]["b"][1]) is int)
+        self.assertTrue(type(list(data[1])[1]) is str)
+        self.assertTrue(type(list(data[2])[0]) is int)
+
+        # undelivered promises are left alone, unless asked
+        self.assertTrue(is_promise(data[1]["k"][0]))
+        self.assertFalse(is_delivered(C))
+        unwrap(data, deliver=True)
+        self.assertTrue(type(data[1]["k"][0]) is int)
+        self.assertEqual(data[1]["k"], [4])
+
+        # a promise is unwrapped to its answer
+        self.assertTrue(type(unwrap(A)) is int)
+        self.assertTrue(unwrap(C) is deliver(C))
+
+
+    def test_unwrap_unchanged(self):
+        # nothing is rebuilt when there's nothing to replace
+
+        t = (1, "two", [3], frozenset([4]))
+        d = {"t": t}
+        self.assertTrue(unwrap(t) is t)
+        self.assertTrue(unwrap(d) is d)
+        self.assertTrue(d["t"] is t)
+
+        promised = self.lazy(lambda: 5)
+        t = (1, promised)
+        self.assertTrue(unwrap(t) is t)
+
+
+    def test_unwrap_shared(self):
+        # shared and cyclic references stay shared and cyclic
+
+        A = self.lazy(lambda: "A")
+        deliver(A)
+
+        shared = (A, A)
+        data = [shared, shared]
+        data.append(data)
+        unwrap(data)
+
+        self.assertEqual(data[0], ("A", "A"))
+        self.assertTrue(data[0] is data[1])
+        self.assertTrue(data[2] is data)
+
+        # a tuple which is reached again through a cycle before it
+        # has been rebuilt
+        cycle = []
+        tup = (cycle, A)
+        cycle.append(tup)
+        result = unwrap(tup)
+
+        self.assertEqual(result[1], "A")
+        self.assertTrue(result[0] is cycle)
+        self.assertTrue(cycle[0] is result)
+
+        # and one which is reached again by way of another tuple
+        cycle = []
+        tup = (cycle, A)
+        cycle.append((tup,))
+        result = unwrap([tup, cycle])
+
+        self.assertTrue(result[0] is cycle[0][0])
+        self.assertEqual(result[0][1], "A")
+        self.assertTrue(result[0][0] is cycle)
+
+
+    def test_unwrap_attributes(self):
+        # instance dicts are walked only if asked
+
+        class Holder(object):
+            pass
+
+        A = self.lazy(lambda: "A")
+        deliver(A)
+
+        holder = Holder()
+        holder.value = A
+        holder.me = holder
+
+        unwrap([holder])
+        self.assertFalse(type(holder.value) is str)
+
+        unwrap([holder], attributes=True)
+        self.assertTrue(type(holder.value) is str)
+        self.assertTrue(holder.me is holder)
+
+
+class TestDispatch(unittest.TestCase):
+    """
+    tests for the deliver, is_delivered, and is_promise functions on
+    things which are not exactly a Container or a Proxy
+    """
+
+
+    def test_container_subclass(self):
+        # subclasses of Container may override delivery
+
+        class Doubling(Container):
+            def deliver(self):
+                return Container.deliver(self) * 2
+
+        promised = Doubling(lambda: 5)
+        self.assertTrue(is_promise(promised))
+        self.assertFalse(is_delivered(promised))
+        self.assertEqual(deliver(promised), 10)
+        self.assertTrue(is_delivered(promised))
+
+
+    def test_duck_typed(self):
+        # anything resembling a Container is treated as a promise
+
+        class Duck(object):
+            def is_delivered(self):
+                return True
+
+            def deliver(self):
+                return "quack"
+
+        self.assertTrue(is_promise(Duck()))
+        self.assertTrue(is_delivered(Duck()))
+        self.assertEqual(deliver(Duck()), "quack")
+
+        self.assertFalse(is_promise(5))
+        self.assertFalse(is_promise(object()))
+
+
 class TestProxy(TestContainer):
     """
     tests for the ProxyPromise class
@@ -261,17 +745,17 @@ class TestProxy(TestContainer):
         class DummyClass(object):
             pass
 
-        values = ( True, False, None,
-                   999, 9.99, "test string", u"unicode string",
-                   (1, 2, 3), [1, 2, 3],
-                   {"a":1,"b":2,"c":3},
-                   object, object(), DummyClass, DummyClass(),
-                   xrange, xrange(0, 99),
-                   lambda x: x+8 )
+        values = (True, False, None,
+                  999, 9.99, "test string", u"unicode string",
+                  (1, 2, 3), [1, 2, 3],
+                  {"a": 1, "b": 2, "c": 3},
+                  object, object(), DummyClass, DummyClass(),
+                  range, range(0, 99),
+                  lambda x: x + 8)
 
-        provs = (self.lazy(lambda:val) for val in values)
+        provs = (self.lazy(lambda val=val: val) for val in values)
 
-        for val,prov in izip(values, provs):
+        for val, prov in zip(values, provs):
             self.assertEqual(prov, val)
             self.assertEqual(val, prov)
 
@@ -297,19 +781,157 @@ class TestProxy(TestContainer):
         self.assertTrue((B ** 2) == (5 ** 2))
 
 
+    def test_proxy_dispatch(self):
+        # delivered proxies behave as their answer, whether or not an
+        # operation is dispatched directly to the answer's type
+
+        A = self.lazy(5)
+        comparisons = (operator.lt, operator.le, operator.eq,
+                       operator.ne, operator.gt, operator.ge)
+        for other in (4, 5, 6, 5.0, self.lazy(5)):
+            for op in comparisons:
+                self.assertEqual(op(A, other), op(5, other))
+                self.assertEqual(op(other, A), op(other, 5))
+
+        for other in ("5", None):
+            for op in (operator.eq, operator.ne):
+                self.assertEqual(op(A, other), op(5, other))
+                self.assertEqual(op(other, A), op(other, 5))
+
+        self.assertEqual(A / 2, 5 / 2)
+        self.assertEqual(A // 2.0, 2.0)
+        self.assertEqual(A - self.lazy(1), 4)
+        self.assertEqual(divmod(A, 3), (1, 2))
+        self.assertEqual(A & 4, 4)
+        self.assertEqual(hash(A), hash(5))
+
+        # sequences, where the number slots don't apply
+        L = self.lazy(lambda: [1, 2])
+        self.assertEqual(L + [3], [1, 2, 3])
+        self.assertEqual(L * 2, [1, 2, 1, 2])
+        self.assertEqual(L[-1], 2)
+        self.assertEqual(len(L), 2)
+        self.assertTrue(2 in L)
+        self.assertEqual(list(L), [1, 2])
+
+        It = self.lazy(lambda: iter([1, 2]))
+        self.assertEqual(next(It), 1)
+        self.assertEqual(next(It), 2)
+        self.assertRaises(StopIteration, lambda: next(It))
+
+        # a python class only has its methods invoked once
+        calls = list()
+
+        class Counted(object):
+            def __add__(self, other):
+                calls.append("add")
+                return NotImplemented
+
+            def __radd__(self, other):
+                calls.append("radd")
+                return "radd"
+
+        C = self.lazy(Counted)
+        self.assertRaises(TypeError, lambda: C + Counted())
+        self.assertEqual(calls, ["add"])
+
+        del calls[:]
+        self.assertEqual(1 + C, "radd")
+        self.assertEqual(calls, ["radd"])
+
+        self.assertFalse(C == Counted())
+
+
+    def test_proxy_functions(self):
+        # these predate deliver and is_delivered, and are still around
+        from promises import deliver_proxy, is_proxy_delivered
+
+        promised = self.lazy(lambda: 5)
+        self.assertFalse(is_proxy_delivered(promised))
+        self.assertEqual(deliver_proxy(promised), 5)
+        self.assertTrue(is_proxy_delivered(promised))
+
+
+    def test_proxy_call(self):
+        # calling a proxy calls its answer, with any positional and
+        # keyword arguments passed along
+
+        def work(a, b=2, *args, **kwds):
+            return (a, b, args, kwds)
+
+        P = self.lazy(lambda: work)
+        self.assertEqual(P(1), (1, 2, (), {}))
+        self.assertEqual(P(1, 3, 4, c=5), (1, 3, (4,), {"c": 5}))
+        self.assertEqual(P(*[1], **{"b": 6}), (1, 6, (), {}))
+        self.assertRaises(TypeError, lambda: P())
+
+
+    def test_proxy_special(self):
+        # special methods which are only looked for on the type
+
+        F = self.lazy(lambda: 2.675)
+        self.assertEqual(round(F), round(2.675))
+        self.assertEqual(round(F, 2), round(2.675, 2))
+        self.assertEqual(math.trunc(F), 2)
+
+        B = self.lazy(lambda: b"Hello World")
+        self.assertEqual(bytes(B), b"Hello World")
+
+
+    def test_proxy_freelist(self):
+        # dead proxies are recycled up to a limit, and come back as
+        # good as new
+
+        from promises import proxy_freelist, set_proxy_freelist
+
+        previous = set_proxy_freelist(0)
+        try:
+            set_proxy_freelist(4)
+            self.assertEqual(proxy_freelist(), (0, 4))
+
+            proxies = [self.lazy(int) for _ in range(8)]
+            deliver(proxies[0])
+            ref = weakref.ref(proxies[0])
+            del proxies[:]
+
+            self.assertEqual(proxy_freelist(), (4, 4))
+            self.assertEqual(ref(), None)
+
+            A = self.lazy(lambda: "Hello World")
+            self.assertEqual(proxy_freelist(), (3, 4))
+            self.assertFalse(is_delivered(A))
+            self.assertEqual(A, "Hello World")
+            self.assertEqual(weakref.ref(A)(), "Hello World")
+
+            set_proxy_freelist(1)
+            self.assertEqual(proxy_freelist(), (1, 1))
+
+            set_proxy_freelist(0)
+            self.assertEqual(proxy_freelist(), (0, 0))
+            del A
+            self.assertEqual(proxy_freelist(), (0, 0))
+
+            self.assertRaises(ValueError, lambda: set_proxy_freelist(-1))
+
+        finally:
+            set_proxy_freelist(previous)
+
+
     def test_proxy_obj(self):
         # transparent proxy of an object
 
         class Foo(object):
             A = 100
+
             def __init__(self):
                 self.B = 200
+
             def C(self):
                 return 300
+
             def __eq__(self, o):
-                return (self.A == o.A and
-                        self.B == o.B and
-                        self.C() == o.C())
+                return (self.A, self.B, self.C()) == (o.A, o.B, o.C())
+
             def __ne__(self, o):
                 return not self.__eq__(o)
 
@@ -326,6 +948,71 @@ class TestProxy(TestContainer):
         self.assertTrue(FB == FA)
 
 
+    def test_proxy_buffer(self):
+        # once delivered, the buffer interface passes through to an
+        # answer which has one
+
+        promised = self.lazy(lambda: b"Hello World")
+        self.assertRaises(TypeError, lambda: memoryview(promised))
+        deliver(promised)
+        self.assertEqual(memoryview(promised).tobytes(), b"Hello World")
+        self.assertEqual(struct.unpack_from("5s", promised), (b"Hello",))
+        self.assertTrue(isinstance(promised, Proxy))
+
+        # views are of the answer itself, rather than of a copy
+        data = bytearray(b"Hello World")
+        promised = self.lazy(lambda: data)
+        deliver(promised)
+        view = memoryview(promised)
+        view[0:5] = b"Howdy"
+        self.assertEqual(data, bytearray(b"Howdy World"))
+
+        # old-style buffers are presented via the new interface
+        data = array("i", [1, 2, 3])
+        promised = self.lazy(lambda: data)
+        deliver(promised)
+        self.assertEqual(struct.unpack_from("3i", promised), (1, 2, 3))
+
+        promised = self.lazy(lambda: [1, 2, 3])
+        deliver(promised)
+        self.assertRaises(TypeError, lambda: memoryview(promised))
+
+
+    def test_proxy_no_buffer(self):
+        # an answer without a buffer is treated as it would be without
+        # the proxy, rather than as a buffer which then fails
+
+        promised = self.lazy(lambda: [1, 2, 3])
+        self.assertEqual(bytearray(promised), bytearray([1, 2, 3]))
+
+        promised = self.lazy(lambda: [1, 2, 3])
+        deliver(promised)
+        self.assertEqual(bytearray(promised), bytearray([1, 2, 3]))
+
+        promised = self.lazy(lambda: 3)
+        self.assertEqual(bytearray(promised), bytearray(3))
+
+
+    def test_proxy_array_interface(self):
+        # the numpy array interface passes through to the answer
+
+        class ArrayLike(object):
+            __array_interface__ = {"shape": (3,), "typestr": "<i4",
+                                   "data": (0, True), "version": 3}
+
+            def __array__(self, dtype=None):
+                return ("array", dtype)
+
+        promised = self.lazy(ArrayLike)
+        self.assertEqual(promised.__array_interface__,
+                         ArrayLike.__array_interface__)
+
+        # lookups against the type, as well as against the instance
+        self.assertEqual(promised.__array__(), ("array", None))
+        self.assertEqual(type(promised).__array__(promised, "i4"),
+                         ("array", "i4"))
+
+
     def test_repr(self):
         promised = self.lazy(lambda: 5)
         self.assertEqual("<promises.Proxy undelivered>",
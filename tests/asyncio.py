@@ -0,0 +1,229 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Unit-tests for python-promises asyncio support
+
+author: Christopher O'Brien  <obriencj@gmail.com>
+license: LGPL v.3
+"""
+
+
+from __future__ import absolute_import
+
+from promises import PromiseCancelled, deliver, is_delivered
+from promises import lazy, lazy_proxy, promise, promise_proxy
+from promises.multiprocess import ProcessExecutor, ProxyProcessExecutor
+from promises.multithread import ThreadExecutor, ProxyThreadExecutor
+from sys import version_info
+from threading import Thread
+from time import sleep
+from unittest import TestCase, skipIf
+
+from .multiprocess import TacoException, fail_load, slow_load, work_load
+
+try:
+    import asyncio
+    from promises.asyncio import AsyncioExecutor, ProxyAsyncioExecutor
+    from promises.asyncio import awaitable
+except ImportError:
+    asyncio = None
+
+
+# coroutine functions to drive the tests with. Their syntax would be
+# an error before Python 3.5, so they're compiled from a string
+awaiting = calling = None
+if version_info >= (3, 5):
+    _coroutines = {}
+    exec("""async def awaiting(promised):
+    return await promised
+
+async def calling(func):
+    return func()
+""", _coroutines)
+    awaiting = _coroutines["awaiting"]
+    calling = _coroutines["calling"]
+
+
+def later(setter, value):
+    def set_later():
+        sleep(0.05)
+        setter(value)
+
+    t = Thread(target=set_later)
+    t.start()
+    return t
+
+
+@skipIf(asyncio is None or version_info < (3, 5), "needs async and await")
+class TestAwaitable(TestCase):
+
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+
+    def tearDown(self):
+        self.loop.close()
+
+
+    def run_loop(self, work):
+        return self.loop.run_until_complete(work)
+
+
+    def test_promise(self):
+        for create in (promise, promise_proxy):
+            promised, setter, _seterr = create(blocking=True)
+            t = later(setter, 5)
+
+            self.assertEqual(self.run_loop(awaiting(promised)), 5)
+            self.assertEqual(deliver(promised), 5)
+            t.join()
+
+            # awaiting an already delivered promise
+            self.assertEqual(self.run_loop(awaiting(promised)), 5)
+
+
+    def test_lazy(self):
+        self.assertEqual(self.run_loop(awaiting(lazy(work_load, 1))), 2)
+        self.assertEqual(self.run_loop(awaiting(lazy_proxy(work_load, 1))),
+                         2)
+
+        self.assertRaises(TacoException, self.run_loop,
+                          awaiting(lazy(fail_load, 1)))
+
+
+    def test_executors(self):
+        for create in (ThreadExecutor, ProxyThreadExecutor,
+                       ProcessExecutor, ProxyProcessExecutor):
+            ex = create(processes=2)
+            values = [ex.future(slow_load, x) for x in range(0, 10)]
+
+            # gather wants futures, rather than proxies
+            found = self.run_loop(asyncio.gather(
+                *[awaitable(v, self.loop) for v in values]))
+            self.assertEqual(found, list(range(1, 11)))
+
+            failed = ex.future(fail_load, 1)
+            self.assertRaises(TacoException, self.run_loop,
+                              awaiting(failed))
+
+            # having been awaited doesn't leave it blocking
+            self.assertRaises(TacoException, deliver, failed)
+            ex.deliver()
+
+
+    def test_batched(self):
+        # the batch is held back until somebody waits on it
+        ex = ProcessExecutor(processes=2, batch_size=10, linger=None)
+        values = [ex.future(work_load, x) for x in range(0, 5)]
+        self.assertEqual(self.run_loop(awaiting(values[0])), 1)
+        ex.deliver()
+
+
+@skipIf(asyncio is None or version_info < (3, 5), "needs async and await")
+class TestAsyncioExecutor(TestCase):
+
+
+    def executor(self, **kwds):
+        return AsyncioExecutor(**kwds)
+
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+
+    def tearDown(self):
+        self.loop.close()
+
+
+    def run_loop(self, work):
+        return self.loop.run_until_complete(work)
+
+
+    def test_coroutine(self):
+        ex = self.executor(loop=self.loop)
+        values = [ex.future(asyncio.sleep, 0.01, x) for x in range(0, 10)]
+
+        self.assertEqual([self.run_loop(awaiting(v)) for v in values],
+                         list(range(0, 10)))
+        self.assertTrue(all(is_delivered(v) for v in values))
+
+
+    def test_function(self):
+        ex = self.executor(loop=self.loop)
+        values = ex.map(slow_load, range(0, 10))
+
+        self.run_loop(ex.completed())
+        self.assertTrue(all(is_delivered(v) for v in values))
+        self.assertEqual([deliver(v) for v in values], list(range(1, 11)))
+
+
+    def test_raises(self):
+        ex = self.executor(loop=self.loop)
+        failed = ex.future(fail_load, 1)
+
+        self.assertRaises(TacoException, self.run_loop, awaiting(failed))
+        self.assertRaises(TacoException, deliver, failed)
+
+
+    def test_other_thread(self):
+        ex = self.executor(loop=self.loop)
+
+        t = Thread(target=self.loop.run_forever)
+        t.start()
+        try:
+            # with the loop running elsewhere, this is an executor like
+            # any other
+            with ex:
+                values = [ex.future(asyncio.sleep, 0.01, x)
+                          for x in range(0, 10)]
+                values.extend(ex.map(work_load, range(0, 10)))
+
+            self.assertEqual([deliver(v) for v in values],
+                             list(range(0, 10)) + list(range(1, 11)))
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            t.join()
+
+
+    def test_flush_in_loop(self):
+        ex = self.executor(loop=self.loop)
+        value = ex.future(asyncio.sleep, 0.01, 1)
+
+        self.assertRaises(RuntimeError, self.run_loop, calling(ex.flush))
+        self.assertEqual(self.run_loop(awaiting(value)), 1)
+
+
+    def test_terminate(self):
+        ex = self.executor(loop=self.loop)
+        value = ex.future(asyncio.sleep, 10, 1)
+
+        # give it the chance to start
+        self.run_loop(asyncio.sleep(0.01))
+
+        ex.terminate()
+        self.assertRaises(PromiseCancelled, deliver, value)
+        self.assertRaises(PromiseCancelled, self.run_loop, awaiting(value))
+
+
+class TestProxyAsyncioExecutor(TestAsyncioExecutor):
+
+    def executor(self, **kwds):
+        return ProxyAsyncioExecutor(**kwds)
+
+
+#
+# The end.
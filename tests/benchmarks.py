@@ -0,0 +1,107 @@
+# This library is free software; you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as
+# published by the Free Software Foundation; either version 3 of the
+# License, or (at your option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public
+# License along with this library; if not, see
+# <http://www.gnu.org/licenses/>.
+
+
+"""
+Unit-tests for the python-promises benchmark suites. These only check
+that every case still runs, not how quickly.
+
+:author: Christopher O'Brien  <obriencj@gmail.com>
+:license: LGPL v.3
+"""
+
+
+from __future__ import absolute_import
+
+import json
+
+from benchmarks import compare_results, run_cases, save_results
+from benchmarks.executor import EXECUTORS, run_executor, run_scenario
+from benchmarks.proxy import cases
+from unittest import TestCase
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class TestProxyBenchmarks(TestCase):
+
+
+    def test_cases(self):
+        found = cases()
+        names = [name for name, _stmt, _setup in found]
+        self.assertEqual(len(names), len(set(names)))
+
+        results = run_cases(found, repeat=1, min_time=0)
+        self.assertEqual(sorted(results), sorted(names))
+
+        for result in results.values():
+            self.assertTrue(result["best"] <= result["median"])
+            self.assertEqual(result["repeat"], 1)
+
+
+    def test_results(self):
+        results = run_cases(cases(), repeat=1, min_time=0, match="deliver")
+        self.assertTrue(results)
+        self.assertTrue(all("deliver" in name for name in results))
+
+        stream = StringIO()
+        save_results("proxy", results, stream)
+        old = json.loads(stream.getvalue())
+        self.assertEqual(old["suite"], "proxy")
+        self.assertTrue("python" in old["environment"])
+
+        # a single loop may be too quick to register, so give the
+        # comparison something it can work with
+        for result in old["results"].values():
+            result["best"] = 100.0
+
+        new = json.loads(json.dumps(old))
+        name = sorted(results)[0]
+        new["results"][name]["best"] = 200.0
+
+        rows = compare_results(old, new, threshold=0.5)
+        self.assertEqual(len(rows), len(results))
+        self.assertEqual([row[0] for row in rows if row[4]], [name])
+
+
+
+class TestExecutorBenchmarks(TestCase):
+
+
+    def check_result(self, result, tasks):
+        self.assertEqual(result["tasks"], tasks)
+        self.assertTrue(result["futures_per_sec"] > 0)
+        self.assertTrue(result["best"] <= result["median"])
+
+        latency = result["latency_ms"]
+        self.assertTrue(0 <= latency["p50"] <= latency["p99"])
+        self.assertTrue(latency["p99"] <= latency["max"])
+
+
+    def test_executors(self):
+        for name in sorted(EXECUTORS):
+            result = run_executor(name, 8, payload=16, workers=2, repeat=1)
+            self.check_result(result, 8)
+
+
+    def test_scenario(self):
+        result = run_scenario("ThreadExecutor", 8, workers=2, repeat=1)
+        self.check_result(result, 8)
+
+
+#
+# The end.
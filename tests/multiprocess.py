@@ -21,8 +21,25 @@ license: LGPL v.3
 """
 
 
-from promises import is_promise, is_delivered, deliver
+import gc
+import pickle
+
+from array import array
+from ctypes import Array, c_int
+from glob import glob
+from promises import is_promise, is_delivered, deliver, as_completed
+from promises import PromiseCancelled, lazy_proxy
+from multiprocessing.pool import Pool
 from promises.multiprocess import ProcessExecutor, ProxyProcessExecutor
+from promises.multiprocess import ExecutorFull, _MAP_DIR
+from promises.multiprocess import _MAX_SHARED_CACHE, _shared_cache
+from os import close
+from tempfile import gettempdir, mkstemp
+from functools import partial
+from itertools import count, islice
+from sys import version_info
+from threading import Lock, Thread
+from time import sleep
 from unittest import TestCase
 
 
@@ -31,11 +48,86 @@ def work_load(x):
     return x + 1
 
 
+def slow_load(x):
+    sleep(0.01)
+    return x + 1
+
+
+# only those which run in this process will be found here
+performed = []
+
+
+def counted_load(x):
+    sleep(0.01)
+    performed.append(x)
+    return x + 1
+
+
+def bytes_load(x):
+    return b"x" * x
+
+
+def array_load(x):
+    return array("d", range(0, x))
+
+
+class IntArray(Array):
+    _type_ = c_int
+    _length_ = 1000
+
+
+def ctypes_load(x):
+    return IntArray(*range(x, x + 1000))
+
+
+def lookup_load(table, x):
+    return table[x] + 1
+
+
 def fail_load(x):
     #print "fail_load raising"
     raise TacoException("failed on %i" % x)
 
 
+def slow_fail_load(x):
+    sleep(0.1)
+    raise TacoException("failed on %i" % x)
+
+
+def fail_or_load(x):
+    if x % 7:
+        return x + 1
+    else:
+        raise TacoException("failed on %i" % x)
+
+
+# how many times a Scaler has been unpickled in this process
+unpickled = [0]
+
+
+class Scaler(object):
+
+    def __init__(self, factor):
+        self.factor = factor
+
+
+    def __getstate__(self):
+        return self.factor
+
+
+    def __setstate__(self, state):
+        unpickled[0] += 1
+        self.factor = state
+
+
+    def __call__(self, x):
+        return (x * self.factor, unpickled[0])
+
+
+    def scale(self, x):
+        return (x * self.factor, unpickled[0])
+
+
 class TacoException(Exception):
     pass
 
@@ -43,8 +135,12 @@ class TacoException(Exception):
 class TestProcessExecutor(TestCase):
 
 
-    def executor(self):
-        return ProcessExecutor()
+    def executor(self, **kwds):
+        return ProcessExecutor(**kwds)
+
+
+    def pool(self):
+        return Pool(2)
 
 
     def test_managed(self):
@@ -53,7 +149,7 @@ class TestProcessExecutor(TestCase):
             self.assertTrue(is_promise(a))
 
             # generate some minor workload, enough to engage a queue
-            values = [ex.future(work_load, x) for x in xrange(0, 999)]
+            values = [ex.future(work_load, x) for x in range(0, 999)]
 
             b = ex.future(work_load, -101)
             self.assertFalse(is_delivered(b))
@@ -71,14 +167,14 @@ class TestProcessExecutor(TestCase):
         self.assertEqual(deliver(b), -100)
 
         self.assertEqual([deliver(v) for v in values],
-                         list(xrange(1, 1000)))
+                         list(range(1, 1000)))
 
 
     def test_blocking(self):
         ex = self.executor()
 
         # generate some minor workload, enough to engage a queue
-        values = [ex.future(work_load, x) for x in xrange(0, 999)]
+        values = [ex.future(work_load, x) for x in range(0, 999)]
 
         b = ex.future(work_load, -101)
         self.assertFalse(is_delivered(b))
@@ -91,23 +187,650 @@ class TestProcessExecutor(TestCase):
     def test_terminate(self):
         ex = self.executor()
 
-        # generate some minor workload, enough to engage a queue
-        values = [ex.future(work_load, x) for x in xrange(0, 999)]
+        # generate a workload slow enough that the pool cannot drain
+        # the queue before we terminate it
+        values = [ex.future(slow_load, x) for x in range(0, 999)]
 
         b = ex.future(work_load, -101)
         self.assertFalse(is_delivered(b))
 
+        # someone already waiting on a promise is let go too
+        raised = []
+
+        def deliver_b():
+            try:
+                deliver(b)
+            except PromiseCancelled:
+                raised.append(True)
+        thread = Thread(target=deliver_b)
+        thread.start()
+
         ex.terminate()
+        thread.join()
+
         self.assertFalse(is_delivered(b))
+        self.assertEqual(raised, [True])
+        self.assertRaises(PromiseCancelled, lambda: deliver(b))
 
-        #self.assertTrue(ex.is_delivered())
+        # anything which did finish remains delivered
+        for index, value in enumerate(values):
+            if is_delivered(value):
+                self.assertEqual(deliver(value), index + 1)
+
+        # and flushing has nothing left to wait on
+        ex.flush()
+
+
+    def test_flush(self):
+        ex = self.executor()
+
+        values = [ex.future(work_load, x) for x in range(0, 999)]
+        pool = ex._get_pool()
+
+        ex.flush()
+        self.assertTrue(all(is_delivered(v) for v in values))
+        self.assertEqual([deliver(v) for v in values], list(range(1, 1000)))
+
+        # the pool is still there, and still working
+        self.assertTrue(ex._get_pool() is pool)
+        values = [ex.future(work_load, x) for x in range(0, 10)]
+        ex.flush()
+        self.assertEqual([deliver(v) for v in values], list(range(1, 11)))
+
+        # failures are waited for too
+        b = ex.future(fail_load, -101)
+        ex.flush()
+        self.assertRaises(TacoException, lambda: deliver(b))
+
+        # flushing with nothing outstanding doesn't block
+        ex.flush()
+        ex.deliver()
+        ex.flush()
+
+
+    def test_map(self):
+        ex = self.executor(processes=2)
+
+        values = ex.map(work_load, range(0, 999), chunksize=10)
+        self.assertEqual(len(values), 999)
+        self.assertTrue(all(is_promise(v) for v in values))
+        self.assertEqual([deliver(v) for v in values], list(range(1, 1000)))
+
+        # the default chunksize, and items which fail on their own
+        # without spoiling the rest of their chunk
+        values = ex.map(fail_or_load, range(0, 100))
+        for index, value in enumerate(values):
+            if index % 7:
+                self.assertEqual(deliver(value), index + 1)
+            else:
+                self.assertRaises(TacoException, lambda: deliver(value))
+
+        self.assertEqual(ex.map(work_load, []), [])
+
+        ex.deliver()
+
+
+    def test_batching(self):
+        ex = self.executor(processes=2, batch_size=10, linger=None)
+
+        # two full batches are sent, the rest waits to fill
+        values = [ex.future(work_load, x) for x in range(0, 25)]
+        self.assertEqual(len(ex._batch.receivers), 5)
+        self.assertTrue(len(ex._unfinished) <= 2)
+
+        # until someone needs one of them
+        self.assertEqual(deliver(values[-1]), 25)
+        self.assertEqual([deliver(v) for v in values], list(range(1, 26)))
+
+        # a change of work or keywords sends the batch along, and
+        # failures stay with the call which raised them
+        values = [ex.future(fail_or_load, x) for x in range(0, 20)]
+        other = ex.future(work_load, 100)
+        ex.flush()
+        self.assertEqual(deliver(other), 101)
+        for index, value in enumerate(values):
+            if index % 7:
+                self.assertEqual(deliver(value), index + 1)
+            else:
+                self.assertRaises(TacoException, lambda: deliver(value))
+
+        ex.deliver()
+
+        # keywords are told apart by identity, never by delivering them
+        first = lazy_proxy(dict, [(1, 10)])
+        second = lazy_proxy(dict, [(1, 20)])
+        values = [ex.future(lookup_load, table=first, x=1),
+                  ex.future(lookup_load, table=second, x=1)]
+        self.assertFalse(is_delivered(second))
+        self.assertEqual([deliver(v) for v in values], [11, 21])
+
+        ex.deliver()
+
+        # a batch which doesn't fill is sent after lingering, each by
+        # the same flusher thread
+        ex = self.executor(processes=2, batch_size=10, linger=0.01)
+        values = [ex.future(work_load, x) for x in range(0, 3)]
+        flusher = ex._flusher
+        values.append(ex.future(fail_or_load, 1))
+        self.assertTrue(ex._flusher is flusher)
+        for _ in range(500):
+            if all(is_delivered(v) for v in values):
+                break
+            sleep(0.01)
+        self.assertTrue(all(is_delivered(v) for v in values))
+
+        ex.deliver()
+
+
+    def test_max_pending(self):
+        ex = self.executor(processes=2, max_pending=5)
+
+        values = []
+        for x in range(0, 50):
+            values.append(ex.future(slow_load, x))
+            self.assertTrue(ex._pending <= 5)
+        self.assertEqual([deliver(v) for v in values], list(range(1, 51)))
+
+        values = ex.map(work_load, range(0, 100))
+        self.assertEqual([deliver(v) for v in values], list(range(1, 101)))
+        ex.deliver()
+
+        # once full, further work is done by the caller
+        ex = self.executor(processes=2, max_pending=2, on_full="inline")
+        values = [ex.future(slow_load, x) for x in range(0, 20)]
+        self.assertTrue(ex._pending <= 2)
+        self.assertTrue(is_delivered(values[2]))
+        self.assertEqual([deliver(v) for v in values], list(range(1, 21)))
+
+        b = ex.future(fail_load, -101)
+        self.assertRaises(TacoException, lambda: deliver(b))
+        ex.deliver()
+
+        # or refused
+        ex = self.executor(processes=2, max_pending=1, on_full="raise")
+        a = ex.future(slow_load, 1)
+        self.assertRaises(ExecutorFull, ex.future, slow_load, 2)
+        self.assertEqual(deliver(a), 2)
+        ex.flush()
+        self.assertEqual(deliver(ex.future(slow_load, 2)), 3)
+        ex.deliver()
+
+        # a full executor still sends along its open batch
+        ex = self.executor(processes=2, max_pending=10,
+                           batch_size=20, linger=None)
+        values = [ex.future(work_load, x) for x in range(0, 30)]
+        self.assertEqual([deliver(v) for v in values], list(range(1, 31)))
+        ex.deliver()
+
+        self.assertRaises(ValueError, self.executor, on_full="explode")
+
+
+    def test_imap(self):
+        ex = self.executor(processes=2)
+
+        values = ex.imap(work_load, range(0, 100), window=4)
+        self.assertEqual([deliver(v) for v in values], list(range(1, 101)))
+
+        # an unending iterator is only consumed a window ahead
+        taken = []
+
+        def items():
+            for x in count():
+                taken.append(x)
+                yield x
+
+        values = ex.imap(work_load, items(), window=4)
+        first = [deliver(v) for v in islice(values, 10)]
+        self.assertEqual(first, list(range(1, 11)))
+        self.assertTrue(len(taken) <= 10 + 4)
+
+        values = ex.imap(fail_or_load, range(0, 20), window=3)
+        for index, value in enumerate(values):
+            if index % 7:
+                self.assertEqual(deliver(value), index + 1)
+            else:
+                self.assertRaises(TacoException, lambda: deliver(value))
+
+        ex.deliver()
+
+
+    def test_imap_unordered(self):
+        ex = self.executor(processes=2, batch_size=3, linger=None)
+
+        values = ex.imap_unordered(work_load, range(0, 100), window=5)
+        found = []
+        for value in values:
+            self.assertTrue(is_delivered(value))
+            found.append(deliver(value))
+        self.assertEqual(sorted(found), list(range(1, 101)))
+
+        taken = []
+
+        def items():
+            for x in count():
+                taken.append(x)
+                yield x
+
+        values = ex.imap_unordered(work_load, items(), window=4)
+        self.assertEqual(len(list(islice(values, 10))), 10)
+        self.assertTrue(len(taken) <= 10 + 4)
+
+        failed = 0
+        for value in ex.imap_unordered(fail_or_load, range(0, 20)):
+            try:
+                deliver(value)
+            except TacoException:
+                failed += 1
+        self.assertEqual(failed, 3)
+
+        ex.deliver()
+
+
+    def test_as_completed(self):
+        # even promises held in an open batch will complete
+        ex = self.executor(processes=2, batch_size=100, linger=None)
+
+        values = [ex.future(work_load, x) for x in range(0, 10)]
+        found = [deliver(v) for v in as_completed(values)]
+        self.assertEqual(sorted(found), list(range(1, 11)))
+
+        ex.deliver()
+
+
+    def test_deliver_inline(self):
+        ex = self.executor(processes=2, deliver_inline=True)
+        del performed[:]
+
+        values = [ex.future(counted_load, x) for x in range(0, 100)]
+
+        # the last is still being held, so delivering it performs it
+        # right here rather than waiting on the 99 ahead of it
+        self.assertEqual(deliver(values[-1]), 100)
+        self.assertTrue(99 in performed)
+        self.assertFalse(all(is_delivered(v) for v in values[:-1]))
+
+        ex.flush()
+        self.assertEqual([deliver(v) for v in values], list(range(1, 101)))
+
+        # nothing was performed twice
+        self.assertEqual(len(performed), len(set(performed)))
+
+        # nor does delivering work that already reached the pool
+        a = ex.future(work_load, 1)
+        ex.flush()
+        self.assertEqual(deliver(a), 2)
+
+        b = ex.future(fail_load, -101)
+        self.assertRaises(TacoException, lambda: deliver(b))
+
+        ex.deliver()
+
+
+    def test_cancel(self):
+        ex = self.executor(processes=2, deliver_inline=True)
+
+        values = [ex.future(slow_load, x) for x in range(0, 50)]
+        self.assertTrue(ex.cancel(values[-1]))
+        self.assertRaises(PromiseCancelled, lambda: deliver(values[-1]))
+
+        # only once, and never once it has been handed to the pool
+        self.assertFalse(ex.cancel(values[-1]))
+        self.assertFalse(ex.cancel(values[0]))
+
+        ex.flush()
+        self.assertEqual([deliver(v) for v in values[:-1]],
+                         list(range(1, 50)))
+        self.assertFalse(ex.cancel(values[0]))
+
+        # a call can be taken out of an open batch, or a map chunk
+        ex = self.executor(processes=2, batch_size=10, linger=None)
+        values = [ex.future(work_load, x) for x in range(0, 5)]
+        self.assertTrue(ex.cancel(values[2]))
+        ex.flush()
+        for index, value in enumerate(values):
+            if index == 2:
+                self.assertRaises(PromiseCancelled, lambda: deliver(value))
+            else:
+                self.assertEqual(deliver(value), index + 1)
+        ex.deliver()
+
+
+    def test_dedup(self):
+        ex = self.executor(processes=2, dedup=True)
+
+        # identical calls in flight at the same time share one task
+        values = [ex.future(slow_load, 1) for _ in range(0, 10)]
+        other = ex.future(slow_load, 2)
+        self.assertEqual(len(ex._unfinished), 2)
+
+        self.assertEqual([deliver(v) for v in values], [2] * 10)
+        self.assertEqual(deliver(other), 3)
+
+        # but once it has landed, the same call is new work
+        ex.flush()
+        again = ex.future(slow_load, 1)
+        self.assertEqual(len(ex._unfinished), 1)
+        self.assertEqual(deliver(again), 2)
+
+        # failures are shared too
+        values = [ex.future(fail_load, 3) for _ in range(0, 3)]
+        for value in values:
+            self.assertRaises(TacoException, lambda: deliver(value))
+
+        # equal arguments of different types are different calls
+        values = [ex.future(repr, x) for x in (1, True, 1.0)]
+        self.assertEqual([deliver(v) for v in values], ["1", "True", "1.0"])
+
+        # and calls with unhashable arguments are simply performed
+        values = [ex.future(sum, [1, 2, 3]) for _ in range(0, 3)]
+        self.assertEqual(ex._flights, {})
+        self.assertEqual([deliver(v) for v in values], [6] * 3)
+        ex.deliver()
+
+        # unless they're given a key of their own
+        def key(work, args, kwds):
+            return (work, tuple(args[0]))
+
+        ex = self.executor(processes=2, dedup=key)
+        values = [ex.future(sum, [1, 2, 3]) for _ in range(0, 5)]
+        self.assertEqual([deliver(v) for v in values], [6] * 5)
+        ex.deliver()
+
+        # work which others are following isn't cancelled from under
+        # them, though it can be once nobody is
+        ex = self.executor(processes=2, dedup=True, batch_size=10,
+                           linger=None)
+        leader = ex.future(work_load, 1)
+        follower = ex.future(work_load, 1)
+        self.assertFalse(ex.cancel(follower))
+        self.assertFalse(ex.cancel(leader))
+        self.assertEqual(deliver(follower), 2)
+        self.assertEqual(deliver(leader), 2)
+
+        alone = ex.future(work_load, 2)
+        self.assertTrue(ex.cancel(alone))
+        self.assertRaises(PromiseCancelled, lambda: deliver(alone))
+        self.assertEqual(deliver(ex.future(work_load, 2)), 3)
+        ex.deliver()
+
+
+    def test_mmap_threshold(self):
+        pattern = "%s/promises-*" % (_MAP_DIR or gettempdir())
+        existing = set(glob(pattern))
+
+        ex = self.executor(processes=2, mmap_threshold=1024)
+        mapped = ex._out_of_process
+
+        small = ex.future(bytes_load, 10)
+        large = ex.future(bytes_load, 100000)
+        typed = ex.future(array_load, 1000)
+        failed = ex.future(fail_load, 1)
+        ex.flush()
+
+        self.assertEqual(deliver(small), b"x" * 10)
+
+        self.assertEqual(len(deliver(large)), 100000)
+        self.assertEqual(deliver(large)[:], b"x" * 100000)
+        if mapped:
+            self.assertFalse(isinstance(deliver(large), bytes))
+
+        if mapped and version_info[0] >= 3:
+            view = deliver(typed)
+            self.assertTrue(isinstance(view, memoryview))
+            self.assertTrue(view.readonly)
+            self.assertEqual(view.format, "d")
+            self.assertEqual(view.tolist(), list(map(float, range(0, 1000))))
+        elif not mapped:
+            self.assertEqual(deliver(typed), array_load(1000))
+
+        self.assertRaises(TacoException, lambda: deliver(failed))
+
+        # ctypes says what byte order its ints are in, which a view
+        # can't be cast back to, so they're pickled as usual
+        typed = ex.future(ctypes_load, 5)
+        self.assertEqual(list(deliver(typed)), list(range(5, 1005)))
+        self.assertEqual(deliver(ex.future(work_load, 1)), 2)
+
+        # nothing is left behind in the filesystem
+        self.assertEqual(set(glob(pattern)) - existing, set())
+
+        ex.deliver()
+
+
+    def test_file_cleanup(self):
+        pattern = "%s/promises-*" % (_MAP_DIR or gettempdir())
+        existing = set(glob(pattern))
+
+        def strand(ex):
+            # as if a worker were stopped before its result came back
+            if ex._map_prefix is not None:
+                fd, _path = mkstemp(prefix=ex._map_prefix, dir=_MAP_DIR)
+                close(fd)
+
+        # terminating removes whatever was left behind
+        ex = self.executor(processes=1, mmap_threshold=1024)
+        ex.share(list(range(0, 10)))
+        self.assertEqual(deliver(ex.future(work_load, 1)), 2)
+        strand(ex)
+        ex.terminate()
+        self.assertEqual(set(glob(pattern)) - existing, set())
+
+        if version_info[0] >= 3:
+            # as does dropping the executor, which under Python 2 is
+            # only done at exit
+            ex = self.executor(processes=1, mmap_threshold=1024)
+            ex.share(list(range(0, 10)))
+            strand(ex)
+            del ex
+            gc.collect()
+            self.assertEqual(set(glob(pattern)) - existing, set())
+
+
+    def test_share(self):
+        pattern = "%s/promises-shared-*" % (_MAP_DIR or gettempdir())
+        existing = set(glob(pattern))
+
+        ex = self.executor(processes=2)
+
+        table = dict((x, x * 2) for x in range(0, 10000))
+        handle = ex.share(table)
+
+        # the handle travels light, however large what it shares
+        self.assertTrue(len(pickle.dumps(handle)) < 200)
+
+        values = [ex.future(lookup_load, handle, x) for x in range(0, 100)]
+        self.assertEqual([deliver(v) for v in values],
+                         [x * 2 + 1 for x in range(0, 100)])
+
+        value = ex.future(lookup_load, x=5, table=handle)
+        self.assertEqual(deliver(value), 11)
+
+        values = ex.map(partial(lookup_load, handle), range(0, 100))
+        self.assertEqual([deliver(v) for v in values],
+                         [x * 2 + 1 for x in range(0, 100)])
+
+        ex.deliver()
+        self.assertEqual(set(glob(pattern)) - existing, set())
+
+        ex = self.executor(processes=2)
+        handle = ex.share(table)
+        self.assertEqual(deliver(ex.future(lookup_load, handle, 1)), 3)
+        ex.flush()
+        ex.unshare(handle)
+        self.assertEqual(set(glob(pattern)) - existing, set())
+
+        # work may be shared too
+        handle = ex.share(Scaler(3))
+        self.assertEqual(deliver(ex.future(handle, 2))[0], 6)
+        ex.deliver()
+
+
+    def test_shared_cache(self):
+        # a worker's view of a handle, loading what it shares from file
+        ex = ProcessExecutor()
+        first = pickle.loads(pickle.dumps(ex.share([1])))
+        second = pickle.loads(pickle.dumps(ex.share([2])))
+
+        self.assertEqual(first.resolve(), [1])
+        self.assertTrue(first.key in _shared_cache)
+
+        # once unshared, it is dropped to make room for the next
+        ex.unshare(first)
+        self.assertEqual(second.resolve(), [2])
+        self.assertFalse(first.key in _shared_cache)
+
+        # and there is only ever so much room
+        handles = [pickle.loads(pickle.dumps(ex.share(x)))
+                   for x in range(0, _MAX_SHARED_CACHE + 1)]
+        for x, handle in enumerate(handles):
+            self.assertEqual(handle.resolve(), x)
+        self.assertEqual(len(_shared_cache), _MAX_SHARED_CACHE)
+        self.assertFalse(second.key in _shared_cache)
+
+        ex.deliver()
+
+
+    def test_work_registry(self):
+        pattern = "%s/promises-shared-*" % (_MAP_DIR or gettempdir())
+        existing = set(glob(pattern))
+
+        # without asking for it, work is pickled with every call, and
+        # so changes to it are seen
+        ex = self.executor(processes=1)
+        scaler = Scaler(2)
+        self.assertEqual(deliver(ex.future(scaler, 1))[0], 2)
+        scaler.factor = 4
+        self.assertEqual(deliver(ex.future(scaler, 1))[0], 4)
+        self.assertEqual(ex._works, {})
+        ex.deliver()
+
+        # a single worker, so that every call lands in the same place
+        ex = self.executor(processes=1, register_work=True)
+
+        scaler = Scaler(3)
+        values = [ex.future(scaler, x) for x in range(0, 20)]
+        results = [deliver(v) for v in values]
+        self.assertEqual([r[0] for r in results],
+                         [x * 3 for x in range(0, 20)])
+
+        # the worker only ever had to unpickle it the once
+        self.assertTrue(max(r[1] for r in results) <= 1)
+
+        if version_info[0] >= 3:
+            # each bound method is a new object, but an equal one.
+            # Python 2 can't pickle them at all
+            values = [ex.future(scaler.scale, x) for x in range(0, 20)]
+            results = [deliver(v) for v in values]
+            self.assertEqual([r[0] for r in results],
+                             [x * 3 for x in range(0, 20)])
+            self.assertTrue(max(r[1] for r in results) <= 2)
+
+        values = ex.map(partial(lookup_load, {1: 1}), [1] * 20)
+        self.assertEqual([deliver(v) for v in values], [2] * 20)
+
+        # work which was already shared is left as it is
+        handle = ex.share(partial(work_load, 10))
+        self.assertEqual(deliver(ex.future(handle)), 11)
+
+        # plain functions already travel by name
+        self.assertEqual(deliver(ex.future(work_load, 1)), 2)
+        self.assertFalse(work_load in ex._works)
+
+        ex.deliver()
+        self.assertEqual(ex._works, {})
+        self.assertEqual(set(glob(pattern)) - existing, set())
+
+        # a new pool starts the registry afresh
+        values = [ex.future(scaler, x) for x in range(0, 5)]
+        self.assertEqual([deliver(v)[0] for v in values],
+                         [x * 3 for x in range(0, 5)])
+        ex.deliver()
+
+
+    def test_wait_backend(self):
+        made = []
+
+        def counted_lock():
+            made.append(None)
+            return Lock()
+
+        ex = self.executor(wait_backend=counted_lock)
+        values = [ex.future(work_load, x) for x in range(0, 10)]
+        self.assertEqual(len(made), 10)
+        self.assertEqual([deliver(v) for v in values], list(range(1, 11)))
+        ex.deliver()
+
+        self.assertRaises(ValueError, self.executor, wait_backend="pigeon")
+
+
+    def test_shared_pool(self):
+        pool = self.pool()
+        try:
+            with self.executor(pool=pool) as ex1:
+                with self.executor(pool=pool) as ex2:
+                    a = ex1.future(work_load, 1)
+                    b = ex2.future(work_load, 2)
+
+                self.assertEqual(deliver(b), 3)
+
+                # leaving the managed interface of ex2 didn't stop the
+                # pool ex1 is using
+                c = ex1.future(work_load, 3)
+
+            self.assertEqual(deliver(a), 2)
+            self.assertEqual(deliver(c), 4)
+
+            # nor will terminating an executor stop a shared pool
+            ex3 = self.executor(pool=pool)
+            ex3.terminate()
+            d = ex3.future(work_load, 4)
+            self.assertEqual(deliver(d), 5)
+
+            # what an executor shared is removed once it's delivered,
+            # even though the pool carries on
+            pattern = "%s/promises-shared-*" % (_MAP_DIR or gettempdir())
+            existing = set(glob(pattern))
+
+            ex4 = self.executor(pool=pool)
+            handle = ex4.share({1: 10})
+            e = ex4.future(lookup_load, handle, 1)
+            ex4.deliver()
+            self.assertEqual(deliver(e), 11)
+            self.assertEqual(set(glob(pattern)) - existing, set())
+
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+    def test_raises_threads(self):
+        ex = self.executor()
+        b = ex.future(slow_fail_load, 1)
+
+        # every thread delivering on a failed future sees it fail
+        raised = []
+
+        def deliver_b():
+            try:
+                deliver(b)
+            except TacoException:
+                raised.append(TacoException)
+
+        threads = [Thread(target=deliver_b) for _ in range(0, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(raised, [TacoException] * 2)
+
+        ex.deliver()
 
 
     def test_raises(self):
         ex = self.executor()
 
         # generate some minor workload, enough to engage a queue
-        values = [ex.future(work_load, x) for x in xrange(0, 999)]
+        values = [ex.future(work_load, x) for x in range(0, 999)]
 
         b = ex.future(fail_load, -101)
 
@@ -119,8 +842,8 @@ class TestProcessExecutor(TestCase):
 
 class TestProxyProcessExecutor(TestProcessExecutor):
 
-    def executor(self):
-        return ProxyProcessExecutor()
+    def executor(self, **kwds):
+        return ProxyProcessExecutor(**kwds)
 
 
 #
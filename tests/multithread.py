@@ -21,6 +21,7 @@ Unit-tests for python-promises multithreading support
 """
 
 
+from multiprocessing.pool import ThreadPool
 from promises.multithread import ThreadExecutor, ProxyThreadExecutor
 from .multiprocess import TestProcessExecutor
 
@@ -30,18 +31,22 @@ class TestThreadExecutor(TestProcessExecutor):
     Create promises which will deliver in a separate thread.
     """
 
-    def executor(self):
-        return ThreadExecutor()
+    def executor(self, **kwds):
+        return ThreadExecutor(**kwds)
 
 
-class TestProxyThreadExecutor(TestProcessExecutor):
+    def pool(self):
+        return ThreadPool(2)
+
+
+class TestProxyThreadExecutor(TestThreadExecutor):
     """
     Create transparent proxy promises which will deliver in a separate
     thread.
     """
 
-    def executor(self):
-        return ProxyThreadExecutor()
+    def executor(self, **kwds):
+        return ProxyThreadExecutor(**kwds)
 
 
 #
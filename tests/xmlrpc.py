@@ -27,13 +27,18 @@ from promises import *
 from promises.xmlrpc import *
 from threading import Thread
 from unittest import TestCase
-from xmlrpclib import ServerProxy
-from SimpleXMLRPCServer import SimpleXMLRPCServer
+
+try:
+    from xmlrpclib import ServerProxy
+    from SimpleXMLRPCServer import SimpleXMLRPCServer
+except ImportError:
+    from xmlrpc.client import ServerProxy
+    from xmlrpc.server import SimpleXMLRPCServer
 
 
 class Dummy(object):
     def __init__(self):
-        self.data = list(xrange(0,10))
+        self.data = list(range(0,10))
 
     def get(self, index):
         return self.data[index]
@@ -136,7 +141,7 @@ class TestLazyMultiCall(XMLRPCHarness, TestCase):
 
         # get promises for a bunch of steal calls, each of which has
         # side effects we can test for on the dummy.
-        stolen = [mc.steal(x) for x in xrange(0, 10)]
+        stolen = [mc.steal(x) for x in range(0, 10)]
 
         dummy = self.dummy
 
@@ -167,10 +172,10 @@ class TestLazyMultiCall(XMLRPCHarness, TestCase):
         dummy = self.dummy
 
         with self.get_multicall(group_calls=3) as mc:
-            stolen = [mc.steal(x) for x in xrange(0, 10)]
+            stolen = [mc.steal(x) for x in range(0, 10)]
 
             # we've collected all the promises, but not delivered yet
-            self.assertEqual(dummy.data, list(xrange(0, 10)))
+            self.assertEqual(dummy.data, list(range(0, 10)))
 
         # now we've delivered, since the managed interface was used
         # and has closed. Thus the desrtuctive steal calls have all
@@ -179,7 +184,7 @@ class TestLazyMultiCall(XMLRPCHarness, TestCase):
 
         # let's make sure the delivered data is what it should be
         self.assertEqual([deliver(val) for val in stolen],
-                         list(xrange(0, 10)))
+                         list(range(0, 10)))
 
 
 class TestProxyMultiCall(TestLazyMultiCall):